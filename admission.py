@@ -0,0 +1,155 @@
+"""Per-user rate limiting and global load shedding.
+
+All state lives in process memory, so every uvicorn worker enforces its own limits.
+Load shedding reads the event-loop lag sampled by ``event_loop.loop_lag_monitor``.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+from fastapi import HTTPException, Request
+from jwt.exceptions import InvalidTokenError
+
+from config import (
+    SECRET_KEY, ALGORITHM, RATE_LIMIT_ENABLED, RATE_LIMITS, RATE_LIMIT_MAX_KEYS,
+    LOAD_SHED_MAX_IN_FLIGHT, LOAD_SHED_MAX_LAG_MS, LOAD_SHED_RETRY_AFTER,
+)
+from event_loop import LoopLagMonitor, loop_lag_monitor
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, per_seconds: float, now: float):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds  # tokens refilled per second
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume one token. Returns 0 on success, otherwise seconds until a token is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by (route group, client identity), bounded with LRU eviction."""
+
+    def __init__(self, limits: dict, enabled: bool = True, max_keys: int = 10000):
+        self.limits = dict(limits)
+        self.enabled = enabled
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+
+    def check(self, group: str, identity: str, now: Optional[float] = None) -> float:
+        if not self.enabled or group not in self.limits:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        key = (group, identity)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            capacity, per_seconds = self.limits[group]
+            bucket = self._buckets[key] = TokenBucket(capacity, per_seconds, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(now)
+
+    def reset(self):
+        self._buckets.clear()
+
+
+limiter = RateLimiter(RATE_LIMITS, enabled=RATE_LIMIT_ENABLED, max_keys=RATE_LIMIT_MAX_KEYS)
+
+
+def _client_identity(request: Request) -> str:
+    """Identify the caller by JWT subject, falling back to the client address.
+
+    The token is only decoded here (no database lookup); invalid tokens are
+    limited by address and rejected later by ``get_current_user``.
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except InvalidTokenError:
+            username = None
+        if username:
+            return f"user:{username}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def rate_limit(group: str):
+    """Dependency factory enforcing the token bucket configured for ``group``."""
+
+    async def _rate_limit(request: Request):
+        retry_after = limiter.check(group, _client_identity(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return _rate_limit
+
+
+class LoadShedder:
+    """Global admission state: in-flight request count and overload thresholds."""
+
+    def __init__(self, max_in_flight: int, max_lag_ms: float, retry_after: int, monitor: LoopLagMonitor):
+        self.max_in_flight = max_in_flight
+        self.max_lag_ms = max_lag_ms
+        self.retry_after = retry_after
+        self.monitor = monitor
+        self.in_flight = 0
+
+    def overloaded(self) -> bool:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return True
+        if self.max_lag_ms and self.monitor.lag * 1000 > self.max_lag_ms:
+            return True
+        return False
+
+
+load_shedder = LoadShedder(LOAD_SHED_MAX_IN_FLIGHT, LOAD_SHED_MAX_LAG_MS, LOAD_SHED_RETRY_AFTER, loop_lag_monitor)
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware returning 503 with ``Retry-After`` while the worker is overloaded."""
+
+    def __init__(self, app, shedder: LoadShedder = load_shedder):
+        self.app = app
+        self.shedder = shedder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.shedder.overloaded():
+            body = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.shedder.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        self.shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.in_flight -= 1
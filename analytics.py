@@ -0,0 +1,159 @@
+"""Incremental per-question and per-answer analytics.
+
+Counters in ``QuestionStatistics`` / ``AnswerStatistics`` are bumped every time an
+answer is recorded, so reading a question's analytics never touches ``UserAnswer``.
+When an answer's ``is_correct`` changes, ``recount_correct`` recomputes the
+question's correct counter from the per-answer counters. To rebuild the counters
+from the existing answer history run::
+
+    python analytics.py rebuild
+"""
+from typing import Dict, Iterable, List, Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+
+from config import DIFFICULTY_MIN_SAMPLES
+from db import PRIMARY
+from models import Answer, AnswerStatistics, ArchivedUserAnswer, Question, QuestionStatistics, UserAnswer
+from schemas import AnswerAnalytics, QuestionAnalytics
+
+# correct-rate thresholds for the derived difficulty
+EASY_CORRECT_RATE = 0.75
+HARD_CORRECT_RATE = 0.40
+
+
+def calibrated_difficulty(total_answers: int, correct_answers: int) -> Optional[str]:
+    """Map the observed correct rate to easy/medium/hard, once there are enough samples."""
+    if total_answers < max(DIFFICULTY_MIN_SAMPLES, 1):
+        return None
+    rate = correct_answers / total_answers
+    if rate >= EASY_CORRECT_RATE:
+        return "easy"
+    if rate < HARD_CORRECT_RATE:
+        return "hard"
+    return "medium"
+
+
+async def record_answer_outcome(question_id: int, answer_id: int, is_correct: bool) -> None:
+    """Bump the question and answer counters for one recorded answer."""
+    correct = 1 if is_correct else 0
+    updated = await QuestionStatistics.filter(question_id=question_id).update(
+        total_answers=F('total_answers') + 1,
+        correct_answers=F('correct_answers') + correct,
+    )
+    if not updated:
+        try:
+            async with in_transaction(PRIMARY):
+                await QuestionStatistics.create(question_id=question_id, total_answers=1, correct_answers=correct)
+        except IntegrityError:
+            # created concurrently; fall back to the increment
+            await QuestionStatistics.filter(question_id=question_id).update(
+                total_answers=F('total_answers') + 1,
+                correct_answers=F('correct_answers') + correct,
+            )
+
+    updated = await AnswerStatistics.filter(answer_id=answer_id).update(times_chosen=F('times_chosen') + 1)
+    if not updated:
+        try:
+            async with in_transaction(PRIMARY):
+                await AnswerStatistics.create(answer_id=answer_id, question_id=question_id, times_chosen=1)
+        except IntegrityError:
+            await AnswerStatistics.filter(answer_id=answer_id).update(times_chosen=F('times_chosen') + 1)
+
+
+async def recount_correct(question_ids: Iterable[int]) -> None:
+    """Recompute ``correct_answers`` of questions whose answer key changed, from the per-answer counters."""
+    for question_id in set(question_ids):
+        chosen = await AnswerStatistics.filter(question_id=question_id, answer__is_correct=True).values_list(
+            "times_chosen", flat=True
+        )
+        await QuestionStatistics.filter(question_id=question_id).update(correct_answers=sum(chosen))
+
+
+async def get_questions_analytics(questions: Iterable[Question], db=None) -> List[QuestionAnalytics]:
+    """Analytics for questions with ``answers`` fetched, using two lookups in total."""
+    questions = list(questions)
+    ids = [q.id for q in questions]
+    question_stats: Dict[int, QuestionStatistics] = {
+        s.question_id: s for s in await QuestionStatistics.filter(question_id__in=ids).using_db(db)
+    }
+    chosen: Dict[int, int] = {
+        s.answer_id: s.times_chosen for s in await AnswerStatistics.filter(question_id__in=ids).using_db(db)
+    }
+    results = []
+    for question in questions:
+        stats = question_stats.get(question.id)
+        total = stats.total_answers if stats else 0
+        correct = stats.correct_answers if stats else 0
+        results.append(QuestionAnalytics(
+            question_id=question.id,
+            difficulty=question.difficulty,
+            calibrated_difficulty=calibrated_difficulty(total, correct),
+            total_answers=total,
+            correct_answers=correct,
+            correct_rate=(correct / total) if total else None,
+            answers=[
+                AnswerAnalytics(
+                    answer_id=a.id,
+                    text=a.text,
+                    is_correct=a.is_correct,
+                    times_chosen=chosen.get(a.id, 0),
+                    share=(chosen.get(a.id, 0) / total) if total else None,
+                )
+                for a in question.answers
+            ],
+        ))
+    return results
+
+
+async def rebuild_analytics() -> int:
+    """Recompute all counters from live and archived answers. Returns the number of questions with answers.
+
+    The old counters are swapped for the new ones in one transaction, so readers never see them empty.
+    """
+    counts: Dict[int, int] = {}
+    for model in (UserAnswer, ArchivedUserAnswer):
+        for row in await model.all().annotate(n=Count('id')).group_by('answer_id').values('answer_id', 'n'):
+            counts[row['answer_id']] = counts.get(row['answer_id'], 0) + row['n']
+    per_answer = [{'answer_id': answer_id, 'n': n} for answer_id, n in counts.items()]
+    answers = {a.id: a for a in await Answer.filter(id__in=list(counts))}
+    totals: Dict[int, List[int]] = {}
+    answer_stats = []
+    for row in per_answer:
+        answer = answers.get(row['answer_id'])
+        if answer is None:
+            continue
+        answer_stats.append(AnswerStatistics(answer_id=answer.id, question_id=answer.question_id, times_chosen=row['n']))
+        question_totals = totals.setdefault(answer.question_id, [0, 0])
+        question_totals[0] += row['n']
+        if answer.is_correct:
+            question_totals[1] += row['n']
+    async with in_transaction(PRIMARY) as connection:
+        await QuestionStatistics.all().using_db(connection).delete()
+        await AnswerStatistics.all().using_db(connection).delete()
+        await AnswerStatistics.bulk_create(answer_stats, using_db=connection)
+        await QuestionStatistics.bulk_create([
+            QuestionStatistics(question_id=qid, total_answers=total, correct_answers=correct)
+            for qid, (total, correct) in totals.items()
+        ], using_db=connection)
+    return len(totals)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "rebuild":
+            print(f"Rebuilt analytics for {await rebuild_analytics()} questions")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
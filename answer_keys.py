@@ -0,0 +1,35 @@
+"""In-memory answer key: for each question, the ids and texts of its correct answers.
+
+Keys are loaded lazily, all missing questions of a call with one query, and kept
+in ``answer_key_cache``. Every endpoint that creates, edits or deletes answers
+(or deletes questions) bumps the ``answer_keys`` cache, so grading an attempt is
+a set lookup per answer, and no answers are read once the keys are warm.
+"""
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple
+
+from cache import answer_key_cache
+from models import Answer
+
+# bound on the ids in one IN (...) clause
+LOAD_CHUNK_SIZE = 500
+
+
+class AnswerKey(NamedTuple):
+    ids: FrozenSet[int]
+    texts: Dict[int, str]  # correct answer id -> text
+
+
+async def _load(question_ids: List[int]) -> Dict[int, AnswerKey]:
+    correct: Dict[int, Dict[int, str]] = {question_id: {} for question_id in question_ids}
+    for start in range(0, len(question_ids), LOAD_CHUNK_SIZE):
+        rows = await Answer.filter(
+            question_id__in=question_ids[start:start + LOAD_CHUNK_SIZE], is_correct=True
+        ).values_list("question_id", "id", "text")
+        for question_id, answer_id, text in rows:
+            correct[question_id][answer_id] = text
+    return {question_id: AnswerKey(frozenset(texts), texts) for question_id, texts in correct.items()}
+
+
+async def answer_keys(question_ids: Iterable[int]) -> Dict[int, AnswerKey]:
+    """The answer keys of ``question_ids``; questions without correct answers get an empty key."""
+    return await answer_key_cache.get_many(question_ids, _load)
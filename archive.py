@@ -0,0 +1,161 @@
+"""Archival of old quiz results and their answers.
+
+A completed attempt whose ``QuizResult`` is older than the archive age is moved
+as a unit: the result row goes to ``ArchivedQuizResult`` and the attempt's
+``UserAnswer`` rows go to ``ArchivedUserAnswer``. The result is folded into the
+``CategoryStatisticsRollup`` row for (user, category) in the same transaction,
+so the statistics endpoints stay exact:
+
+* ``/statistics/me`` and the leaderboard read ``UserStatistics``, which never
+  depended on the raw rows.
+* ``/statistics/me/by-category`` adds the rollups to the live results.
+* ``/statistics/me/by-date`` looks back at most a year, and the archive age is
+  never below ``MIN_ARCHIVE_AGE_DAYS``.
+* ``/attempts/{id}/details`` falls back to the archive tables.
+
+Answers without an attempt (recorded before attempts were tracked) stay in place.
+Run the archiver from cron or by hand; only one archiver should run at a time::
+
+    python archive.py run [days]
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from db import PRIMARY
+from models import ArchivedQuizResult, ArchivedUserAnswer, CategoryStatisticsRollup, QuizResult, UserAnswer
+
+# /statistics/me/by-date reads up to 365 days back from the live table
+MIN_ARCHIVE_AGE_DAYS = 366
+
+
+def archive_cutoff(days: int = ARCHIVE_AFTER_DAYS, now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(days=max(days, MIN_ARCHIVE_AGE_DAYS))
+
+
+async def _fold_into_rollups(results, connection):
+    totals: Dict[Tuple[int, int], dict] = {}
+    for result in results:
+        category_id = result.attempt.category_id
+        if category_id is None:
+            # by-category statistics skip results without a category
+            continue
+        total = totals.setdefault((result.user_id, category_id), {
+            "quizzes": 0, "questions": 0, "correct": 0, "score_sum": 0.0,
+            "best": result.score, "worst": result.score, "time_spent": 0,
+        })
+        total["quizzes"] += 1
+        total["questions"] += result.total_questions
+        total["correct"] += result.correct_answers
+        total["score_sum"] += result.score
+        total["best"] = max(total["best"], result.score)
+        total["worst"] = min(total["worst"], result.score)
+        total["time_spent"] += result.attempt.time_spent or 0
+
+    for (user_id, category_id), total in totals.items():
+        rollup = await CategoryStatisticsRollup.get_or_none(
+            user_id=user_id, category_id=category_id
+        ).using_db(connection)
+        if rollup is None:
+            await CategoryStatisticsRollup.create(
+                user_id=user_id,
+                category_id=category_id,
+                total_quizzes=total["quizzes"],
+                total_questions_answered=total["questions"],
+                correct_answers=total["correct"],
+                score_sum=total["score_sum"],
+                best_score=total["best"],
+                worst_score=total["worst"],
+                total_time_spent=total["time_spent"],
+                using_db=connection,
+            )
+            continue
+        rollup.total_quizzes += total["quizzes"]
+        rollup.total_questions_answered += total["questions"]
+        rollup.correct_answers += total["correct"]
+        rollup.score_sum += total["score_sum"]
+        rollup.best_score = max(rollup.best_score, total["best"])
+        rollup.worst_score = min(rollup.worst_score, total["worst"])
+        rollup.total_time_spent += total["time_spent"]
+        await rollup.save(using_db=connection)
+
+
+async def archive_batch(cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive up to ``batch_size`` attempts completed before ``cutoff``. Returns how many."""
+    results = await QuizResult.filter(completed_at__lt=cutoff).order_by("id").limit(batch_size).prefetch_related(
+        "attempt"
+    )
+    if not results:
+        return 0
+    attempt_ids = [result.attempt_id for result in results]
+    async with in_transaction(PRIMARY) as connection:
+        await _fold_into_rollups(results, connection)
+        await ArchivedQuizResult.bulk_create([
+            ArchivedQuizResult(
+                id=result.id,
+                attempt_id=result.attempt_id,
+                user_id=result.user_id,
+                category_id=result.attempt.category_id,
+                total_questions=result.total_questions,
+                correct_answers=result.correct_answers,
+                score=result.score,
+                timed_out=result.timed_out,
+                time_spent=result.attempt.time_spent,
+                completed_at=result.completed_at,
+            )
+            for result in results
+        ], using_db=connection)
+        answers = await UserAnswer.filter(attempt_id__in=attempt_ids).using_db(connection)
+        await ArchivedUserAnswer.bulk_create([
+            ArchivedUserAnswer(
+                id=answer.id,
+                user_id=answer.user_id,
+                question_id=answer.question_id,
+                answer_id=answer.answer_id,
+                attempt_id=answer.attempt_id,
+                answered_at=answer.answered_at,
+                served_after_ms=answer.served_after_ms,
+                answered_after_ms=answer.answered_after_ms,
+                is_late=answer.is_late,
+            )
+            for answer in answers
+        ], using_db=connection)
+        await UserAnswer.filter(attempt_id__in=attempt_ids).using_db(connection).delete()
+        await QuizResult.filter(id__in=[result.id for result in results]).using_db(connection).delete()
+    return len(results)
+
+
+async def archive_old_rows(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive every attempt completed more than ``days`` ago, one short transaction per batch."""
+    cutoff = archive_cutoff(days)
+    archived = 0
+    while True:
+        count = await archive_batch(cutoff, batch_size)
+        if not count:
+            return archived
+        archived += count
+        await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str, days: int):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "run":
+            print(f"Archived {await archive_old_rows(days)} quiz attempts")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(
+        sys.argv[1] if len(sys.argv) > 1 else "run",
+        int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_AFTER_DAYS,
+    ))
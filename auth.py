@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import bcrypt
@@ -8,8 +9,9 @@ from starlette.status import HTTP_401_UNAUTHORIZED
 from models import User
 from tortoise.exceptions import DoesNotExist, IntegrityError
 from pydantic import BaseModel
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, ADMIN_USERNAMES
 from schemas import UserCreate, UserResponse
+from cache import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
@@ -33,7 +35,8 @@ async def authenticate_user(username: str, password: str):
         user = await User.get(username=username)
     except DoesNotExist:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt takes a few hundred milliseconds; keep it off the event loop
+    if not await asyncio.to_thread(verify_password, password, user.hashed_password):
         return False
     return user
 
@@ -49,26 +52,41 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
+async def get_user_from_token(token: str):
+    """Resolve a bearer token to its user, or None if the token is invalid."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except InvalidTokenError:
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    return await user_cache.get(username, lambda: User.get_or_none(username=username))
+
+
+def is_admin(user) -> bool:
+    """Admins are the users listed in ``ADMIN_USERNAMES``."""
+    return user is not None and user.username in ADMIN_USERNAMES
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credential_exception = HTTPException(
         status_code=HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credential_exception
-    except InvalidTokenError:
-        raise credential_exception
-    try:
-        user = await User.get(username=username)
-    except DoesNotExist:
+    user = await get_user_from_token(token)
+    if user is None:
         raise credential_exception
     return user
 
 
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
+
 @router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await authenticate_user(form_data.username, form_data.password)
@@ -81,7 +99,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(payload: UserCreate):
-    hashed_password = get_password_hash(payload.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, payload.password)
     try:
         user = await User.create(
             username=payload.username,
@@ -0,0 +1,119 @@
+"""Process-local caches kept coherent across uvicorn workers.
+
+Each cache is tied to a named row in ``CacheGeneration``. Every write that can
+affect a cache bumps that row's counter, and each worker compares the stored
+counter with the one it has seen at most once per ``CACHE_CHECK_INTERVAL``
+seconds before serving cached entries. When the counter has moved, the local
+entries are dropped.
+
+Staleness bound: a worker sees writes made by other workers at most
+``CACHE_CHECK_INTERVAL`` seconds after they commit. Writes made by the same
+worker are visible immediately.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+
+from config import CACHE_CHECK_INTERVAL, CACHE_MAX_ENTRIES
+from models import CacheGeneration
+
+_caches: Dict[str, "GenerationCache"] = {}
+
+
+class GenerationCache:
+    def __init__(self, name: str, check_interval: float = 1.0, max_entries: int = 10000):
+        self.name = name
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._checked_at = float("-inf")
+        self._listeners: List[Callable[[], Awaitable[None]]] = []
+        _caches[name] = self
+
+    def on_change(self, listener: Callable[[], Awaitable[None]]):
+        """Register a coroutine to run when another worker bumps this cache's generation."""
+        self._listeners.append(listener)
+
+    async def sync(self):
+        """Drop local entries if the shared generation moved; at most once per interval."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        row = await CacheGeneration.get_or_none(name=self.name)
+        generation = row.generation if row else 0
+        if generation == self._generation:
+            return
+        changed_remotely = self._generation is not None
+        self._generation = generation
+        self._entries.clear()
+        if changed_remotely:
+            for listener in self._listeners:
+                await listener()
+
+    async def get(self, key, loader: Callable[[], Awaitable[Any]]):
+        """Return the cached value for ``key``, loading it on a miss. ``None`` is never cached."""
+        await self.sync()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        value = await loader()
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    async def get_many(self, keys: Iterable, loader: Callable[[List], Awaitable[Dict]]) -> Dict:
+        """Return the cached values for ``keys``, loading all misses with one ``loader(missing)`` call."""
+        await self.sync()
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[key] = self._entries[key]
+            else:
+                missing.append(key)
+        if missing:
+            loaded = await loader(missing)
+            for key, value in loaded.items():
+                if value is not None:
+                    self._store(key, value)
+            found.update(loaded)
+        return found
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+async def bump(*names: str):
+    """Invalidate the named caches in every worker."""
+    for name in names:
+        updated = await CacheGeneration.filter(name=name).update(generation=F("generation") + 1)
+        if not updated:
+            try:
+                await CacheGeneration.create(name=name, generation=1)
+            except IntegrityError:
+                await CacheGeneration.filter(name=name).update(generation=F("generation") + 1)
+        cache = _caches.get(name)
+        if cache is None:
+            continue
+        cache.clear()
+        generation = (await CacheGeneration.get(name=name)).generation
+        # adopt the new generation only if nobody else bumped in between,
+        # so that remote changes still reach the on_change listeners
+        if cache._generation is not None and generation == cache._generation + 1:
+            cache._generation = generation
+
+
+category_cache = GenerationCache("categories", CACHE_CHECK_INTERVAL, CACHE_MAX_ENTRIES)
+question_cache = GenerationCache("questions", CACHE_CHECK_INTERVAL, CACHE_MAX_ENTRIES)
+user_cache = GenerationCache("users", CACHE_CHECK_INTERVAL, CACHE_MAX_ENTRIES)
+answer_key_cache = GenerationCache("answer_keys", CACHE_CHECK_INTERVAL, CACHE_MAX_ENTRIES)
@@ -0,0 +1,221 @@
+"""Negotiated gzip / brotli response compression.
+
+``CompressionMiddleware`` picks the best encoding from ``Accept-Encoding``
+(brotli when the optional ``brotli`` package is installed, else gzip) and
+compresses responses whose body is at least ``COMPRESSION_MIN_SIZE`` bytes.
+Streaming responses are compressed chunk by chunk and flushed after every
+chunk, so nothing is buffered. 1xx, 204 and 304 responses and bodies that
+already carry a ``Content-Encoding`` pass through untouched.
+
+To compare CPU cost against bytes saved on the questions in the database run::
+
+    python compression.py bench
+"""
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+SKIP_STATUSES = {204, 304}
+
+
+def available_encodings() -> List[str]:
+    """Supported encodings in order of preference."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: str, available: Optional[List[str]] = None) -> Optional[str]:
+    """The preferred available encoding the client accepts, honouring q-values."""
+    available = available_encodings() if available is None else available
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def compressor(encoding: str, gzip_level: int = COMPRESSION_GZIP_LEVEL,
+               brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+    if encoding == "br":
+        return _BrotliStream(brotli_quality)
+    return _GzipStream(gzip_level)
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of at least ``minimum_size`` bytes."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding((_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                status = message["status"]
+                content_length = _header(headers, b"content-length")
+                if (
+                    status < 200
+                    or status in SKIP_STATUSES
+                    or _header(headers, b"content-encoding") is not None
+                    or (content_length is not None and int(content_length) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message  # held until the first body chunk shows whether to compress
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                stream = compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                vary = _header(headers, b"vary")
+                if vary is None:
+                    headers.append((b"vary", b"Accept-Encoding"))
+                elif b"accept-encoding" not in vary.lower():
+                    headers = [(k, v) for k, v in headers if k.lower() != b"vary"]
+                    headers.append((b"vary", vary + b", Accept-Encoding"))
+                if not more_body:
+                    body = stream.finish(body)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+            chunk = stream.compress(body) if more_body else stream.finish(body)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def benchmark(payload: bytes, repeat: int = 20) -> List[dict]:
+    """Compressed size and mean compression time per encoding and level."""
+    settings = [("gzip", level) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [("br", quality) for quality in (1, 4, 11)]
+    rows = []
+    for encoding, level in settings:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            size = len(compressor(encoding, gzip_level=level, brotli_quality=level).finish(payload))
+        elapsed = (time.perf_counter() - started) / repeat
+        rows.append({
+            "encoding": encoding,
+            "level": level,
+            "bytes": size,
+            "ratio": size / len(payload) if payload else 1.0,
+            "ms": elapsed * 1000,
+            "mb_per_s": (len(payload) / elapsed / 1e6) if elapsed else 0.0,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str, page_size: int):
+        if command != "bench":
+            raise SystemExit(f"Unknown command: {command}")
+        from models import Question
+        from quiz import _question_response
+
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        questions = await Question.all().order_by("id").limit(page_size).prefetch_related("answers", "category")
+        await Tortoise.close_connections()
+        if not questions:
+            raise SystemExit("No questions in the database to benchmark with")
+        # the same bytes GET /quiz/questions/?limit=<page_size> would send
+        payload = json.dumps(
+            [_question_response(q).model_dump(mode="json") for q in questions], separators=(",", ":")
+        ).encode()
+        print(f"{len(questions)} questions, {len(payload)} bytes uncompressed")
+        if brotli is None:
+            print("brotli is not installed; only gzip is measured")
+        print(f"{'encoding':<8} {'level':>5} {'bytes':>9} {'ratio':>6} {'ms':>8} {'MB/s':>8}")
+        for row in benchmark(payload):
+            print(f"{row['encoding']:<8} {row['level']:>5} {row['bytes']:>9} {row['ratio']:>6.2f} "
+                  f"{row['ms']:>8.3f} {row['mb_per_s']:>8.1f}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "bench", int(sys.argv[2]) if len(sys.argv) > 2 else 100))
@@ -7,6 +7,93 @@ except Exception:
     pass
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite://db.sqlite3")
+# Optional read-only replica for statistics, leaderboard and listing endpoints
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-.env")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_rate(name: str, default: str) -> tuple:
+    """Parse a ``<requests>/<seconds>`` rate such as ``30/60``."""
+    requests, _, seconds = os.getenv(name, default).partition("/")
+    return int(requests), float(seconds or 1)
+
+
+# Admission control: per-user token buckets by route group, plus global load shedding
+RATE_LIMIT_ENABLED = _env_flag("RATE_LIMIT_ENABLED", "true")
+RATE_LIMITS = {
+    "auth": _env_rate("RATE_LIMIT_AUTH", "20/60"),
+    "quiz": _env_rate("RATE_LIMIT_QUIZ", "240/60"),
+    "attempts": _env_rate("RATE_LIMIT_ATTEMPTS", "60/60"),
+    "statistics": _env_rate("RATE_LIMIT_STATISTICS", "30/60"),
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv("LOAD_SHED_MAX_IN_FLIGHT", "512"))  # 0 disables
+LOAD_SHED_MAX_LAG_MS = float(os.getenv("LOAD_SHED_MAX_LAG_MS", "500"))  # 0 disables
+LOAD_SHED_RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", "1"))
+
+# Event-loop monitor: lag is sampled every LOOP_LAG_INTERVAL_MS, and a stall longer than
+# LOOP_BLOCK_THRESHOLD_MS is recorded with the stack of the blocking code (the last
+# LOOP_STALL_HISTORY are kept). LOOP_BLOCK_BUDGET_MS > 0 is a debug mode for tests:
+# a request that holds the loop longer than that without yielding fails.
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "20"))
+LOOP_BLOCK_BUDGET_MS = float(os.getenv("LOOP_BLOCK_BUDGET_MS", "0"))
+
+# Background expiry of attempts past their total_time_limit
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "100"))
+
+# Per-question analytics: minimum answers before a difficulty is derived from the correct rate
+DIFFICULTY_MIN_SAMPLES = int(os.getenv("DIFFICULTY_MIN_SAMPLES", "20"))
+
+# Process-local caches: how often each worker checks the shared generation counters
+CACHE_CHECK_INTERVAL = float(os.getenv("CACHE_CHECK_INTERVAL", "1.0"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Response compression (gzip, or brotli when the optional brotli package is installed)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Fast startup: skip schema generation and only check the stored schema version
+FAST_STARTUP = _env_flag("FAST_STARTUP", "false")
+WARMUP_LEADERBOARD_SIZE = int(os.getenv("WARMUP_LEADERBOARD_SIZE", "10"))
+
+# Bulk purge jobs: rows per delete/update statement and pause between statements
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+PURGE_PAUSE_MS = float(os.getenv("PURGE_PAUSE_MS", "0"))
+
+# Archival of old quiz results and answers (python archive.py run)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "400"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Idempotency-Key support on attempt writes: how long responses are kept and
+# how long a retry waits for the original request still in progress elsewhere
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+# Usernames (comma-separated) allowed to use the admin-only diagnostics
+ADMIN_USERNAMES = frozenset(name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip())
+
+# On-demand request profiling (X-Profile header or ?profile=1, admin tokens only).
+# Profiles are written to PROFILE_DIR when set, otherwise returned inline.
+PROFILE_DIR = os.getenv("PROFILE_DIR") or None
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+
+# Slow query log: statements at or over SLOW_QUERY_MS are logged (-1 disables);
+# per-statement statistics keep at most QUERY_STATS_MAX_FINGERPRINTS entries per worker
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+QUERY_STATS_MAX_FINGERPRINTS = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", "500"))
+
+# Near-duplicate questions: MinHash similarity at or over DUPLICATE_THRESHOLD counts
+# as a duplicate; DUPLICATE_POLICY (warn | reject | allow) applies on create and import
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "warn")
+if DUPLICATE_POLICY not in ("warn", "reject", "allow"):
+    raise ValueError(f"DUPLICATE_POLICY must be one of warn, reject, allow; got {DUPLICATE_POLICY!r}")
@@ -0,0 +1,59 @@
+"""Tortoise configuration and read/write connection routing.
+
+Writes and read-your-writes paths use the ``default`` (primary) connection.
+Read-only endpoints take their connection from ``get_read_connection``, which
+returns the ``replica`` connection when ``DATABASE_READ_URL`` is set and reports
+the connection that served the request in the ``X-DB-Connection`` header.
+
+Write endpoints that touch several tables depend on ``unit_of_work``, which
+runs the rest of the request in a single transaction on the primary.
+"""
+import logging
+
+from fastapi import Request, Response
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from config import DATABASE_URL, DATABASE_READ_URL
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+
+def tortoise_config() -> dict:
+    db_connections = {PRIMARY: DATABASE_URL}
+    if DATABASE_READ_URL:
+        db_connections[REPLICA] = DATABASE_READ_URL
+    return {
+        "connections": db_connections,
+        "apps": {"models": {"models": ["models"], "default_connection": PRIMARY}},
+    }
+
+
+def read_connection_name() -> str:
+    return REPLICA if DATABASE_READ_URL else PRIMARY
+
+
+async def get_read_connection(request: Request, response: Response):
+    """Dependency returning the connection for read-only queries."""
+    name = read_connection_name()
+    response.headers["X-DB-Connection"] = name
+    logger.debug("%s %s served by %s connection", request.method, request.url.path, name)
+    return connections.get(name)
+
+
+async def unit_of_work():
+    """Dependency running the rest of a write request in one primary transaction.
+
+    While a transaction is open Tortoise routes the ``default`` connection of the
+    current task through it, so the dependencies resolved after this one (such as
+    ``get_current_user``), the handler and the side effects it calls all share one
+    connection and commit once. Declare it with ``scope="function"`` so the commit
+    happens before the response is sent; an exception rolls everything back.
+    Helpers that recover from a failed statement must wrap it in its own
+    ``in_transaction(PRIMARY)``, which becomes a savepoint here.
+    """
+    async with in_transaction(PRIMARY) as connection:
+        yield connection
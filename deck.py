@@ -0,0 +1,54 @@
+"""Immutable per-attempt snapshot of the served questions and their answer key.
+
+The snapshot is taken when questions are selected for an attempt and stored on
+``QuizAttempt.deck`` as zlib-compressed JSON. Clients read the whole deck in one
+request, and scoring uses the snapshot's answer key, so editing a question
+later changes neither what the user was shown nor how the attempt is graded.
+"""
+import json
+import zlib
+from typing import Dict, List, Optional, Set
+
+from models import Question
+
+
+async def snapshot_questions(question_ids: List[int]) -> dict:
+    """Snapshot the given questions, in the given order, with one query."""
+    questions = await Question.filter(id__in=question_ids).prefetch_related("answers")
+    by_id = {q.id: q for q in questions}
+    deck = {"questions": [], "key": {}}
+    for qid in question_ids:
+        question = by_id.get(qid)
+        if question is None:
+            continue
+        answers = sorted(question.answers, key=lambda a: a.id)
+        deck["questions"].append({
+            "id": question.id,
+            "text": question.text,
+            "difficulty": question.difficulty,
+            "time_limit_seconds": question.time_limit_seconds,
+            "answers": [{"id": a.id, "text": a.text} for a in answers],
+        })
+        deck["key"][str(question.id)] = [a.id for a in answers if a.is_correct]
+    return deck
+
+
+def extend(deck: dict, more: dict) -> dict:
+    deck["questions"].extend(more["questions"])
+    deck["key"].update(more["key"])
+    return deck
+
+
+def pack(deck: dict) -> bytes:
+    return zlib.compress(json.dumps(deck, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack(blob: Optional[bytes]) -> Optional[dict]:
+    if not blob:
+        return None
+    return json.loads(zlib.decompress(blob))
+
+
+def answer_key(deck: dict) -> Dict[int, Set[int]]:
+    """Correct answer ids per question id."""
+    return {int(qid): set(ids) for qid, ids in deck["key"].items()}
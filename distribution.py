@@ -0,0 +1,113 @@
+"""Fixed-bin score histograms per category, and percentiles read from them.
+
+Every completed attempt increments one ``ScoreHistogramBin`` row for its
+category and one for the global histogram (``category_id`` 0). Histograms
+have ``BINS`` bins of ``BIN_WIDTH`` points each, so reading one and computing a
+percentile costs the same no matter how many results exist.
+
+Percentiles interpolate linearly inside the score's bin. The true share of
+takers who scored lower differs from the estimate by at most the share of
+takers in that same bin; that share is returned as ``percentile_error``. To
+rebuild the histograms from live and archived results run::
+
+    python distribution.py rebuild
+"""
+from typing import List, Optional, Tuple
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from db import PRIMARY
+from models import ArchivedQuizResult, QuizResult, ScoreHistogramBin
+
+BINS = 20
+BIN_WIDTH = 100 / BINS
+ALL_CATEGORIES = 0
+
+
+def bin_for(score: float) -> int:
+    return min(max(int(score // BIN_WIDTH), 0), BINS - 1)
+
+
+async def load_counts(category_id: Optional[int], db=None) -> List[int]:
+    counts = [0] * BINS
+    rows = await ScoreHistogramBin.filter(category_id=category_id or ALL_CATEGORIES).using_db(db).values_list(
+        "bin", "count"
+    )
+    for index, count in rows:
+        counts[index] = count
+    return counts
+
+
+def percentile(counts: List[int], score: float) -> Tuple[Optional[float], Optional[float]]:
+    """Estimated share of results below ``score`` and its error bound, both in %."""
+    total = sum(counts)
+    if not total:
+        return None, None
+    index = bin_for(score)
+    fraction = min(max((score - index * BIN_WIDTH) / BIN_WIDTH, 0.0), 1.0)
+    below = sum(counts[:index]) + counts[index] * fraction
+    return 100 * below / total, 100 * counts[index] / total
+
+
+async def record_score(category_id: Optional[int], score: float):
+    """Count one result in the category's and the global histogram."""
+    index = bin_for(score)
+    for category in {ALL_CATEGORIES, category_id or ALL_CATEGORIES}:
+        row = ScoreHistogramBin.filter(category_id=category, bin=index)
+        if await row.update(count=F("count") + 1):
+            continue
+        try:
+            async with in_transaction(PRIMARY):
+                await ScoreHistogramBin.create(category_id=category, bin=index, count=1)
+        except IntegrityError:
+            # created concurrently; fall back to the increment
+            await row.update(count=F("count") + 1)
+
+
+async def rebuild_histograms(batch_size: int = 1000) -> int:
+    """Recompute every histogram from live and archived results. Returns the number of results counted.
+
+    The old bins are swapped for the new ones in one transaction, so percentiles never read empty histograms.
+    """
+    counts = {}
+    counted = 0
+    for model, category_field in ((QuizResult, "attempt__category_id"), (ArchivedQuizResult, "category_id")):
+        last_id = 0
+        while True:
+            rows = await model.filter(id__gt=last_id).order_by("id").limit(batch_size).values_list(
+                "id", category_field, "score"
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for _, category_id, score in rows:
+                for category in {ALL_CATEGORIES, category_id or ALL_CATEGORIES}:
+                    key = (category, bin_for(score))
+                    counts[key] = counts.get(key, 0) + 1
+                counted += 1
+    async with in_transaction(PRIMARY) as connection:
+        await ScoreHistogramBin.all().using_db(connection).delete()
+        await ScoreHistogramBin.bulk_create([
+            ScoreHistogramBin(category_id=category, bin=index, count=count)
+            for (category, index), count in counts.items()
+        ], batch_size=batch_size, using_db=connection)
+    return counted
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "rebuild":
+            print(f"Rebuilt histograms from {await rebuild_histograms()} results")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,299 @@
+"""Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+Every question has a ``QuestionSignature``. It holds the sha1 fingerprint of
+the normalized text (lowercased, accents, punctuation and extra whitespace
+removed) and a MinHash signature of the text's character 4-grams, with
+``NUM_PERM`` values. The signature is cut into ``BANDS`` bands of ``ROWS``
+values, and each band is hashed into one ``QuestionLshBucket`` row.
+
+Two texts with Jaccard similarity ``s`` share at least one bucket with
+probability ``1 - (1 - s**ROWS) ** BANDS``. That is over 99.9 % at ``s = 0.8``
+and under 10 % below ``s = 0.3``. A lookup reads the new text's ``BANDS``
+buckets through the ``(band, bucket)`` index. It then compares signatures with
+those candidates only, so its cost depends on the number of similar questions,
+not on the size of the bank. Similarity is the share of equal MinHash values,
+and it is 1.0 when the fingerprints match.
+
+Question CRUD in ``quiz.py`` keeps the rows current, and deleting a question
+cascades to them. Questions that are missing a signature are indexed at
+startup. To rebuild the whole index run::
+
+    python duplicates.py rebuild
+"""
+import hashlib
+import random
+import re
+import struct
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from tortoise.expressions import Q
+from tortoise.functions import Count
+
+from models import Question, QuestionLshBucket, QuestionSignature
+from schemas import DuplicateCluster, DuplicateClusterMember, DuplicateMatch
+
+SHINGLE_SIZE = 4
+BANDS = 16
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+MAX_MATCHES = 5
+# buckets with more members only compare them with their first member
+MAX_BUCKET_COMPARISONS = 50
+_CHUNK = 500  # ids per IN (...) list, below SQLite's variable limit
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)  # fixed: stored signatures must stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_PACK = struct.Struct(f"<{NUM_PERM}Q")
+_BAND = struct.Struct(f"<{ROWS}Q")
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+class Signature(NamedTuple):
+    fingerprint: str
+    minhash: Tuple[int, ...]
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped).strip()
+
+
+def shingles(normalized: str) -> set:
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> Signature:
+    normalized = normalize(text)
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(normalized)]
+    return Signature(
+        hashlib.sha1(normalized.encode()).hexdigest(),
+        tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS),
+    )
+
+
+def buckets(minhash: Tuple[int, ...]) -> List[int]:
+    """One signed 64-bit bucket per band."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(_BAND.pack(*minhash[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+            "little", signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    if a.fingerprint == b.fingerprint:
+        return 1.0
+    return sum(x == y for x, y in zip(a.minhash, b.minhash)) / NUM_PERM
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), _CHUNK):
+        yield ids[start:start + _CHUNK]
+
+
+async def index_question(question_id: int, text: str, db=None) -> None:
+    """(Re)index a question's text."""
+    sig = signature(text)
+    await QuestionLshBucket.filter(question_id=question_id).using_db(db).delete()
+    await QuestionSignature.update_or_create(
+        question_id=question_id,
+        defaults={"fingerprint": sig.fingerprint, "minhash": _PACK.pack(*sig.minhash)},
+        using_db=db,
+    )
+    await QuestionLshBucket.bulk_create(
+        [QuestionLshBucket(question_id=question_id, band=band, bucket=bucket)
+         for band, bucket in enumerate(buckets(sig.minhash))],
+        using_db=db,
+    )
+
+
+async def _signatures(question_ids: Iterable[int], db=None) -> Dict[int, Signature]:
+    found = {}
+    for chunk in _chunks(sorted(set(question_ids))):
+        rows = await QuestionSignature.filter(question_id__in=chunk).using_db(db).values_list(
+            "question_id", "fingerprint", "minhash"
+        )
+        for question_id, fingerprint, minhash in rows:
+            found[question_id] = Signature(fingerprint, _PACK.unpack(bytes(minhash)))
+    return found
+
+
+async def find_duplicates(
+    text: str, threshold: float, exclude_id: Optional[int] = None, limit: int = MAX_MATCHES, db=None
+) -> List[DuplicateMatch]:
+    """Indexed questions at least ``threshold`` similar to ``text``, most similar first."""
+    sig = signature(text)
+    bands = Q(*[Q(band=band, bucket=bucket) for band, bucket in enumerate(buckets(sig.minhash))], join_type="OR")
+    candidates = set(await QuestionLshBucket.filter(bands).using_db(db).values_list("question_id", flat=True))
+    candidates.update(
+        await QuestionSignature.filter(fingerprint=sig.fingerprint).using_db(db).values_list("question_id", flat=True)
+    )
+    candidates.discard(exclude_id)
+    scored = sorted(
+        ((similarity(sig, other), question_id) for question_id, other in (await _signatures(candidates, db)).items()),
+        key=lambda pair: (-pair[0], pair[1]),
+    )
+    scored = [(score, question_id) for score, question_id in scored if score >= threshold][:limit]
+    if not scored:
+        return []
+    texts = dict(await Question.filter(id__in=[qid for _, qid in scored]).using_db(db).values_list("id", "text"))
+    return [
+        DuplicateMatch(question_id=question_id, text=texts[question_id], similarity=round(score, 3))
+        for score, question_id in scored if question_id in texts
+    ]
+
+
+class BatchIndex:
+    """In-memory LSH over the texts of one import, to catch duplicates within it."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._signatures: Dict[int, Signature] = {}
+        self._texts: Dict[int, str] = {}
+
+    def find(self, text: str, threshold: float) -> List[DuplicateMatch]:
+        sig = signature(text)
+        candidates = {
+            index for band, bucket in enumerate(buckets(sig.minhash)) for index in self._buckets.get((band, bucket), ())
+        }
+        scored = sorted(
+            ((similarity(sig, self._signatures[index]), index) for index in candidates),
+            key=lambda pair: (-pair[0], pair[1]),
+        )
+        return [
+            DuplicateMatch(import_index=index, text=self._texts[index], similarity=round(score, 3))
+            for score, index in scored if score >= threshold
+        ][:MAX_MATCHES]
+
+    def add(self, index: int, text: str):
+        sig = signature(text)
+        self._signatures[index] = sig
+        self._texts[index] = text
+        for band, bucket in enumerate(buckets(sig.minhash)):
+            self._buckets[(band, bucket)].append(index)
+
+
+def _find(parents: Dict[int, int], item: int) -> int:
+    while parents.setdefault(item, item) != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
+
+
+async def duplicate_clusters(
+    threshold: float, category_id: Optional[int] = None, limit: int = 50, db=None
+) -> List[DuplicateCluster]:
+    """Groups of questions linked by pairwise similarity at or over ``threshold``, largest first.
+
+    Only questions sharing an LSH bucket are compared, so the report never
+    looks at all pairs of the bank.
+    """
+    members = QuestionLshBucket.filter(question__category_id=category_id) if category_id else QuestionLshBucket.all()
+    colliding = await members.using_db(db).annotate(size=Count("id")).group_by("band", "bucket").filter(
+        size__gt=1
+    ).values_list("band", "bucket")
+    by_bucket: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for band in range(BANDS):
+        band_buckets = [bucket for b, bucket in colliding if b == band]
+        for chunk in _chunks(band_buckets):
+            rows = await members.filter(band=band, bucket__in=chunk).using_db(db).order_by("question_id").values_list(
+                "bucket", "question_id"
+            )
+            for bucket, question_id in rows:
+                by_bucket[(band, bucket)].append(question_id)
+
+    signatures = await _signatures((qid for ids in by_bucket.values() for qid in ids), db)
+    parents: Dict[int, int] = {}
+    compared = set()
+    for ids in by_bucket.values():
+        pairs = (
+            ((ids[0], other) for other in ids[1:]) if len(ids) > MAX_BUCKET_COMPARISONS
+            else ((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+        )
+        for pair in pairs:
+            if pair in compared:
+                continue
+            compared.add(pair)
+            a, b = pair
+            if a in signatures and b in signatures and similarity(signatures[a], signatures[b]) >= threshold:
+                parents[_find(parents, b)] = _find(parents, a)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for question_id in parents:
+        groups[_find(parents, question_id)].append(question_id)
+    ordered = sorted((sorted(ids) for ids in groups.values()), key=lambda ids: (-len(ids), ids[0]))[:limit]
+
+    details = {}
+    for chunk in _chunks([qid for ids in ordered for qid in ids]):
+        for question_id, text, category in await Question.filter(id__in=chunk).using_db(db).values_list(
+            "id", "text", "category_id"
+        ):
+            details[question_id] = (text, category)
+    return [
+        DuplicateCluster(questions=[
+            DuplicateClusterMember(
+                id=question_id,
+                text=details[question_id][0],
+                category_id=details[question_id][1],
+                similarity=round(similarity(signatures[ids[0]], signatures[question_id]), 3),
+            )
+            for question_id in ids if question_id in details
+        ])
+        for ids in ordered
+    ]
+
+
+async def _index_rows(rows) -> int:
+    for question_id, text in rows:
+        await index_question(question_id, text)
+    return len(rows)
+
+
+async def ensure_index(batch_size: int = 1000) -> int:
+    """Index questions that have no signature yet. Returns the number indexed."""
+    if await QuestionSignature.all().count() >= await Question.all().count():
+        return 0
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = await Question.filter(id__gt=last_id).order_by("id").limit(batch_size).values_list("id", "text")
+        if not rows:
+            return indexed
+        last_id = rows[-1][0]
+        known = set(await QuestionSignature.filter(question_id__in=[qid for qid, _ in rows]).values_list(
+            "question_id", flat=True
+        ))
+        indexed += await _index_rows([(qid, text) for qid, text in rows if qid not in known])
+
+
+async def rebuild_index(batch_size: int = 1000) -> int:
+    """Re-index every question. Returns the number of indexed questions."""
+    await QuestionLshBucket.all().delete()
+    await QuestionSignature.all().delete()
+    return await ensure_index(batch_size)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "rebuild":
+            print(f"Indexed {await rebuild_index()} questions")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,190 @@
+"""Event-loop lag monitoring and blocking-call detection.
+
+``LoopLagMonitor`` samples the lag of the worker's event loop; load shedding in
+``admission.py`` and ``GET /health/ready`` read it. Its watchdog thread records
+the stack of code that blocks the loop, and admins read the recent stalls from
+``GET /admin/event-loop``. ``BlockingBudgetMiddleware`` turns such blocking into
+errors in debug runs and tests.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Optional
+
+from fastapi import APIRouter, Depends
+
+from auth import get_admin_user
+from config import LOOP_BLOCK_BUDGET_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_LAG_INTERVAL_MS, LOOP_STALL_HISTORY
+from schemas import EventLoopStatsResponse, LoopStall
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag by measuring how late a periodic sleep wakes up.
+
+    A watchdog thread notices when the next wake-up is more than
+    ``block_threshold_ms`` overdue, which means some code is holding the loop.
+    It then records the loop thread's stack while that code is still running.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold_ms: float = 100, history: int = 20):
+        self.interval = interval
+        self.block_threshold_ms = block_threshold_ms
+        self.lag = 0.0  # seconds, most recent sample
+        self.max_lag = 0.0  # seconds, since start
+        self.stall_count = 0
+        self.stalls: Deque[dict] = deque(maxlen=max(history, 1))
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._tick_started = 0.0  # monotonic time the current sleep started
+        self._open_stall: Optional[dict] = None
+
+    def start(self):
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._tick_started = time.monotonic()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            if self.block_threshold_ms > 0:
+                self._stopped.clear()
+                self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+                self._watchdog.start()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._stopped.set()
+            self._watchdog.join()
+            self._watchdog = None
+        self.lag = 0.0
+
+    async def _run(self):
+        while True:
+            self._tick_started = started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - started - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+            stall = self._open_stall
+            if stall is not None:
+                self._open_stall = None
+                stall["duration_ms"] = round(self.lag * 1000, 1)
+                logger.warning(
+                    "event loop was blocked for %.0f ms in:\n%s", stall["duration_ms"], "".join(stall["stack"])
+                )
+
+    def _watch(self):
+        check_every = max(self.block_threshold_ms / 4000, 0.005)
+        captured_tick = None
+        while not self._stopped.wait(check_every):
+            tick = self._tick_started
+            overdue_ms = (time.monotonic() - tick - self.interval) * 1000
+            if overdue_ms < self.block_threshold_ms or tick == captured_tick:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            captured_tick = tick
+            stall = {
+                "started_at": datetime.now(timezone.utc) - timedelta(milliseconds=overdue_ms),
+                "duration_ms": None,  # filled in when the loop runs again
+                "stack": traceback.format_stack(frame),
+            }
+            self.stalls.append(stall)
+            self.stall_count += 1
+            self._open_stall = stall
+
+
+loop_lag_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL_MS / 1000, LOOP_BLOCK_THRESHOLD_MS, LOOP_STALL_HISTORY)
+
+
+router = APIRouter()
+
+
+@router.get("/event-loop", response_model=EventLoopStatsResponse)
+async def get_event_loop_stats(admin=Depends(get_admin_user)):
+    """Event-loop lag of this worker and the stacks of its most recent stalls."""
+    monitor = loop_lag_monitor
+    return EventLoopStatsResponse(
+        lag_ms=round(monitor.lag * 1000, 3),
+        max_lag_ms=round(monitor.max_lag * 1000, 3),
+        block_threshold_ms=monitor.block_threshold_ms,
+        stalls_total=monitor.stall_count,
+        recent_stalls=[LoopStall(**stall) for stall in reversed(monitor.stalls)],
+    )
+
+
+class BlockingCallError(RuntimeError):
+    """A request held the event loop longer than ``LOOP_BLOCK_BUDGET_MS`` without yielding."""
+
+
+class _TimedSteps:
+    """Awaitable driving a coroutine step by step and timing each step.
+
+    A step is everything the coroutine runs between two suspensions, i.e. the
+    time it holds the event loop.
+    """
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.longest = 0.0  # seconds
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                yielded = self.coro.throw(error) if error is not None else self.coro.send(value)
+            except StopIteration as stop:
+                self.longest = max(self.longest, time.perf_counter() - started)
+                return stop.value
+            except BaseException:
+                self.longest = max(self.longest, time.perf_counter() - started)
+                raise
+            self.longest = max(self.longest, time.perf_counter() - started)
+            try:
+                value, error = (yield yielded), None
+            except BaseException as exc:
+                value, error = None, exc
+
+
+class BlockingBudgetMiddleware:
+    """Debug aid: fail requests that block the event loop for longer than the budget.
+
+    Only active when ``LOOP_BLOCK_BUDGET_MS`` is set. The error is raised after the
+    response has been sent, so the test client re-raises it in the failing test.
+    """
+
+    def __init__(self, app, budget_ms: float = LOOP_BLOCK_BUDGET_MS, monitor: LoopLagMonitor = loop_lag_monitor):
+        self.app = app
+        self.budget_ms = budget_ms
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if not self.budget_ms or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stalls_before = self.monitor.stall_count
+        steps = _TimedSteps(self.app(scope, receive, send))
+        await steps
+        longest_ms = steps.longest * 1000
+        if longest_ms > self.budget_ms:
+            message = (
+                f"{scope['method']} {scope['path']} held the event loop for {longest_ms:.0f} ms "
+                f"without yielding (budget {self.budget_ms:.0f} ms)"
+            )
+            if self.monitor.stall_count > stalls_before and self.monitor.stalls:
+                message += " in:\n" + "".join(self.monitor.stalls[-1]["stack"])
+            raise BlockingCallError(message)
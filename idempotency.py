@@ -0,0 +1,227 @@
+"""``Idempotency-Key`` support for attempt writes.
+
+A request to one of ``IDEMPOTENT_ROUTES`` that carries an ``Idempotency-Key``
+header runs at most once per caller and key. Its response is stored in
+``IdempotencyRecord`` for ``IDEMPOTENCY_TTL_SECONDS``, and retries with the same
+key get that response replayed, marked with ``Idempotent-Replayed: true``,
+without running the handler again.
+
+Concurrent duplicates are collapsed. Within a worker they wait on the
+original request's in-flight future. Across workers the primary key of the
+pending record decides who runs, and the others poll for up to
+``IDEMPOTENCY_WAIT_SECONDS`` before answering 409. A pending record only holds
+a lease of ``LEASE_FACTOR`` times that wait, so a key claimed by a worker that
+died before finishing can be taken over once the lease runs out. Reusing a key
+for a different request is a 422. 5xx responses are not stored, and neither
+are ``RETRYABLE_STATUSES``, which come from auth, rate limiting or a conflict
+rather than from the handler's outcome. A retry after them runs the handler
+again. Expired records are deleted as new keys are claimed.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+from tortoise.exceptions import IntegrityError
+
+from admission import _client_identity
+from config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+from models import IdempotencyRecord
+
+IDEMPOTENT_ROUTES = (
+    ("POST", re.compile(r"^/quiz/attempts/$")),
+    ("POST", re.compile(r"^/quiz/attempts/\d+/complete$")),
+    ("POST", re.compile(r"^/quiz/attempts/\d+/answers$")),
+)
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+LEASE_FACTOR = 3  # pending records expire after this many waits
+# answered before the handler ran, or transient: a retry may well succeed
+RETRYABLE_STATUSES = frozenset({401, 403, 408, 409, 429})
+# hop-by-hop or recomputed headers that are not replayed
+_SKIPPED_HEADERS = {b"content-length", b"transfer-encoding", b"connection"}
+
+Response = Tuple[int, list, bytes]  # status, headers, body
+
+
+async def _json_response(send, status: int, detail: str, extra_headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response: Response):
+    status, headers, body = response
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            *headers,
+            (b"content-length", str(len(body)).encode()),
+            (b"idempotent-replayed", b"true"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _from_record(record: IdempotencyRecord) -> Response:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.response_headers)]
+    return record.response_status, headers, bytes(record.response_body)
+
+
+class IdempotencyStore:
+    """Records in the database, plus the requests in flight in this worker."""
+
+    def __init__(self, ttl: int, wait: float):
+        self.ttl = ttl
+        self.wait = wait
+        self.lease = max(wait, POLL_INTERVAL) * LEASE_FACTOR
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def claim(self, key: str, fingerprint: str) -> Tuple[str, Optional[Response]]:
+        """Returns ("run", None), ("replay", response), ("mismatch", None) or ("busy", None)."""
+        now = datetime.now(timezone.utc)
+        # also removes pending records whose worker never finished them
+        await IdempotencyRecord.filter(expires_at__lt=now).delete()
+        try:
+            await IdempotencyRecord.create(
+                key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=self.lease)
+            )
+            return "run", None
+        except IntegrityError:
+            pass
+        deadline = time.monotonic() + self.wait
+        while True:
+            record = await IdempotencyRecord.get_or_none(key=key)
+            if record is None:
+                # released after a failure; this request runs instead
+                return await self.claim(key, fingerprint)
+            if record.fingerprint != fingerprint:
+                return "mismatch", None
+            if record.status == "done":
+                return "replay", _from_record(record)
+            if record.expires_at < datetime.now(timezone.utc):
+                # the lease ran out: the worker that claimed the key is gone
+                await IdempotencyRecord.filter(key=key, status="pending", expires_at=record.expires_at).delete()
+                return await self.claim(key, fingerprint)
+            if time.monotonic() >= deadline:
+                return "busy", None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def complete(self, key: str, response: Response):
+        status, headers, body = response
+        await IdempotencyRecord.filter(key=key).update(
+            status="done",
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+            response_status=status,
+            response_headers=json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers]),
+            response_body=body,
+        )
+
+    async def release(self, key: str):
+        await IdempotencyRecord.filter(key=key, status="pending").delete()
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying ``Idempotency-Key`` semantics to ``IDEMPOTENT_ROUTES``."""
+
+    def __init__(self, app, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    def _applies(self, scope) -> bool:
+        return any(scope["method"] == method and pattern.match(scope["path"]) for method, pattern in IDEMPOTENT_ROUTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        client_key = request.headers.get("idempotency-key")
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            await _json_response(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        key = f"{_client_identity(request)}:{client_key}"
+        fingerprint = hashlib.sha256(b"\n".join([scope["method"].encode(), scope["path"].encode(), body])).hexdigest()
+
+        inflight = self.store._inflight.get(key)
+        if inflight is not None:
+            # same worker: wait for the original request instead of polling the database
+            await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self.store._inflight[key] = future
+        try:
+            await self._run_once(scope, receive, send, key, fingerprint, body)
+        finally:
+            if self.store._inflight.get(key) is future:
+                del self.store._inflight[key]
+            future.set_result(None)
+
+    async def _run_once(self, scope, receive, send, key: str, fingerprint: str, body: bytes):
+        outcome, response = await self.store.claim(key, fingerprint)
+        if outcome == "replay":
+            await _replay(send, response)
+            return
+        if outcome == "mismatch":
+            await _json_response(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        if outcome == "busy":
+            await _json_response(send, 409, "A request with this Idempotency-Key is still in progress",
+                                 [(b"retry-after", b"1")])
+            return
+
+        captured = {"status": 500, "headers": [], "body": b""}
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()  # only http.disconnect is left
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = [
+                    (name, value) for name, value in message.get("headers", []) if name.lower() not in _SKIPPED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                captured["body"] += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            await self.store.release(key)
+            raise
+        if captured["status"] >= 500 or captured["status"] in RETRYABLE_STATUSES:
+            await self.store.release(key)
+        else:
+            await self.store.complete(key, (captured["status"], captured["headers"], captured["body"]))
@@ -0,0 +1,163 @@
+"""Per-category and calendar-window leaderboards.
+
+Every completed attempt adds its score to six boards in ``LeaderboardScore``:
+all-time, its calendar month and its ISO week, each once for the attempt's
+category and once for all categories. Each update is a short transaction that
+increments one row, so completing an attempt never scans ``QuizResult``.
+Boards are ranked by average score. A page is an indexed top-N query, and a
+user's own rank is one count of the users ahead of them, so no board is ever
+held in memory.
+
+Windows are calendar periods rather than rolling ones; this is what lets
+increments alone maintain the totals. To rebuild every board from the live
+and archived results run::
+
+    python leaderboards.py rebuild
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from db import PRIMARY
+from models import ArchivedQuizResult, LeaderboardScore, QuizResult
+
+ALL_CATEGORIES = 0
+WINDOWS = ("all", "month", "week")
+
+BoardKey = Tuple[int, str, str]  # (category_id, window, period)
+
+
+def period_for(window: str, when: datetime) -> str:
+    when = when.astimezone(timezone.utc) if when.tzinfo else when
+    if window == "month":
+        return f"{when.year:04d}-{when.month:02d}"
+    if window == "week":
+        year, week, _ = when.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    return "all"
+
+
+def boards_for(category_id: Optional[int], completed_at: datetime) -> List[BoardKey]:
+    categories = [ALL_CATEGORIES] + ([category_id] if category_id else [])
+    return [
+        (category, window, period_for(window, completed_at))
+        for category in categories
+        for window in WINDOWS
+    ]
+
+
+async def _increment(board: dict, score: float) -> bool:
+    """Add a score to an existing row; False if the row does not exist yet."""
+    async with in_transaction(PRIMARY) as connection:
+        row = LeaderboardScore.filter(**board).using_db(connection)
+        # the increment takes the write lock, so the average below sees no concurrent change
+        if not await row.update(quizzes=F("quizzes") + 1, score_sum=F("score_sum") + score):
+            return False
+        quizzes, score_sum = (await row.values_list("quizzes", "score_sum"))[0]
+        await row.update(average_score=score_sum / quizzes)
+    return True
+
+
+async def record_result(user_id: int, category_id: Optional[int], score: float, completed_at: datetime):
+    """Add one completed attempt to its boards."""
+    for category, window, period in boards_for(category_id, completed_at):
+        board = {"category_id": category, "window": window, "period": period, "user_id": user_id}
+        if await _increment(board, score):
+            continue
+        try:
+            async with in_transaction(PRIMARY):
+                await LeaderboardScore.create(**board, quizzes=1, score_sum=score, average_score=score)
+        except IntegrityError:
+            # created concurrently; fall back to the increment
+            await _increment(board, score)
+
+
+async def top(key: BoardKey, limit: int, db=None) -> List[Tuple[int, LeaderboardScore]]:
+    """The first ``limit`` rows of a board with their ranks (ties share a rank)."""
+    category, window, period = key
+    rows = await LeaderboardScore.filter(
+        category_id=category, window=window, period=period
+    ).using_db(db).order_by("-average_score", "-quizzes", "user_id").limit(limit).prefetch_related("user")
+    ranked = []
+    for index, row in enumerate(rows):
+        if ranked and row.average_score == ranked[-1][1].average_score:
+            ranked.append((ranked[-1][0], row))
+        else:
+            ranked.append((index + 1, row))
+    return ranked
+
+
+async def rank_of(key: BoardKey, user_id: int, db=None) -> Optional[Tuple[int, LeaderboardScore]]:
+    """A user's rank and row on a board, or None if they are not on it."""
+    category, window, period = key
+    board = LeaderboardScore.filter(category_id=category, window=window, period=period).using_db(db)
+    row = await board.filter(user_id=user_id).first().prefetch_related("user")
+    if row is None:
+        return None
+    ahead = await board.filter(average_score__gt=row.average_score).count()
+    return ahead + 1, row
+
+
+def _fold(totals: Dict[Tuple, List[float]], rows: Iterable[Tuple[int, Optional[int], float, datetime]]):
+    for user_id, category_id, score, completed_at in rows:
+        for key in boards_for(category_id, completed_at):
+            total = totals.setdefault(key + (user_id,), [0, 0.0])
+            total[0] += 1
+            total[1] += score
+
+
+async def rebuild_leaderboards(batch_size: int = 1000) -> int:
+    """Recompute every board from live and archived results. Returns the number of rows written.
+
+    The old rows are swapped for the new ones in one transaction, so readers never see empty boards.
+    """
+    totals: Dict[Tuple, List[float]] = {}
+    last_id = 0
+    while True:
+        rows = await QuizResult.filter(id__gt=last_id).order_by("id").limit(batch_size).values_list(
+            "id", "user_id", "attempt__category_id", "score", "completed_at"
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        _fold(totals, (row[1:] for row in rows))
+    last_id = 0
+    while True:
+        rows = await ArchivedQuizResult.filter(id__gt=last_id).order_by("id").limit(batch_size).values_list(
+            "id", "user_id", "category_id", "score", "completed_at"
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        _fold(totals, (row[1:] for row in rows))
+
+    async with in_transaction(PRIMARY) as connection:
+        await LeaderboardScore.all().using_db(connection).delete()
+        await LeaderboardScore.bulk_create([
+            LeaderboardScore(
+                category_id=category, window=window, period=period, user_id=user_id,
+                quizzes=quizzes, score_sum=score_sum, average_score=score_sum / quizzes,
+            )
+            for (category, window, period, user_id), (quizzes, score_sum) in totals.items()
+        ], batch_size=batch_size, using_db=connection)
+    return len(totals)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "rebuild":
+            print(f"Rebuilt {await rebuild_leaderboards()} leaderboard rows")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,176 @@
+"""Live quiz sessions over WebSocket with server-enforced timers.
+
+Protocol (JSON messages):
+
+- server -> ``{"type": "question", "index", "total", "time_limit", "question": {...}}``
+  where ``time_limit`` is the number of seconds the client has for this question
+  (the smaller of the question's and the attempt's remaining limit, or null).
+- client -> ``{"type": "answer", "question_id": ..., "answer_id": ...}``
+- server -> ``{"type": "ack", "question_id": ...}`` once the answer is recorded, or
+  ``{"type": "question_timeout", "question_id": ...}`` when the question expired.
+- server -> ``{"type": "result", "result": {...}}`` when the attempt is completed,
+  either after the last question or when ``total_time_limit`` runs out. If the
+  attempt was completed elsewhere (over HTTP or by expiry), its stored result is
+  sent instead and later answers are not recorded.
+- server -> ``{"type": "error", "detail": ...}`` for a message that is not valid
+  JSON or not a valid answer; the session continues.
+
+Questions are served from the attempt's deck, the snapshot taken when they
+were selected, so editing a question during the attempt changes nothing for the
+user. Attempts without a deck load each question when it is pushed.
+Questions already answered in the attempt are skipped, so a dropped connection
+can reconnect and resume. Answers are stored with the time the question was
+pushed and the time it was answered.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+
+import deck
+from auth import get_user_from_token
+from models import Question, QuizAttempt, UserAnswer
+from quiz_results import elapsed_ms, finalize_attempt, parse_selected_ids, record_answer, stored_result
+
+router = APIRouter()
+
+
+def _bearer_token(websocket: WebSocket) -> Optional[str]:
+    """Browsers cannot set headers on WebSocket requests, so ``?token=`` is accepted too."""
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return websocket.query_params.get("token")
+
+
+def _question_message(question: dict, index: int, total: int, time_limit: Optional[float]) -> dict:
+    """``question`` is a deck entry, which never contains correctness."""
+    return {
+        "type": "question",
+        "index": index,
+        "total": total,
+        "time_limit": time_limit,
+        "question": {
+            "id": question["id"],
+            "text": question["text"],
+            "time_limit_seconds": question["time_limit_seconds"],
+            "answers": question["answers"],
+        },
+    }
+
+
+async def _finish(websocket: WebSocket, attempt: QuizAttempt, user) -> None:
+    await _send_result(websocket, attempt, await finalize_attempt(attempt, user))
+
+
+async def _send_result(websocket: WebSocket, attempt: QuizAttempt, result) -> None:
+    if result is None:
+        # completed elsewhere: over HTTP, or by the expiry scheduler at the same deadline
+        result = await stored_result(attempt)
+    if result is None:
+        await websocket.send_json({"type": "error", "detail": "Quiz attempt already completed"})
+    else:
+        await websocket.send_json({"type": "result", "result": result.model_dump(mode="json")})
+    await websocket.close()
+
+
+async def _await_answer(websocket: WebSocket, question: dict, timeout: Optional[float]) -> Optional[int]:
+    """Wait for a valid answer to ``question``; returns its answer id, or None on timeout."""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    valid_ids = {a["id"] for a in question["answers"]}
+    while True:
+        remaining = None if deadline is None else deadline - loop.time()
+        if remaining is not None and remaining <= 0:
+            return None
+        try:
+            message = await asyncio.wait_for(websocket.receive_json(), remaining)
+        except asyncio.TimeoutError:
+            return None
+        except ValueError:
+            # not JSON (json.JSONDecodeError); the session goes on
+            await websocket.send_json({"type": "error", "detail": "Message is not valid JSON"})
+            continue
+        if not isinstance(message, dict) or message.get("type") != "answer":
+            await websocket.send_json({"type": "error", "detail": "Expected an answer message"})
+        elif message.get("question_id") != question["id"]:
+            await websocket.send_json({"type": "error", "detail": "Answer is not for the current question"})
+        elif message.get("answer_id") not in valid_ids:
+            await websocket.send_json({"type": "error", "detail": "Answer not found"})
+        else:
+            return message["answer_id"]
+
+
+@router.websocket("/attempts/{attempt_id}/live")
+async def live_quiz_session(websocket: WebSocket, attempt_id: int):
+    user = None
+    token = _bearer_token(websocket)
+    if token:
+        user = await get_user_from_token(token)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    attempt = await QuizAttempt.get_or_none(id=attempt_id, user=user)
+    if not attempt:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Quiz attempt not found")
+        return
+    if attempt.completed_at:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Quiz attempt already completed")
+        return
+    if attempt.mode == "adaptive":
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Adaptive attempts are served by /next")
+        return
+
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    ends_at = None
+    if attempt.total_time_limit is not None:
+        elapsed = (datetime.now(timezone.utc) - attempt.started_at.replace(tzinfo=timezone.utc)).total_seconds()
+        ends_at = loop.time() + attempt.total_time_limit - elapsed
+
+    question_ids = parse_selected_ids(attempt)
+    if question_ids is None:
+        query = Question.all()
+        if attempt.category_id:
+            query = query.filter(category_id=attempt.category_id)
+        question_ids = await query.order_by("id").values_list("id", flat=True)
+    answered = set(await UserAnswer.filter(attempt_id=attempt.id).values_list("question_id", flat=True))
+    snapshot = deck.unpack(attempt.deck)
+    served = {q["id"]: q for q in snapshot["questions"]} if snapshot else None
+
+    try:
+        for index, question_id in enumerate(question_ids):
+            remaining_total = None if ends_at is None else ends_at - loop.time()
+            if remaining_total is not None and remaining_total <= 0:
+                break
+            if question_id in answered:
+                continue
+            if served is not None:
+                question = served.get(question_id)
+            else:
+                question = next(iter((await deck.snapshot_questions([question_id]))["questions"]), None)
+            if question is None:
+                continue
+            limits = [t for t in (question["time_limit_seconds"], remaining_total) if t is not None]
+            time_limit = min(limits) if limits else None
+            await websocket.send_json(_question_message(question, index, len(question_ids), time_limit))
+            served_after_ms = elapsed_ms(attempt)
+
+            answer_id = await _await_answer(websocket, question, time_limit)
+            if answer_id is None:
+                await websocket.send_json({"type": "question_timeout", "question_id": question_id})
+                continue
+            try:
+                await record_answer(attempt, user, question_id, answer_id, served_after_ms=served_after_ms)
+            except HTTPException as exc:
+                if await QuizAttempt.filter(id=attempt.id, completed_at__isnull=False).exists():
+                    await _send_result(websocket, attempt, None)
+                    return
+                await websocket.send_json({"type": "error", "detail": exc.detail})
+                continue
+            await websocket.send_json({"type": "ack", "question_id": question_id})
+        await _finish(websocket, attempt, user)
+    except WebSocketDisconnect:
+        # The attempt stays open; it can be resumed or completed over HTTP
+        return
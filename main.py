@@ -1,20 +1,78 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from tortoise.contrib.fastapi import register_tortoise
+from admission import LoadSheddingMiddleware, rate_limit
+from compression import CompressionMiddleware
+from idempotency import IdempotencyMiddleware
+from event_loop import BlockingBudgetMiddleware, loop_lag_monitor, router as event_loop_router
+from profiling import ProfilingMiddleware
+import querylog
 from auth import router as auth_router
 from quiz import router as quiz_router
 from quiz_results import router as quiz_results_router
-from config import DATABASE_URL
+from live import router as live_router
+from db import tortoise_config
+import duplicates
+import search
+from scheduler import expiry_scheduler
+from pools import question_pools
+from purge import purge_runner
+from config import FAST_STARTUP
+from startup import check_schema_version, record_schema_version, router as health_router, startup_state, warm_up
 
-app = FastAPI()
 
-app.include_router(auth_router, prefix="/auth", tags=["auth"])
-app.include_router(quiz_router, prefix="/quiz", tags=["quiz"])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the Tortoise lifespan registered below has already connected (and generated schemas)
+    startup_state.reset()
+    querylog.install()
+    loop_lag_monitor.start()
+    async with startup_state.phase("schema"):
+        if FAST_STARTUP:
+            await check_schema_version()
+        else:
+            await record_schema_version()
+    async with startup_state.phase("search_index"):
+        await search.ensure_index()
+    async with startup_state.phase("duplicate_index"):
+        await duplicates.ensure_index()
+    async with startup_state.phase("question_pools"):
+        await question_pools.load()
+    async with startup_state.phase("expiry_scheduler"):
+        await expiry_scheduler.start()
+    warmup = asyncio.create_task(warm_up())
+    yield
+    startup_state.ready = False
+    warmup.cancel()
+    await purge_runner.stop()
+    await question_pools.stop()
+    await expiry_scheduler.stop()
+    await loop_lag_monitor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(querylog.QueryContextMiddleware)
+app.add_middleware(CompressionMiddleware)
+# no-op unless LOOP_BLOCK_BUDGET_MS is set (debug runs and tests)
+app.add_middleware(BlockingBudgetMiddleware)
+# outermost: a shed request must not reach the middlewares above, which query the database
+app.add_middleware(LoadSheddingMiddleware)
+
+app.include_router(auth_router, prefix="/auth", tags=["auth"], dependencies=[Depends(rate_limit("auth"))])
+app.include_router(quiz_router, prefix="/quiz", tags=["quiz"], dependencies=[Depends(rate_limit("quiz"))])
+# quiz_results routes pick their own "attempts" / "statistics" rate-limit groups
 app.include_router(quiz_results_router, prefix="/quiz", tags=["quiz-results"])
+app.include_router(live_router, prefix="/quiz", tags=["quiz-live"])
+app.include_router(health_router, prefix="/health", tags=["health"])
+app.include_router(querylog.router, prefix="/admin", tags=["admin"])
+app.include_router(event_loop_router, prefix="/admin", tags=["admin"])
 
 register_tortoise(
     app,
-    db_url=DATABASE_URL,
-    modules={"models": ["models"]},
-    generate_schemas=True,
+    config=tortoise_config(),
+    generate_schemas=not FAST_STARTUP,
     add_exception_handlers=True,
 )
@@ -42,8 +42,20 @@ class UserAnswer(Model):
     id = fields.IntField(pk=True)
     user = fields.ForeignKeyField('models.User', related_name='user_answers', on_delete=fields.CASCADE)
     question = fields.ForeignKeyField('models.Question', related_name='user_answers', on_delete=fields.CASCADE)
-    answer = fields.ForeignKeyField('models.Answer', related_name='user_answers', on_delete=fields.CASCADE)
+    # no database constraint: answers to a deck may point at answers deleted since it was snapshotted
+    answer = fields.ForeignKeyField(
+        'models.Answer', related_name='user_answers', on_delete=fields.NO_ACTION, db_constraint=False
+    )
+    attempt = fields.ForeignKeyField('models.QuizAttempt', related_name='user_answers', null=True, on_delete=fields.CASCADE)
     answered_at = fields.DatetimeField(auto_now_add=True)
+    # timing relative to attempt.started_at, in milliseconds
+    served_after_ms = fields.IntField(null=True)
+    answered_after_ms = fields.IntField(null=True)
+    is_late = fields.BooleanField(default=False)  # answered after the question's time limit; not scored
+
+    class Meta:
+        # one answer per question and attempt; legacy answers without an attempt are not constrained
+        unique_together = (("attempt", "question"),)
 
 
 class QuizAttempt(Model):
@@ -58,10 +70,17 @@ class QuizAttempt(Model):
     num_questions = fields.IntField(null=True)
     randomize = fields.BooleanField(default=False)
     selected_question_ids = fields.TextField(null=True)  # comma-separated question ids
+    mode = fields.CharField(max_length=20, default="fixed")  # fixed | adaptive
+    current_difficulty = fields.CharField(max_length=20, null=True)  # adaptive mode only
+    deck = fields.BinaryField(null=True)  # compressed snapshot of served questions, see deck.py
+
+    class Meta:
+        # attempt history: keyset pages of one user's attempts, newest first
+        indexes = (("user_id", "id"),)
 
 class QuizResult(Model):
     id = fields.IntField(pk=True)
-    attempt = fields.ForeignKeyField('models.QuizAttempt', related_name='results', on_delete=fields.CASCADE)
+    attempt = fields.ForeignKeyField('models.QuizAttempt', related_name='results', on_delete=fields.CASCADE, index=True)
     user = fields.ForeignKeyField('models.User', related_name='quiz_results', on_delete=fields.CASCADE)
     total_questions = fields.IntField()
     correct_answers = fields.IntField()
@@ -71,10 +90,162 @@ class QuizResult(Model):
 
 class UserStatistics(Model):
     id = fields.IntField(pk=True)
-    user = fields.ForeignKeyField('models.User', related_name='statistics', on_delete=fields.CASCADE)
+    user = fields.OneToOneField('models.User', related_name='statistics', on_delete=fields.CASCADE)
     total_quizzes = fields.IntField(default=0)
     total_questions_answered = fields.IntField(default=0)
     correct_answers = fields.IntField(default=0)
     average_score = fields.FloatField(default=0.0)
     total_time_spent = fields.IntField(default=0)  # in seconds
     last_quiz_date = fields.DatetimeField(null=True)
+
+
+class QuestionStatistics(Model):
+    """Answer counters per question, updated incrementally as answers are recorded."""
+    id = fields.IntField(pk=True)
+    question = fields.OneToOneField('models.Question', related_name='statistics', on_delete=fields.CASCADE)
+    total_answers = fields.IntField(default=0)
+    correct_answers = fields.IntField(default=0)
+
+
+class AnswerStatistics(Model):
+    """How often each answer option was chosen."""
+    id = fields.IntField(pk=True)
+    answer = fields.OneToOneField('models.Answer', related_name='statistics', on_delete=fields.CASCADE)
+    question = fields.ForeignKeyField('models.Question', related_name='answer_statistics', on_delete=fields.CASCADE)
+    times_chosen = fields.IntField(default=0)
+
+
+class CacheGeneration(Model):
+    """Invalidation counter per named cache, shared by all workers (see cache.py)."""
+    name = fields.CharField(max_length=50, pk=True)
+    generation = fields.IntField(default=0)
+
+
+class QuestionSignature(Model):
+    """Normalized-text fingerprint and MinHash signature of a question (see duplicates.py)."""
+    id = fields.IntField(pk=True)
+    question = fields.OneToOneField('models.Question', related_name='signature', on_delete=fields.CASCADE)
+    fingerprint = fields.CharField(max_length=40, index=True)  # sha1 of the normalized text
+    minhash = fields.BinaryField()  # NUM_PERM unsigned 64-bit values
+
+
+class QuestionLshBucket(Model):
+    """One LSH band of a question's signature; questions sharing a bucket are duplicate candidates."""
+    id = fields.IntField(pk=True)
+    question = fields.ForeignKeyField('models.Question', related_name='lsh_buckets', on_delete=fields.CASCADE)
+    band = fields.SmallIntField()
+    bucket = fields.BigIntField()
+
+    class Meta:
+        indexes = (("band", "bucket"),)
+
+
+class SchemaVersion(Model):
+    """Single row recording the schema version the tables were generated for (see startup.py)."""
+    id = fields.IntField(pk=True)
+    version = fields.IntField()
+
+
+class PurgeJob(Model):
+    """Background bulk deletion of questions or categories (see purge.py)."""
+    id = fields.IntField(pk=True)
+    kind = fields.CharField(max_length=20)  # questions | categories
+    target_ids = fields.TextField()  # comma-separated ids
+    status = fields.CharField(max_length=20, default="pending")  # pending | running | done | failed | interrupted
+    total = fields.IntField(default=0)
+    processed = fields.IntField(default=0)
+    affected_rows = fields.IntField(default=0)  # rows deleted or detached from a category
+    error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    finished_at = fields.DatetimeField(null=True)
+
+
+class ArchivedQuizResult(Model):
+    """QuizResult moved out of the hot table by archive.py. Same id as the original row."""
+    id = fields.IntField(pk=True)
+    # no database constraint, like the other archive columns; the relation only serves joins
+    attempt = fields.ForeignKeyField(
+        'models.QuizAttempt', related_name='archived_results', db_constraint=False, on_delete=fields.NO_ACTION,
+        index=True,
+    )
+    user_id = fields.IntField(index=True)
+    category_id = fields.IntField(null=True)  # attempt's category when archived
+    total_questions = fields.IntField()
+    correct_answers = fields.IntField()
+    score = fields.FloatField()
+    timed_out = fields.BooleanField(default=False)
+    time_spent = fields.IntField(null=True)  # attempt's time_spent when archived
+    completed_at = fields.DatetimeField()
+
+
+class ArchivedUserAnswer(Model):
+    """UserAnswer moved out of the hot table by archive.py. Same id as the original row."""
+    id = fields.IntField(pk=True)
+    user_id = fields.IntField()
+    question_id = fields.IntField()
+    answer_id = fields.IntField()
+    attempt_id = fields.IntField(index=True)
+    answered_at = fields.DatetimeField()
+    served_after_ms = fields.IntField(null=True)
+    answered_after_ms = fields.IntField(null=True)
+    is_late = fields.BooleanField(default=False)
+
+
+class CategoryStatisticsRollup(Model):
+    """Per-user, per-category totals of archived quiz results."""
+    id = fields.IntField(pk=True)
+    user = fields.ForeignKeyField('models.User', related_name='category_rollups', on_delete=fields.CASCADE)
+    category = fields.ForeignKeyField('models.Category', related_name='statistics_rollups', on_delete=fields.CASCADE)
+    total_quizzes = fields.IntField(default=0)
+    total_questions_answered = fields.IntField(default=0)
+    correct_answers = fields.IntField(default=0)
+    score_sum = fields.FloatField(default=0.0)
+    best_score = fields.FloatField(default=0.0)
+    worst_score = fields.FloatField(default=0.0)
+    total_time_spent = fields.IntField(default=0)  # in seconds
+
+    class Meta:
+        unique_together = (("user", "category"),)
+
+
+class LeaderboardScore(Model):
+    """One user's totals on one leaderboard, maintained by leaderboards.py.
+
+    A board is (category_id, window, period): ``category_id`` 0 means all
+    categories; ``window`` is all / month / week and ``period`` names the
+    calendar month (``2024-05``) or ISO week (``2024-W19``), or ``all``.
+    """
+    id = fields.IntField(pk=True)
+    category_id = fields.IntField(default=0)
+    window = fields.CharField(max_length=10)
+    period = fields.CharField(max_length=10)
+    user = fields.ForeignKeyField('models.User', related_name='leaderboard_scores', on_delete=fields.CASCADE)
+    quizzes = fields.IntField(default=0)
+    score_sum = fields.FloatField(default=0.0)
+    average_score = fields.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = (("category_id", "window", "period", "user"),)
+        indexes = (("category_id", "window", "period", "average_score"),)
+
+
+class ScoreHistogramBin(Model):
+    """Number of quiz results per score bin; category_id 0 is the global histogram (see distribution.py)."""
+    id = fields.IntField(pk=True)
+    category_id = fields.IntField(default=0)
+    bin = fields.IntField()
+    count = fields.IntField(default=0)
+
+    class Meta:
+        unique_together = (("category_id", "bin"),)
+
+
+class IdempotencyRecord(Model):
+    """Stored response of a request sent with an Idempotency-Key (see idempotency.py)."""
+    key = fields.CharField(max_length=400, pk=True)  # caller identity + client key
+    fingerprint = fields.CharField(max_length=64)  # sha256 of method, path and body
+    status = fields.CharField(max_length=10, default="pending")  # pending | done
+    response_status = fields.IntField(null=True)
+    response_headers = fields.TextField(null=True)  # JSON list of [name, value]
+    response_body = fields.BinaryField(null=True)
+    expires_at = fields.DatetimeField(index=True)
@@ -0,0 +1,168 @@
+"""In-memory question id pools per (category, difficulty) for adaptive attempts.
+
+Pools are loaded once at startup and kept current by question CRUD in ``quiz.py``.
+Question writes made by other workers reload them in a background task, scheduled
+through ``question_cache``, so serving a question never scans the table. A reload
+builds new pools and swaps them in at once, replaying the local CRUD applied while
+it ran. Requests keep picking from the current pools in the meantime. Every question is in its own category's pool and in the any-category pool for
+its difficulty. Adding, removing and picking a question are O(1).
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, List, Optional, Set, Tuple
+
+from cache import question_cache
+from models import Question
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTY_LEVELS = ("easy", "medium", "hard")
+ANY_CATEGORY = "*"
+
+# random picks tried before falling back to scanning a nearly exhausted pool
+PICK_TRIES = 8
+
+
+class _Pool:
+    __slots__ = ("ids", "positions")
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def add(self, question_id: int):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id: int):
+        index = self.positions.pop(question_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[index] = last
+            self.positions[last] = index
+
+    def pick(self, exclude: Set[int]) -> Optional[int]:
+        if len(self.ids) <= len(exclude):
+            # small or nearly exhausted pool: its size is bounded by the attempt length
+            candidates = [qid for qid in self.ids if qid not in exclude]
+            return random.choice(candidates) if candidates else None
+        for _ in range(PICK_TRIES):
+            question_id = random.choice(self.ids)
+            if question_id not in exclude:
+                return question_id
+        candidates = [qid for qid in self.ids if qid not in exclude]
+        return random.choice(candidates) if candidates else None
+
+
+class QuestionPools:
+    def __init__(self):
+        self._pools: Dict[Tuple, _Pool] = {}
+        self._keys: Dict[int, Tuple] = {}  # question id -> (category_id, difficulty)
+        # local CRUD applied while a load reads the table, replayed onto its result
+        self._changes: Optional[List[Tuple]] = None
+        self._reload: Optional[asyncio.Task] = None
+        self._reload_again = False
+
+    async def load(self):
+        self._changes = []
+        try:
+            rows = await Question.all().values_list("id", "category_id", "difficulty")
+        finally:
+            changes, self._changes = self._changes, None
+        fresh = QuestionPools()
+        for question_id, category_id, difficulty in rows:
+            fresh.add(question_id, category_id, difficulty)
+        for change in changes:
+            if change[0] == "add":
+                fresh.add(*change[1:])
+            else:
+                fresh.remove(change[1])
+        self._pools, self._keys = fresh._pools, fresh._keys
+
+    async def schedule_reload(self):
+        """Reload in a background task; a reload requested while one runs is done after it."""
+        if self._reload is not None and not self._reload.done():
+            self._reload_again = True
+            return
+        self._reload = asyncio.get_running_loop().create_task(self._reload_until_current())
+
+    async def _reload_until_current(self):
+        while True:
+            self._reload_again = False
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("question pool reload failed")
+            if not self._reload_again:
+                return
+
+    async def reloaded(self):
+        """Wait for a scheduled reload to finish."""
+        if self._reload is not None:
+            await asyncio.shield(self._reload)
+
+    async def stop(self):
+        if self._reload is not None:
+            self._reload.cancel()
+            await asyncio.gather(self._reload, return_exceptions=True)
+            self._reload = None
+
+    def add(self, question_id: int, category_id: Optional[int], difficulty: Optional[str]):
+        if self._changes is not None:
+            self._changes.append(("add", question_id, category_id, difficulty))
+        if difficulty not in DIFFICULTY_LEVELS:
+            return
+        self._keys[question_id] = (category_id, difficulty)
+        for key in ((category_id, difficulty), (ANY_CATEGORY, difficulty)):
+            self._pools.setdefault(key, _Pool()).add(question_id)
+
+    def remove(self, question_id: int):
+        if self._changes is not None:
+            self._changes.append(("remove", question_id))
+        key = self._keys.pop(question_id, None)
+        if key is None:
+            return
+        category_id, difficulty = key
+        for pool_key in (key, (ANY_CATEGORY, difficulty)):
+            pool = self._pools.get(pool_key)
+            if pool is not None:
+                pool.remove(question_id)
+
+    def update(self, question_id: int, category_id: Optional[int], difficulty: Optional[str]):
+        self.remove(question_id)
+        self.add(question_id, category_id, difficulty)
+
+    def pick(self, category_id: Optional[int], difficulty: str, exclude: Set[int]) -> Optional[int]:
+        """Pick a random question id of ``difficulty`` not in ``exclude``.
+
+        ``category_id=None`` draws from all categories.
+        """
+        pool = self._pools.get((ANY_CATEGORY if category_id is None else category_id, difficulty))
+        return pool.pick(exclude) if pool else None
+
+
+def next_difficulty(current: str, answered: int, correct: int) -> str:
+    """Step difficulty up or down from the running accuracy inside the attempt."""
+    if not answered:
+        return current
+    accuracy = correct / answered
+    level = DIFFICULTY_LEVELS.index(current)
+    if accuracy >= 0.75:
+        level = min(level + 1, len(DIFFICULTY_LEVELS) - 1)
+    elif accuracy < 0.5:
+        level = max(level - 1, 0)
+    return DIFFICULTY_LEVELS[level]
+
+
+def fallback_order(difficulty: str) -> List[str]:
+    """The requested difficulty first, then the others by distance from it."""
+    level = DIFFICULTY_LEVELS.index(difficulty)
+    return sorted(DIFFICULTY_LEVELS, key=lambda d: abs(DIFFICULTY_LEVELS.index(d) - level))
+
+
+question_pools = QuestionPools()
+question_cache.on_change(question_pools.schedule_reload)
@@ -0,0 +1,196 @@
+"""On-demand sampling profiler for single requests.
+
+An admin adds ``X-Profile: 1`` (or ``?profile=1``) to a request. The request
+then runs under a ``StackSampler``: a background thread that records the
+request's stack every ``PROFILE_SAMPLE_INTERVAL_MS``. When the request is
+running, the sample is the event-loop thread's stack. When the request is
+suspended, the sample is its chain of awaits down to the awaited future, so
+time spent waiting for the database shows up as well as CPU time. Other
+requests running at the same time are never attributed to the profiled one.
+
+The result is in collapsed-stack format (``frame;frame;frame count`` per line),
+which ``flamegraph.pl``, speedscope and inferno read directly. It is written to
+``PROFILE_DIR`` and named in the ``X-Profile-File`` response header. Without a
+``PROFILE_DIR``, or with ``X-Profile: inline``, the profile replaces the response
+body, and the original status is kept in ``X-Profile-Response-Status``.
+
+Requests without the flag only pay for one header lookup.
+"""
+import asyncio
+import gc
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from starlette.requests import Request
+
+from auth import get_user_from_token, is_admin
+from config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS
+
+_FALSE = {"", "0", "false", "no", "off"}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # ';' separates frames in collapsed stacks; the count follows the last space
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """Samples the stack of one coroutine from a background thread."""
+
+    def __init__(self, coro, interval: float):
+        self.coro = coro
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                stack = self._sample()
+            except (AttributeError, ValueError):
+                # the coroutine changed state while it was being walked
+                continue
+            if stack:
+                self.samples[";".join(stack)] += 1
+
+    def _sample(self) -> Optional[List[str]]:
+        root = self.coro.cr_frame
+        if root is None:
+            return None
+        frame = sys._current_frames().get(self._thread_id)
+        running = []
+        while frame is not None:
+            running.append(frame)
+            if frame is root:
+                return [_frame_label(f) for f in reversed(running)]
+            frame = frame.f_back
+        # suspended: follow the chain of awaits down to what it waits for
+        stack = []
+        awaited = self.coro
+        while awaited is not None:
+            frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+            if frame is None:
+                stack.append(f"[await {type(awaited).__name__}]")
+                break
+            stack.append(_frame_label(frame))
+            awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None)
+            if type(awaited).__name__ == "coroutine_wrapper":
+                # coro.__await__() (as awaitable querysets return) hides the coroutine it wraps
+                awaited = next((ref for ref in gc.get_referents(awaited) if hasattr(ref, "cr_frame")), awaited)
+        return stack
+
+
+def collapsed(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+def _profile_flag(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.decode("latin-1").strip().lower()
+    query = scope.get("query_string", b"")
+    if b"profile" in query:
+        value = Request(scope).query_params.get("profile")
+        if value is not None:
+            return value.strip().lower()
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it with an admin token."""
+
+    def __init__(self, app, directory: Optional[str] = PROFILE_DIR, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.app = app
+        self.directory = directory
+        self.interval = max(interval_ms, 0.1) / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        flag = _profile_flag(scope)
+        if flag is None or flag in _FALSE:
+            await self.app(scope, receive, send)
+            return
+        if not await self._is_admin(scope):
+            await _plain_response(send, 403, b"Profiling requires an admin token")
+            return
+        inline = flag == "inline" or not self.directory
+        await self._profile(scope, receive, send, inline)
+
+    async def _is_admin(self, scope) -> bool:
+        scheme, _, token = Request(scope).headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        return is_admin(await get_user_from_token(token))
+
+    async def _profile(self, scope, receive, send, inline: bool):
+        captured = {"status": 500}
+        if inline:
+            async def respond(message):
+                # the profile replaces the body, so nothing of the response goes out
+                if message["type"] == "http.response.start":
+                    captured["status"] = message["status"]
+        else:
+            safe_path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+            filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{scope['method']}-{safe_path}.folded"
+
+            async def respond(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", filename.encode())]}
+                await send(message)
+
+        coro = self.app(scope, receive, respond)
+        sampler = StackSampler(coro, self.interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await coro
+        finally:
+            samples = sampler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        profile = collapsed(samples)
+        if inline:
+            await _plain_response(send, 200, profile.encode(), [
+                (b"x-profile-samples", str(sum(samples.values())).encode()),
+                (b"x-profile-elapsed-ms", f"{elapsed_ms:.1f}".encode()),
+                (b"x-profile-response-status", str(captured["status"]).encode()),
+            ])
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(_write, os.path.join(self.directory, filename), profile)
+
+
+def _write(path: str, profile: str):
+    with open(path, "w") as fh:
+        fh.write(profile)
+
+
+async def _plain_response(send, status: int, body: bytes, extra_headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
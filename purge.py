@@ -0,0 +1,139 @@
+"""Background bulk deletion of questions and categories in bounded chunks.
+
+Deleting one popular question inline cascades through every ``Answer`` and
+``UserAnswer`` row in a single transaction and holds the SQLite write lock for
+seconds. A purge job deletes the same rows, child tables first, at most
+``PURGE_CHUNK_SIZE`` rows per statement. Between statements it yields to the
+event loop, so concurrent quiz traffic gets the write lock in between. The
+statements are idempotent, so resubmitting an interrupted or failed job is safe.
+
+Job progress is stored in ``PurgeJob`` and can be read from any worker. The job
+itself runs in the worker that accepted it.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+import search
+from cache import bump
+from config import PURGE_CHUNK_SIZE, PURGE_PAUSE_MS
+from db import PRIMARY
+from models import (
+    Answer, AnswerStatistics, Category, LeaderboardScore, PurgeJob, Question, QuestionLshBucket,
+    QuestionSignature, QuestionStatistics, QuizAttempt, ScoreHistogramBin, UserAnswer,
+)
+from pools import question_pools
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeRunner:
+    def __init__(self, chunk_size: int = 500, pause_ms: float = 0):
+        self.chunk_size = max(chunk_size, 1)
+        self.pause = pause_ms / 1000
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def submit(self, kind: str, ids: List[int]) -> PurgeJob:
+        job = await PurgeJob.create(kind=kind, target_ids=",".join(str(i) for i in ids), total=len(ids))
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._run(job.id, kind, ids))
+        return job
+
+    async def stop(self):
+        """Cancel running jobs; they are marked ``interrupted`` and can be resubmitted."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: int, kind: str, ids: List[int]):
+        await PurgeJob.filter(id=job_id).update(status="running")
+        try:
+            if kind == "questions":
+                await self._purge_questions(job_id, ids)
+            else:
+                await self._purge_categories(job_id, ids)
+        except asyncio.CancelledError:
+            await PurgeJob.filter(id=job_id).update(status="interrupted", finished_at=datetime.now(timezone.utc))
+            raise
+        except Exception as exc:
+            logger.exception("Purge job %s failed", job_id)
+            await PurgeJob.filter(id=job_id).update(
+                status="failed", error=str(exc), finished_at=datetime.now(timezone.utc)
+            )
+        else:
+            await PurgeJob.filter(id=job_id).update(status="done", finished_at=datetime.now(timezone.utc))
+        finally:
+            self._tasks.pop(job_id, None)
+
+    async def _yield(self):
+        await asyncio.sleep(self.pause)
+
+    async def _delete_in_chunks(self, queryset) -> int:
+        """Delete the rows of ``queryset`` with one short statement per chunk."""
+        deleted = 0
+        while True:
+            ids = await queryset.limit(self.chunk_size).values_list("id", flat=True)
+            if not ids:
+                return deleted
+            deleted += await queryset.model.filter(id__in=ids).delete()
+            await self._yield()
+
+    async def _purge_questions(self, job_id: int, question_ids: List[int]):
+        for start in range(0, len(question_ids), self.chunk_size):
+            chunk = question_ids[start:start + self.chunk_size]
+            deleted = await self._delete_in_chunks(UserAnswer.filter(question_id__in=chunk))
+            deleted += await self._delete_in_chunks(AnswerStatistics.filter(question_id__in=chunk))
+            deleted += await self._delete_in_chunks(Answer.filter(question_id__in=chunk))
+            # duplicate-index rows are derived data, like the search index, and not counted
+            await self._delete_in_chunks(QuestionLshBucket.filter(question_id__in=chunk))
+            await self._delete_in_chunks(QuestionSignature.filter(question_id__in=chunk))
+            async with in_transaction(PRIMARY) as connection:
+                deleted += await QuestionStatistics.filter(question_id__in=chunk).using_db(connection).delete()
+                deleted += await Question.filter(id__in=chunk).using_db(connection).delete()
+            for question_id in chunk:
+                await search.remove_question(question_id)
+                question_pools.remove(question_id)
+            await bump("questions", "answer_keys")
+            await self._advance(job_id, len(chunk), deleted)
+
+    async def _purge_categories(self, job_id: int, category_ids: List[int]):
+        for category_id in category_ids:
+            updated = 0
+            # detach questions and attempts first (what SET_NULL would do in one statement)
+            while True:
+                rows = await Question.filter(category_id=category_id).limit(self.chunk_size).values_list(
+                    "id", "difficulty"
+                )
+                if not rows:
+                    break
+                updated += await Question.filter(id__in=[qid for qid, _ in rows]).update(category_id=None)
+                for question_id, difficulty in rows:
+                    question_pools.update(question_id, None, difficulty)
+                await self._yield()
+            while True:
+                ids = await QuizAttempt.filter(category_id=category_id).limit(self.chunk_size).values_list(
+                    "id", flat=True
+                )
+                if not ids:
+                    break
+                updated += await QuizAttempt.filter(id__in=ids).update(category_id=None)
+                await self._yield()
+            # the category's boards and histogram are keyed by a plain category_id, so nothing cascades
+            deleted = await self._delete_in_chunks(LeaderboardScore.filter(category_id=category_id))
+            deleted += await self._delete_in_chunks(ScoreHistogramBin.filter(category_id=category_id))
+            deleted += await Category.filter(id=category_id).delete()
+            await bump("categories", "questions")
+            await self._advance(job_id, 1, deleted + updated)
+
+    async def _advance(self, job_id: int, processed: int, rows: int):
+        await PurgeJob.filter(id=job_id).update(
+            processed=F("processed") + processed, affected_rows=F("affected_rows") + rows
+        )
+        await self._yield()
+
+
+purge_runner = PurgeRunner(PURGE_CHUNK_SIZE, PURGE_PAUSE_MS)
@@ -0,0 +1,243 @@
+"""Slow query log and per-statement query statistics.
+
+``install()`` wraps the execute methods of every Tortoise database client
+class, so that every statement is timed: ORM queries, raw SQL and statements
+run inside transactions. Statements are grouped by fingerprint. The
+fingerprint is the SQL template with whitespace collapsed, literals replaced
+by ``?`` and ``IN (?, ?, ...)`` lists of any length folded into one. For each
+fingerprint the worker keeps calls, total and maximum time, rows and the
+routes that issued it.
+
+A statement slower than ``SLOW_QUERY_MS`` is logged on the ``querylog`` logger
+with its template, duration, row count and originating route and handler.
+Durations are what the caller waited for, so on SQLite they include waiting
+for the connection lock. Set ``SLOW_QUERY_MS`` to ``-1`` to turn the log off.
+
+Statistics are kept per worker, in memory, for at most
+``QUERY_STATS_MAX_FINGERPRINTS`` fingerprints. Admins read the top-N table at
+``GET /admin/queries`` and reset it with ``DELETE /admin/queries``.
+"""
+import functools
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from auth import get_admin_user
+from config import QUERY_STATS_MAX_FINGERPRINTS, SLOW_QUERY_MS
+from schemas import QueryStatsEntry, QueryStatsResponse
+
+logger = logging.getLogger("querylog")
+
+_EXECUTE_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+MAX_ROUTES_PER_FINGERPRINT = 20
+
+_request_scope: ContextVar[Optional[dict]] = ContextVar("querylog_request_scope", default=None)
+# set while a statement is timed, so that client methods calling each other count once
+_timing: ContextVar[bool] = ContextVar("querylog_timing", default=False)
+
+_NUMBERED_PARAM = re.compile(r"\$\d+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(sql: str) -> str:
+    """The statement's template: literals replaced by ``?`` and value lists folded."""
+    sql = _SPACE.sub(" ", sql).strip()
+    sql = _NUMBERED_PARAM.sub("?", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _VALUE_LIST.sub("(?, ...)", sql)
+
+
+def fingerprint(template: str) -> str:
+    return hashlib.sha1(template.encode()).hexdigest()[:12]
+
+
+def route_label(scope: Optional[dict]) -> str:
+    """``METHOD /route/{template} (module.handler)`` of the request issuing a statement."""
+    if scope is None:
+        return "background"
+    method = scope.get("method", "WS")
+    route = scope.get("route")
+    endpoint = scope.get("endpoint")
+    if route is None or endpoint is None:
+        # not routed yet: a middleware or a dependency of the router itself
+        return f"{method} {scope.get('path', '')}"
+    template = getattr(route, "path", "")
+    path = scope.get("path", "")
+    # recent FastAPI mounts included routers, so their routes' paths lack the include prefix;
+    # it is what precedes the route's own path rendered with this request's parameters
+    try:
+        own_path = route.url_path_for(route.name, **scope.get("path_params", {}))
+    except Exception:
+        # labelling must never fail the statement it labels
+        own_path = path
+    prefix = path[:-len(own_path)] if own_path != path and path.endswith(own_path) else ""
+    return f"{method} {prefix}{template} ({endpoint.__module__}.{endpoint.__qualname__})"
+
+
+class _Statement:
+    __slots__ = ("template", "calls", "total_ms", "max_ms", "rows", "slow_calls", "routes")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.routes: Counter = Counter()
+
+
+class QueryStats:
+    def __init__(self, max_fingerprints: int = 500, slow_ms: float = 100):
+        self.max_fingerprints = max(max_fingerprints, 1)
+        self.slow_ms = slow_ms
+        self._statements: Dict[str, _Statement] = {}
+        self.since = datetime.now(timezone.utc)
+
+    def record(self, sql: str, duration_ms: float, rows: int, scope: Optional[dict]):
+        template = normalize(sql)
+        statement = self._statements.get(template)
+        if statement is None:
+            if len(self._statements) >= self.max_fingerprints:
+                # make room by forgetting the statement that cost the least so far
+                cheapest = min(self._statements, key=lambda key: self._statements[key].total_ms)
+                del self._statements[cheapest]
+            statement = self._statements[template] = _Statement(template)
+        statement.calls += 1
+        statement.total_ms += duration_ms
+        statement.max_ms = max(statement.max_ms, duration_ms)
+        statement.rows += rows
+        route = route_label(scope)
+        if route in statement.routes or len(statement.routes) < MAX_ROUTES_PER_FINGERPRINT:
+            statement.routes[route] += 1
+        if 0 <= self.slow_ms <= duration_ms:
+            statement.slow_calls += 1
+            logger.warning(
+                "slow query: %.1f ms, %d rows, route=%s, sql=%s", duration_ms, rows, route, template
+            )
+
+    def top(self, limit: int, order_by: str = "total_ms") -> List[QueryStatsEntry]:
+        statements = sorted(self._statements.values(), key=lambda s: getattr(s, order_by), reverse=True)
+        return [
+            QueryStatsEntry(
+                fingerprint=fingerprint(s.template),
+                sql=s.template,
+                calls=s.calls,
+                total_ms=round(s.total_ms, 3),
+                mean_ms=round(s.total_ms / s.calls, 3),
+                max_ms=round(s.max_ms, 3),
+                rows=s.rows,
+                slow_calls=s.slow_calls,
+                routes=dict(s.routes.most_common(5)),
+            )
+            for s in statements[:limit]
+        ]
+
+    def reset(self):
+        self._statements.clear()
+        self.since = datetime.now(timezone.utc)
+
+
+query_stats = QueryStats(QUERY_STATS_MAX_FINGERPRINTS, SLOW_QUERY_MS)
+
+
+def _row_count(method: str, args, result) -> int:
+    if method == "execute_query":
+        return result[0]
+    if method == "execute_query_dict":
+        return len(result)
+    if method == "execute_many":
+        return len(args[1]) if len(args) > 1 else 0
+    if method == "execute_insert":
+        return 1
+    return 0
+
+
+def _timed(method: str, call):
+    @functools.wraps(call)
+    async def wrapper(self, *args, **kwargs):
+        if _timing.get():
+            return await call(self, *args, **kwargs)
+        token = _timing.set(True)
+        started = time.perf_counter()
+        try:
+            result = await call(self, *args, **kwargs)
+        finally:
+            _timing.reset(token)
+        query = args[0] if args else kwargs.get("query", "")
+        query_stats.record(
+            query, (time.perf_counter() - started) * 1000, _row_count(method, args, result), _request_scope.get()
+        )
+        return result
+
+    wrapper._querylog_wrapped = True
+    return wrapper
+
+
+def _client_classes(cls=BaseDBAsyncClient):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _client_classes(subclass)
+
+
+def install():
+    """Time the execute methods of every loaded client class. Safe to call repeatedly."""
+    for cls in _client_classes():
+        for method in _EXECUTE_METHODS:
+            call = cls.__dict__.get(method)
+            if call is not None and not getattr(call, "_querylog_wrapped", False):
+                setattr(cls, method, _timed(method, call))
+
+
+class QueryContextMiddleware:
+    """Makes the request's scope available to the statements it issues."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        # the router fills in "route" and "endpoint" on this same dict later on
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+router = APIRouter()
+
+
+@router.get("/queries", response_model=QueryStatsResponse)
+async def get_query_stats(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["total_ms", "max_ms", "calls", "slow_calls", "rows"] = "total_ms",
+    admin=Depends(get_admin_user)
+):
+    """The most expensive statements seen by this worker, grouped by fingerprint."""
+    return QueryStatsResponse(
+        worker_since=query_stats.since,
+        slow_query_ms=query_stats.slow_ms,
+        statements=query_stats.top(limit, order_by),
+    )
+
+
+@router.delete("/queries", status_code=204)
+async def reset_query_stats(admin=Depends(get_admin_user)):
+    query_stats.reset()
+    return Response(status_code=204)
@@ -1,31 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException
-from models import Question, Answer, User, Category
+from fastapi import APIRouter, Depends, HTTPException, Query
+from models import Question, Answer, User, Category, PurgeJob, LeaderboardScore, ScoreHistogramBin
 from auth import get_current_user
 from schemas import (
     QuestionCreate, QuestionUpdate, QuestionResponse, AnswerResponse,
-    AnswerCreate, AnswerUpdate, CategoryCreate, CategoryResponse
+    AnswerCreate, AnswerUpdate, CategoryCreate, CategoryResponse, QuestionAnalytics,
+    QuestionPurgeRequest, CategoryPurgeRequest, PurgeJobResponse,
+    QuestionBulkUpdate, AnswerBulkUpdate, BulkItemStatus, BulkUpdateResponse,
+    QuestionCreateResponse, QuestionImportItem, QuestionImportResponse, DuplicateReport
 )
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Tuple
+from tortoise.transactions import in_transaction
+import analytics
+import duplicates
+import search
+from pools import question_pools
+from db import PRIMARY, get_read_connection
+from cache import bump, category_cache, question_cache
+from config import DUPLICATE_POLICY, DUPLICATE_THRESHOLD
+from purge import purge_runner
 
 router = APIRouter()
 
+DuplicatePolicy = Literal["warn", "reject", "allow"]
+
+
+def _question_response(question: Question) -> QuestionResponse:
+    """Build a QuestionResponse from a question with ``answers`` and ``category`` fetched."""
+    return QuestionResponse(
+        id=question.id,
+        text=question.text,
+        category_id=question.category_id,
+        category=question.category.name if question.category else None,
+        difficulty=question.difficulty,
+        time_limit_seconds=question.time_limit_seconds,
+        answers=[
+            AnswerResponse(id=a.id, text=a.text, is_correct=a.is_correct, question_id=a.question_id)
+            for a in question.answers
+        ],
+    )
+
+
+
+async def load_categories() -> List[CategoryResponse]:
+    async def load():
+        return [CategoryResponse.model_validate(cat) for cat in await Category.all()]
+
+    return await category_cache.get("all", load)
+
 
 @router.post("/categories/", response_model=CategoryResponse)
 async def create_category(category: CategoryCreate, current_user: User = Depends(get_current_user)):
     new_category = await Category.create(**category.model_dump())
+    await bump("categories")
     return CategoryResponse.model_validate(new_category)
 
 @router.get("/categories/", response_model=List[CategoryResponse])
 async def get_categories(current_user: User = Depends(get_current_user)):
-    categories = await Category.all()
-    return [CategoryResponse.model_validate(cat) for cat in categories]
+    return await load_categories()
 
 @router.get("/categories/{category_id}", response_model=CategoryResponse)
 async def get_category(category_id: int, current_user: User = Depends(get_current_user)):
-    category = await Category.get_or_none(id=category_id)
+    async def load():
+        category = await Category.get_or_none(id=category_id)
+        return CategoryResponse.model_validate(category) if category else None
+
+    category = await category_cache.get(category_id, load)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    return CategoryResponse.model_validate(category)
+    return category
 
 @router.put("/categories/{category_id}", response_model=CategoryResponse)
 async def update_category(
@@ -38,6 +80,8 @@ async def update_category(
         raise HTTPException(status_code=404, detail="Category not found")
     
     await category.update_from_dict(category_data.model_dump()).save()
+    # question responses embed the category name
+    await bump("categories", "questions")
     return CategoryResponse.model_validate(category)
 
 @router.delete("/categories/{category_id}")
@@ -46,15 +90,65 @@ async def delete_category(category_id: int, current_user: User = Depends(get_cur
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    orphaned = await Question.filter(category_id=category_id).values_list("id", "difficulty")
     await category.delete()
+    # keyed by a plain category_id, so not cascaded; "python leaderboards.py rebuild" would drop them too
+    await LeaderboardScore.filter(category_id=category_id).delete()
+    await ScoreHistogramBin.filter(category_id=category_id).delete()
+    await bump("categories", "questions")
+    # questions are kept without a category (SET_NULL)
+    for question_id, difficulty in orphaned:
+        question_pools.update(question_id, None, difficulty)
     return {"message": "Category deleted successfully"}
 
-@router.post("/questions/", response_model=QuestionResponse)
-async def create_question(question: QuestionCreate, current_user: User = Depends(get_current_user)):
+def _group_updates(changes: Dict[int, dict]) -> Dict[Tuple, List[int]]:
+    """Group ids by identical change sets, so each group is one UPDATE statement."""
+    groups: Dict[Tuple, List[int]] = {}
+    for item_id, fields in changes.items():
+        groups.setdefault(tuple(sorted(fields.items())), []).append(item_id)
+    return groups
+
+
+def _bulk_statuses(items, errors: Dict[int, BulkItemStatus]) -> BulkUpdateResponse:
+    if errors:
+        return BulkUpdateResponse(applied=False, items=[
+            errors.get(item.id) or BulkItemStatus(id=item.id, status="skipped") for item in items
+        ])
+    return BulkUpdateResponse(applied=True, items=[BulkItemStatus(id=item.id, status="updated") for item in items])
+
+
+@router.post("/categories/purge", response_model=PurgeJobResponse, status_code=202)
+async def purge_categories(request: CategoryPurgeRequest, current_user: User = Depends(get_current_user)):
+    """Delete many categories in the background; their questions are kept without a category."""
+    ids = await Category.filter(id__in=request.ids).values_list("id", flat=True)
+    job = await purge_runner.submit("categories", sorted(ids))
+    return PurgeJobResponse.model_validate(job)
+
+
+@router.post("/questions/", response_model=QuestionCreateResponse)
+async def create_question(
+    question: QuestionCreate,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Create a question, checking the bank for near-duplicates of its text first.
+
+    ``on_duplicate`` overrides ``DUPLICATE_POLICY``: ``warn`` creates the question and
+    lists the matches in ``near_duplicates``, ``reject`` answers 409 with the matches
+    instead, and ``allow`` skips the check.
+    """
     if question.category_id:
         category = await Category.get_or_none(id=question.category_id)
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
+
+    policy = on_duplicate or DUPLICATE_POLICY
+    matches = [] if policy == "allow" else await duplicates.find_duplicates(question.text, DUPLICATE_THRESHOLD)
+    if matches and policy == "reject":
+        raise HTTPException(status_code=409, detail={
+            "message": "A near-duplicate question already exists",
+            "near_duplicates": [match.model_dump() for match in matches],
+        })
     
     # Create question without answers first
     question_data = question.model_dump(exclude={'answers'})
@@ -65,19 +159,71 @@ async def create_question(question: QuestionCreate, current_user: User = Depends
         for answer_data in question.answers:
             await Answer.create(question=new_question, **answer_data.model_dump())
     
+    await search.index_question(new_question.id)
+    await duplicates.index_question(new_question.id, new_question.text)
+    question_pools.add(new_question.id, new_question.category_id, new_question.difficulty)
+    await bump("questions")
+
     await new_question.fetch_related("answers", "category")
-    return QuestionResponse(
-        id=new_question.id,
-        text=new_question.text,
-        category_id=new_question.category_id,
-        category=new_question.category.name if new_question.category else None,
-        difficulty=new_question.difficulty,
-        time_limit_seconds=new_question.time_limit_seconds,
-        answers=[
-            AnswerResponse(id=a.id, text=a.text, is_correct=a.is_correct, question_id=a.question_id)
-            for a in new_question.answers
-        ],
-    )
+    return QuestionCreateResponse(**_question_response(new_question).model_dump(), near_duplicates=matches)
+
+
+@router.post("/questions/import", response_model=QuestionImportResponse)
+async def import_questions(
+    items: List[QuestionCreate],
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Create many questions, with their answers, in one transaction.
+
+    Each item is checked against the bank and against the items before it. An
+    unknown category, or a near-duplicate under the ``reject`` policy, rejects the
+    import like a bulk update: nothing is written and the other items report
+    ``skipped``. Under ``warn`` every item is created and its matches are listed.
+    """
+    policy = on_duplicate or DUPLICATE_POLICY
+    category_ids = {item.category_id for item in items if item.category_id}
+    known_categories = set(await Category.filter(id__in=category_ids).values_list("id", flat=True))
+
+    batch = duplicates.BatchIndex()
+    results = []
+    for index, item in enumerate(items):
+        result = QuestionImportItem(index=index, status="created")
+        if item.category_id and item.category_id not in known_categories:
+            result.status, result.detail = "invalid", "Category not found"
+        elif policy != "allow":
+            result.near_duplicates = (
+                await duplicates.find_duplicates(item.text, DUPLICATE_THRESHOLD)
+                + batch.find(item.text, DUPLICATE_THRESHOLD)
+            )
+            if result.near_duplicates and policy == "reject":
+                result.status, result.detail = "duplicate", "A near-duplicate question already exists"
+            batch.add(index, item.text)
+        results.append(result)
+    if any(result.status != "created" for result in results):
+        for result in results:
+            if result.status == "created":
+                result.status = "skipped"
+        return QuestionImportResponse(applied=False, items=results)
+
+    created = []
+    async with in_transaction(PRIMARY) as connection:
+        for item, result in zip(items, results):
+            new_question = await Question.create(**item.model_dump(exclude={"answers"}), using_db=connection)
+            if item.answers:
+                await Answer.bulk_create(
+                    [Answer(question_id=new_question.id, **answer.model_dump()) for answer in item.answers],
+                    using_db=connection,
+                )
+            await duplicates.index_question(new_question.id, new_question.text, connection)
+            result.id = new_question.id
+            created.append(new_question)
+
+    for question in created:
+        await search.index_question(question.id)
+        question_pools.add(question.id, question.category_id, question.difficulty)
+    await bump("questions")
+    return QuestionImportResponse(applied=True, items=results)
 
 
 @router.get("/questions/", response_model=List[QuestionResponse])
@@ -85,53 +231,122 @@ async def get_questions(
     skip: int = 0,
     limit: int = 10,
     category_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
 ):
-    query = Question.all().prefetch_related("answers", "category")
+    query = Question.all().using_db(db).prefetch_related("answers", "category")
     
     if category_id is not None:
         query = query.filter(category_id=category_id)
     
     items = await query.offset(skip).limit(limit)
-    results: list[QuestionResponse] = []
-    for q in items:
-        results.append(
-            QuestionResponse(
-                id=q.id,
-                text=q.text,
-                category_id=q.category_id,
-                category=q.category.name if q.category else None,
-                difficulty=q.difficulty,
-                time_limit_seconds=q.time_limit_seconds,
-                answers=[
-                    AnswerResponse(id=a.id, text=a.text, is_correct=a.is_correct, question_id=a.question_id)
-                    for a in q.answers
-                ],
-            )
-        )
-    return results
+    return [_question_response(q) for q in items]
+
+
+@router.post("/questions/purge", response_model=PurgeJobResponse, status_code=202)
+async def purge_questions(request: QuestionPurgeRequest, current_user: User = Depends(get_current_user)):
+    """Delete many questions, with their answers and answer history, in the background.
+
+    The target set is resolved now: the given ``ids``, narrowed by ``category_id`` /
+    ``difficulty`` if those are set too.
+    """
+    if request.ids is None and request.category_id is None and request.difficulty is None:
+        raise HTTPException(status_code=400, detail="Give ids or a category_id/difficulty filter")
+    query = Question.all()
+    if request.ids is not None:
+        query = query.filter(id__in=request.ids)
+    if request.category_id is not None:
+        query = query.filter(category_id=request.category_id)
+    if request.difficulty is not None:
+        query = query.filter(difficulty=request.difficulty)
+    ids = await query.order_by("id").values_list("id", flat=True)
+    job = await purge_runner.submit("questions", list(ids))
+    return PurgeJobResponse.model_validate(job)
+
+
+@router.get("/purge-jobs/{job_id}", response_model=PurgeJobResponse)
+async def get_purge_job(job_id: int, current_user: User = Depends(get_current_user)):
+    job = await PurgeJob.get_or_none(id=job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return PurgeJobResponse.model_validate(job)
+
+
+@router.get("/questions/search", response_model=List[QuestionResponse])
+async def search_questions(
+    q: str = Query(..., min_length=1),
+    category_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over question and answer texts, best match first."""
+    if search.fts_enabled():
+        ids = await search.search_question_ids(q, category_id, difficulty, skip, limit)
+        questions = await Question.filter(id__in=ids).prefetch_related("answers", "category")
+        by_id = {question.id: question for question in questions}
+        return [_question_response(by_id[qid]) for qid in ids if qid in by_id]
+
+    # Databases without FTS5 fall back to an unranked substring match
+    query = Question.filter(text__icontains=q).prefetch_related("answers", "category")
+    if category_id is not None:
+        query = query.filter(category_id=category_id)
+    if difficulty is not None:
+        query = query.filter(difficulty=difficulty)
+    return [_question_response(question) for question in await query.offset(skip).limit(limit)]
+
+
+@router.get("/questions/analytics", response_model=List[QuestionAnalytics])
+async def list_question_analytics(
+    skip: int = 0,
+    limit: int = 50,
+    category_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
+):
+    """Answer counters, correct rate and calibrated difficulty for a page of questions."""
+    query = Question.all().using_db(db).order_by("id").prefetch_related("answers")
+    if category_id is not None:
+        query = query.filter(category_id=category_id)
+    return await analytics.get_questions_analytics(await query.offset(skip).limit(limit), db)
+
+
+@router.get("/questions/duplicates", response_model=DuplicateReport)
+async def duplicate_report(
+    threshold: Optional[float] = Query(None, gt=0, le=1),
+    category_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
+):
+    """Clusters of near-duplicate questions in the bank, largest first.
+
+    ``threshold`` defaults to ``DUPLICATE_THRESHOLD``.
+    """
+    threshold = threshold or DUPLICATE_THRESHOLD
+    clusters = await duplicates.duplicate_clusters(threshold, category_id, limit, db)
+    return DuplicateReport(threshold=threshold, clusters=clusters)
+
+
+@router.get("/questions/{question_id}/analytics", response_model=QuestionAnalytics)
+async def get_question_analytics(question_id: int, current_user: User = Depends(get_current_user)):
+    question = await Question.get_or_none(id=question_id).prefetch_related("answers")
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return (await analytics.get_questions_analytics([question]))[0]
 
 
 @router.get("/questions/{question_id}", response_model=QuestionResponse)
 async def get_question(question_id: int, current_user: User = Depends(get_current_user)):
-    question = await Question.get_or_none(id=question_id)
+    async def load():
+        question = await Question.get_or_none(id=question_id).prefetch_related("answers", "category")
+        return _question_response(question) if question else None
+
+    question = await question_cache.get(question_id, load)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    
-    await question.fetch_related("answers", "category")
-    
-    return QuestionResponse(
-        id=question.id,
-        text=question.text,
-        category_id=question.category_id,
-        category=question.category.name if question.category else None,
-        difficulty=question.difficulty,
-        time_limit_seconds=question.time_limit_seconds,
-        answers=[
-            AnswerResponse(id=a.id, text=a.text, is_correct=a.is_correct, question_id=a.question_id)
-            for a in question.answers
-        ],
-    )
+    return question
 
 
 @router.put("/questions/{question_id}", response_model=QuestionResponse)
@@ -154,19 +369,63 @@ async def update_question(
     update_dict = question_data.model_dump(exclude_unset=True)
     await question.update_from_dict(update_dict).save()
     
+    if "text" in update_dict:
+        await search.index_question(question.id)
+        await duplicates.index_question(question.id, question.text)
+    if "category_id" in update_dict or "difficulty" in update_dict:
+        question_pools.update(question.id, question.category_id, question.difficulty)
+    await bump("questions")
+
     await question.fetch_related("answers", "category")
-    return QuestionResponse(
-        id=question.id,
-        text=question.text,
-        category_id=question.category_id,
-        category=question.category.name if question.category else None,
-        difficulty=question.difficulty,
-        time_limit_seconds=question.time_limit_seconds,
-        answers=[
-            AnswerResponse(id=a.id, text=a.text, is_correct=a.is_correct, question_id=a.question_id)
-            for a in question.answers
-        ],
-    )
+    return _question_response(question)
+
+
+@router.patch("/questions/bulk", response_model=BulkUpdateResponse)
+async def bulk_update_questions(items: List[QuestionBulkUpdate], current_user: User = Depends(get_current_user)):
+    """Apply many partial question updates in one transaction.
+
+    Questions and referenced categories are checked with one query each. If any
+    item is rejected nothing is written, and the other items report ``skipped``.
+    """
+    existing = {
+        qid: (category_id, difficulty)
+        for qid, category_id, difficulty in await Question.filter(
+            id__in=[item.id for item in items]
+        ).values_list("id", "category_id", "difficulty")
+    }
+    category_ids = {item.category_id for item in items if item.category_id is not None}
+    known_categories = set(await Category.filter(id__in=category_ids).values_list("id", flat=True))
+
+    changes: Dict[int, dict] = {}
+    errors: Dict[int, BulkItemStatus] = {}
+    for item in items:
+        if item.id in changes or item.id in errors:
+            errors[item.id] = BulkItemStatus(id=item.id, status="invalid", detail="Duplicate id")
+        elif item.id not in existing:
+            errors[item.id] = BulkItemStatus(id=item.id, status="not_found", detail="Question not found")
+        elif item.category_id is not None and item.category_id not in known_categories:
+            errors[item.id] = BulkItemStatus(id=item.id, status="invalid", detail="Category not found")
+        else:
+            changes[item.id] = item.model_dump(exclude_unset=True, exclude={"id"})
+    if errors:
+        return _bulk_statuses(items, errors)
+
+    async with in_transaction(PRIMARY) as connection:
+        for fields, ids in _group_updates(changes).items():
+            if fields:
+                await Question.filter(id__in=ids).using_db(connection).update(**dict(fields))
+
+    for question_id, fields in changes.items():
+        if "text" in fields:
+            await search.index_question(question_id)
+            await duplicates.index_question(question_id, fields["text"])
+        if "category_id" in fields or "difficulty" in fields:
+            category_id, difficulty = existing[question_id]
+            question_pools.update(
+                question_id, fields.get("category_id", category_id), fields.get("difficulty", difficulty)
+            )
+    await bump("questions")
+    return _bulk_statuses(items, errors)
 
 
 @router.delete("/questions/{question_id}")
@@ -176,6 +435,9 @@ async def delete_question(question_id: int, current_user: User = Depends(get_cur
         raise HTTPException(status_code=404, detail="Question not found")
     
     await question.delete()
+    await search.remove_question(question_id)
+    question_pools.remove(question_id)
+    await bump("questions", "answer_keys")
     return {"message": "Question deleted successfully"}
 
 
@@ -191,6 +453,8 @@ async def create_answer(
         raise HTTPException(status_code=404, detail="Question not found")
     
     new_answer = await Answer.create(question=question, **answer.model_dump())
+    await search.index_question(question_id)
+    await bump("questions", "answer_keys")
     return AnswerResponse(
         id=new_answer.id,
         text=new_answer.text,
@@ -241,7 +505,13 @@ async def update_answer(
     
     # Update only provided fields
     update_dict = answer_data.model_dump(exclude_unset=True)
+    key_changed = "is_correct" in update_dict and update_dict["is_correct"] != answer.is_correct
     await answer.update_from_dict(update_dict).save()
+    if "text" in update_dict:
+        await search.index_question(answer.question_id)
+    if key_changed:
+        await analytics.recount_correct([answer.question_id])
+    await bump("questions", "answer_keys")
     
     return AnswerResponse(
         id=answer.id,
@@ -251,6 +521,37 @@ async def update_answer(
     )
 
 
+@router.patch("/answers/bulk", response_model=BulkUpdateResponse)
+async def bulk_update_answers(items: List[AnswerBulkUpdate], current_user: User = Depends(get_current_user)):
+    """Apply many partial answer updates in one transaction; all or nothing, like questions."""
+    existing = dict(await Answer.filter(id__in=[item.id for item in items]).values_list("id", "question_id"))
+
+    changes: Dict[int, dict] = {}
+    errors: Dict[int, BulkItemStatus] = {}
+    for item in items:
+        if item.id in changes or item.id in errors:
+            errors[item.id] = BulkItemStatus(id=item.id, status="invalid", detail="Duplicate id")
+        elif item.id not in existing:
+            errors[item.id] = BulkItemStatus(id=item.id, status="not_found", detail="Answer not found")
+        else:
+            changes[item.id] = item.model_dump(exclude_unset=True, exclude={"id"})
+    if errors:
+        return _bulk_statuses(items, errors)
+
+    async with in_transaction(PRIMARY) as connection:
+        for fields, ids in _group_updates(changes).items():
+            if fields:
+                await Answer.filter(id__in=ids).using_db(connection).update(**dict(fields))
+
+    for question_id in {existing[answer_id] for answer_id, fields in changes.items() if "text" in fields}:
+        await search.index_question(question_id)
+    await analytics.recount_correct(
+        existing[answer_id] for answer_id, fields in changes.items() if "is_correct" in fields
+    )
+    await bump("questions", "answer_keys")
+    return _bulk_statuses(items, errors)
+
+
 @router.delete("/answers/{answer_id}")
 async def delete_answer(answer_id: int, current_user: User = Depends(get_current_user)):
     answer = await Answer.get_or_none(id=answer_id)
@@ -258,4 +559,6 @@ async def delete_answer(answer_id: int, current_user: User = Depends(get_current
         raise HTTPException(status_code=404, detail="Answer not found")
     
     await answer.delete()
+    await search.index_question(answer.question_id)
+    await bump("questions", "answer_keys")
     return {"message": "Answer deleted successfully"}
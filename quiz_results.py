@@ -1,17 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timezone, timedelta
-from models import User, QuizAttempt, QuizResult, UserStatistics, Question, UserAnswer, Category, Answer
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+from models import (
+    User, QuizAttempt, QuizResult, UserStatistics, Question, UserAnswer, Category, Answer,
+    ArchivedQuizResult, ArchivedUserAnswer, CategoryStatisticsRollup,
+)
 from auth import get_current_user
+from admission import rate_limit
+from scheduler import expiry_scheduler
+from db import PRIMARY, get_read_connection, unit_of_work
+import analytics
+import distribution
+import leaderboards
+import deck
+from answer_keys import answer_keys
+from cache import question_cache
+from pools import DIFFICULTY_LEVELS, fallback_order, next_difficulty, question_pools
 from schemas import (
     QuizAttemptCreate, QuizAttemptResponse, QuizResultResponse,
     UserStatisticsResponse, LeaderboardEntry, CategoryStatistics,
-    DatePeriodStatistics, AttemptDetailsResponse, QuestionResultDetail
+    DatePeriodStatistics, AttemptDetailsResponse, QuestionResultDetail,
+    UserAnswerSubmit, UserAnswerResponse, NextQuestionResponse, QuizQuestion, AttemptDeckResponse,
+    AttemptSummary, AttemptHistoryPage, RankedLeaderboardEntry, LeaderboardResponse,
+    ScoreBin, ScoreDistributionResponse
 )
 
 router = APIRouter()
 
-@router.post("/attempts/", response_model=QuizAttemptResponse)
+attempts_limit = Depends(rate_limit("attempts"))
+statistics_limit = Depends(rate_limit("statistics"))
+# one transaction per attempt write, shared by auth, the handler and its side effects
+write_transaction = Depends(unit_of_work, scope="function")
+
+@router.post("/attempts/", response_model=QuizAttemptResponse, dependencies=[attempts_limit, write_transaction])
 async def start_quiz_attempt(
     attempt_data: QuizAttemptCreate,
     current_user: User = Depends(get_current_user)
@@ -21,6 +45,9 @@ async def start_quiz_attempt(
         category = await Category.get_or_none(id=attempt_data.category_id)
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
+    if attempt_data.mode == "adaptive":
+        return await _start_adaptive_attempt(attempt_data, category, current_user)
+
     # Build base query for selecting questions according to settings
     qquery = Question.all()
     if category:
@@ -28,9 +55,8 @@ async def start_quiz_attempt(
     if attempt_data.difficulty:
         qquery = qquery.filter(difficulty=attempt_data.difficulty)
 
-    # fetch matching questions
-    matching_questions = await qquery.prefetch_related('answers')
-    q_ids = [q.id for q in matching_questions]
+    # fetch matching question ids
+    q_ids = list(await qquery.values_list('id', flat=True))
 
     # apply randomization and limit
     selected_ids = q_ids
@@ -41,6 +67,8 @@ async def start_quiz_attempt(
         selected_ids = selected_ids[: attempt_data.num_questions]
 
     selected_csv = ",".join(str(i) for i in selected_ids) if selected_ids else None
+    # snapshot the selected questions so later edits cannot change this attempt
+    deck_blob = deck.pack(await deck.snapshot_questions(selected_ids)) if selected_ids else None
 
     attempt = await QuizAttempt.create(
         user=current_user,
@@ -50,7 +78,10 @@ async def start_quiz_attempt(
         num_questions=attempt_data.num_questions,
         randomize=bool(attempt_data.randomize),
         selected_question_ids=selected_csv,
+        deck=deck_blob,
     )
+    if attempt.total_time_limit is not None:
+        expiry_scheduler.schedule(attempt.id, attempt.started_at, attempt.total_time_limit)
 
     return QuizAttemptResponse(
         id=attempt.id,
@@ -65,60 +96,221 @@ async def start_quiz_attempt(
         selected_count=(len(selected_ids) if selected_ids else 0),
     )
 
-@router.post("/attempts/{attempt_id}/complete", response_model=QuizResultResponse)
-async def complete_quiz_attempt(
+
+async def _start_adaptive_attempt(attempt_data: QuizAttemptCreate, category: Optional[Category], user: User):
+    """Adaptive attempts start empty; questions are drawn one by one through ``/next``."""
+    difficulty = attempt_data.difficulty or "medium"
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Adaptive attempts need a difficulty in {', '.join(DIFFICULTY_LEVELS)}",
+        )
+    attempt = await QuizAttempt.create(
+        user=user,
+        category=category,
+        total_time_limit=attempt_data.total_time_limit,
+        difficulty_filter=difficulty,
+        num_questions=attempt_data.num_questions,
+        randomize=True,
+        selected_question_ids="",  # served question ids are appended as they are drawn
+        deck=deck.pack({"questions": [], "key": {}}),
+        mode="adaptive",
+        current_difficulty=difficulty,
+    )
+    if attempt.total_time_limit is not None:
+        expiry_scheduler.schedule(attempt.id, attempt.started_at, attempt.total_time_limit)
+
+    return QuizAttemptResponse(
+        id=attempt.id,
+        category=category.name if category else None,
+        started_at=attempt.started_at,
+        total_time_limit=attempt.total_time_limit,
+        difficulty=attempt.difficulty_filter,
+        num_questions=attempt.num_questions,
+        randomize=attempt.randomize,
+        selected_count=0,
+        mode=attempt.mode,
+    )
+
+
+_RESULT_FIELDS = ("total_questions", "correct_answers", "score", "timed_out")
+
+
+@router.get("/attempts/", response_model=AttemptHistoryPage, dependencies=[attempts_limit])
+async def list_quiz_attempts(
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    completed: Optional[bool] = None,
+    category_id: Optional[int] = None,
+    started_from: Optional[datetime] = None,
+    started_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """The current user's attempts, newest first, with their results.
+
+    Pages are keyset-paginated on the attempt id and fetched with one query that
+    joins the live or archived result of each attempt.
+    """
+    query = QuizAttempt.filter(user_id=current_user.id)
+    if cursor is not None:
+        query = query.filter(id__lt=cursor)
+    if completed is not None:
+        query = query.filter(completed_at__isnull=not completed)
+    if category_id is not None:
+        query = query.filter(category_id=category_id)
+    if started_from is not None:
+        query = query.filter(started_at__gte=started_from)
+    if started_to is not None:
+        query = query.filter(started_at__lt=started_to)
+    rows = await query.order_by("-id").limit(limit + 1).values(
+        "id", "category_id", "category__name", "mode", "started_at", "completed_at", "num_questions", "time_spent",
+        *(f"results__{field}" for field in _RESULT_FIELDS),
+        *(f"archived_results__{field}" for field in _RESULT_FIELDS),
+    )
+
+    items = []
+    for row in rows[:limit]:
+        source = "results" if row["results__score"] is not None else "archived_results"
+        items.append(AttemptSummary(
+            id=row["id"],
+            category_id=row["category_id"],
+            category_name=row["category__name"],
+            mode=row["mode"],
+            started_at=row["started_at"],
+            completed_at=row["completed_at"],
+            num_questions=row["num_questions"],
+            time_spent=row["time_spent"],
+            **{field: row[f"{source}__{field}"] for field in _RESULT_FIELDS},
+        ))
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return AttemptHistoryPage(items=items, next_cursor=next_cursor)
+
+
+@router.post("/attempts/{attempt_id}/next", response_model=NextQuestionResponse, dependencies=[attempts_limit, write_transaction])
+async def next_adaptive_question(
     attempt_id: int,
     current_user: User = Depends(get_current_user)
 ):
+    """Serve the next question of an adaptive attempt.
+
+    The difficulty steps up or down with the running accuracy inside the attempt,
+    and the question is drawn from the in-memory pool for (category, difficulty).
+    The current question is served again until it has been answered.
+    """
     attempt = await QuizAttempt.get_or_none(id=attempt_id, user=current_user)
     if not attempt:
         raise HTTPException(status_code=404, detail="Quiz attempt not found")
-    
+    if attempt.mode != "adaptive":
+        raise HTTPException(status_code=400, detail="Quiz attempt is not adaptive")
     if attempt.completed_at:
         raise HTTPException(status_code=400, detail="Quiz attempt already completed")
-    
-    # Calculate results
-    await attempt.fetch_related('category')
-    
+
+    served = parse_selected_ids(attempt) or []
+    snapshot = deck.unpack(attempt.deck) or {"questions": [], "key": {}}
+    answers = await UserAnswer.filter(attempt_id=attempt.id)
+    answered_ids = {ua.question_id for ua in answers}
+
+    if served and served[-1] not in answered_ids:
+        question_id = served[-1]
+        difficulty = attempt.current_difficulty
+    else:
+        if attempt.num_questions is not None and len(served) >= attempt.num_questions:
+            return NextQuestionResponse(done=True, index=len(served), difficulty=attempt.current_difficulty)
+        key = deck.answer_key(snapshot)
+        correct = sum(1 for ua in answers if ua.answer_id in key.get(ua.question_id, ()) and not ua.is_late)
+        difficulty = next_difficulty(attempt.current_difficulty or "medium", len(answers), correct)
+        exclude = set(served)
+        await question_cache.sync()  # schedules a pool reload after writes in other workers
+        question_id = None
+        for candidate in fallback_order(difficulty):
+            question_id = question_pools.pick(attempt.category_id, candidate, exclude)
+            if question_id is not None:
+                difficulty = candidate
+                break
+        if question_id is None:
+            return NextQuestionResponse(done=True, index=len(served), difficulty=difficulty)
+        served.append(question_id)
+        deck.extend(snapshot, await deck.snapshot_questions([question_id]))
+        await QuizAttempt.filter(id=attempt.id).update(
+            selected_question_ids=",".join(str(i) for i in served),
+            current_difficulty=difficulty,
+            deck=deck.pack(snapshot),
+        )
+
+    question = next(q for q in snapshot["questions"] if q["id"] == question_id)
+    return NextQuestionResponse(
+        index=len(served),
+        difficulty=difficulty,
+        question=QuizQuestion.model_validate(question),
+    )
+
+
+@router.get("/attempts/{attempt_id}/deck", response_model=AttemptDeckResponse, dependencies=[attempts_limit])
+async def get_attempt_deck(
+    attempt_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """All questions of the attempt as snapshotted when they were selected, without the answer key."""
+    attempt = await QuizAttempt.get_or_none(id=attempt_id, user=current_user)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Quiz attempt not found")
+    snapshot = deck.unpack(attempt.deck)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Quiz attempt has no question deck")
+    return AttemptDeckResponse(attempt_id=attempt.id, questions=snapshot["questions"])
+
+
+def parse_selected_ids(attempt: QuizAttempt) -> Optional[List[int]]:
+    """Return the question ids fixed at attempt start, or None if none were recorded."""
+    if attempt.selected_question_ids is None:
+        return None
+    try:
+        return [int(x) for x in attempt.selected_question_ids.split(",") if x]
+    except Exception:
+        return None
+
+
+async def finalize_attempt(attempt: QuizAttempt, user: User) -> Optional[QuizResultResponse]:
+    """Score an open attempt, store its result and update the user's statistics.
+
+    Shared by the ``/complete`` endpoint, live sessions and background expiry.
+    Returns None if the attempt was completed concurrently by another caller.
+    """
     await attempt.fetch_related('category')
     
     # Determine selected questions for scoring
-    selected_ids = None
-    if attempt.selected_question_ids:
-        try:
-            selected_ids = [int(x) for x in attempt.selected_question_ids.split(",") if x]
-        except Exception:
-            selected_ids = None
-
-    correct_answers = 0
-    if selected_ids is not None:
+    selected_ids = parse_selected_ids(attempt)
+
+    # Answers given in this attempt (or legacy answers not tied to any attempt); late answers never score
+    own_answers = UserAnswer.filter(
+        Q(attempt_id=attempt.id) | Q(attempt_id__isnull=True), user=user, is_late=False
+    )
+
+    snapshot = deck.unpack(attempt.deck)
+    if selected_ids is not None and snapshot is not None:
+        # grade against the answer key snapshotted when the questions were selected
+        total_questions = len(selected_ids)
+        key = deck.answer_key(snapshot)
+        user_answers = await own_answers.filter(question_id__in=selected_ids)
+        correct_answers = len({ua.question_id for ua in user_answers if ua.answer_id in key.get(ua.question_id, ())})
+    elif selected_ids is not None:
         # total questions is the number of selected ids
         total_questions = len(selected_ids)
-        # for each selected question, see if user provided a correct answer
-        for qid in selected_ids:
-            ua = await UserAnswer.filter(user=current_user, question_id=qid).prefetch_related('answer')
-            # if any answer for that question and it's correct, count as correct
-            for single in ua:
-                if single.answer and single.answer.is_correct:
-                    correct_answers += 1
-                    break
+        # a question counts as correct if any of the user's answers to it is correct
+        user_answers = await own_answers.filter(question_id__in=selected_ids).values_list('question_id', 'answer_id')
+        keys = await answer_keys({question_id for question_id, _ in user_answers})
+        correct_answers = len({qid for qid, answer_id in user_answers if answer_id in keys[qid].ids})
     else:
         # fallback: use all questions in category (previous behavior)
         if attempt.category:
-            questions = await Question.filter(category_id=attempt.category.id)
+            question_ids = await Question.filter(category_id=attempt.category.id).values_list('id', flat=True)
         else:
-            questions = await Question.all()
-
-        user_answers = []
-        for question in questions:
-            answers = await UserAnswer.filter(
-                user=current_user,
-                question=question
-            ).prefetch_related('answer')
-            user_answers.extend(answers)
+            question_ids = await Question.all().values_list('id', flat=True)
 
+        user_answers = await own_answers.filter(question_id__in=question_ids).values_list('question_id', 'answer_id')
+        keys = await answer_keys({question_id for question_id, _ in user_answers})
         total_questions = len(user_answers)
-        correct_answers = sum(1 for ua in user_answers if ua.answer.is_correct)
+        correct_answers = sum(1 for qid, answer_id in user_answers if answer_id in keys[qid].ids)
     score = (correct_answers / total_questions * 100) if total_questions > 0 else 0
     
     # Update attempt
@@ -133,15 +325,20 @@ async def complete_quiz_attempt(
             timed_out = True
             final_time_spent = attempt.total_time_limit
 
-    await attempt.update_from_dict({
-        "completed_at": now,
-        "time_spent": final_time_spent
-    }).save()
+    # Claim the attempt atomically so concurrent finalizers cannot both score it
+    claimed = await QuizAttempt.filter(id=attempt.id, completed_at__isnull=True).update(
+        completed_at=now,
+        time_spent=final_time_spent,
+    )
+    if not claimed:
+        return None
+    attempt.completed_at = now
+    attempt.time_spent = final_time_spent
 
     # Create result
     result = await QuizResult.create(
         attempt=attempt,
-        user=current_user,
+        user=user,
         total_questions=total_questions,
         correct_answers=correct_answers,
         score=score,
@@ -149,9 +346,7 @@ async def complete_quiz_attempt(
     )
     
     # Update user statistics
-    stats = await UserStatistics.get_or_none(user=current_user)
-    if not stats:
-        stats = await UserStatistics.create(user=current_user)
+    stats, _ = await UserStatistics.get_or_create(user=user)
     
     await stats.update_from_dict({
         "total_quizzes": stats.total_quizzes + 1,
@@ -161,6 +356,10 @@ async def complete_quiz_attempt(
         "total_time_spent": stats.total_time_spent + final_time_spent,
         "last_quiz_date": now
     }).save()
+    await leaderboards.record_result(user.id, attempt.category_id, score, now)
+    # ranked against the takers before this one
+    percentile, _ = distribution.percentile(await distribution.load_counts(attempt.category_id), score)
+    await distribution.record_score(attempt.category_id, score)
 
     # Build response
     return QuizResultResponse(
@@ -171,18 +370,150 @@ async def complete_quiz_attempt(
         time_spent=final_time_spent,
         timed_out=timed_out,
         completed_at=result.completed_at,
+        percentile=percentile,
     )
 
-@router.get("/statistics/me", response_model=UserStatisticsResponse)
-async def get_my_statistics(current_user: User = Depends(get_current_user)):
-    stats = await UserStatistics.get_or_none(user=current_user)
+
+async def stored_result(attempt: QuizAttempt) -> Optional[QuizResultResponse]:
+    """The result stored when ``attempt`` was completed, or None if there is none (yet)."""
+    result = await QuizResult.filter(attempt_id=attempt.id).first()
+    if result is None:
+        return None
+    time_spent = await QuizAttempt.filter(id=attempt.id).first().values_list("time_spent", flat=True)
+    return QuizResultResponse(
+        id=result.id,
+        total_questions=result.total_questions,
+        correct_answers=result.correct_answers,
+        score=result.score,
+        time_spent=time_spent,
+        timed_out=result.timed_out,
+        completed_at=result.completed_at,
+    )
+
+
+def elapsed_ms(attempt: QuizAttempt, now: Optional[datetime] = None) -> int:
+    """Milliseconds since the attempt started."""
+    now = now or datetime.now(timezone.utc)
+    return int((now - attempt.started_at.replace(tzinfo=timezone.utc)).total_seconds() * 1000)
+
+
+async def record_answer(
+    attempt: QuizAttempt,
+    user: User,
+    question_id: int,
+    answer_id: int,
+    served_after_ms: Optional[int] = None,
+) -> UserAnswer:
+    """Store the user's answer to a question within ``attempt`` along with its timing.
+
+    When the attempt has a deck, the answer is checked against the question as
+    snapshotted there, so edits made to the question since it was served do not
+    change what counts as a valid or correct answer.
+
+    ``served_after_ms`` is when the question was shown, relative to the attempt start.
+    When unknown (plain HTTP clients) the question is assumed to have been served
+    when the previous answer of the attempt was accepted. Answers given after the
+    question's ``time_limit_seconds`` are flagged ``is_late`` and excluded from scoring.
+    """
+    question = await Question.get_or_none(id=question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if attempt.completed_at:
+        raise HTTPException(status_code=400, detail="Quiz attempt already completed")
+    selected_ids = parse_selected_ids(attempt)
+    if selected_ids is not None and question_id not in selected_ids:
+        raise HTTPException(status_code=400, detail="Question is not part of this quiz attempt")
+    snapshot = deck.unpack(attempt.deck)
+    served = next((q for q in snapshot["questions"] if q["id"] == question_id), None) if snapshot else None
+    if served is not None:
+        if answer_id not in {a["id"] for a in served["answers"]}:
+            raise HTTPException(status_code=404, detail="Answer not found")
+        is_correct = answer_id in deck.answer_key(snapshot).get(question_id, ())
+        time_limit_seconds = served["time_limit_seconds"]
+    else:
+        answer = await Answer.get_or_none(id=answer_id, question_id=question_id)
+        if not answer:
+            raise HTTPException(status_code=404, detail="Answer not found")
+        is_correct = answer.is_correct
+        time_limit_seconds = question.time_limit_seconds
+    if await UserAnswer.exists(attempt_id=attempt.id, question_id=question_id):
+        raise HTTPException(status_code=400, detail="Question already answered")
+
+    answered_after_ms = elapsed_ms(attempt)
+    if served_after_ms is None:
+        previous = await UserAnswer.filter(attempt_id=attempt.id).order_by('-answered_after_ms').first()
+        served_after_ms = previous.answered_after_ms if previous and previous.answered_after_ms is not None else 0
+    is_late = (
+        time_limit_seconds is not None
+        and answered_after_ms - served_after_ms > time_limit_seconds * 1000
+    )
+    try:
+        # a savepoint, so that a lost race leaves the caller's transaction usable
+        async with in_transaction(PRIMARY):
+            # ``attempt`` may be stale: a live session holds it while /complete or expiry closes it
+            if not await QuizAttempt.filter(id=attempt.id, completed_at__isnull=True).exists():
+                raise HTTPException(status_code=400, detail="Quiz attempt already completed")
+            user_answer = await UserAnswer.create(
+                user=user,
+                question_id=question_id,
+                answer_id=answer_id,
+                attempt_id=attempt.id,
+                served_after_ms=served_after_ms,
+                answered_after_ms=answered_after_ms,
+                is_late=is_late,
+            )
+    except IntegrityError:
+        # answered concurrently (HTTP and WebSocket, or a retry) since the check above
+        raise HTTPException(status_code=400, detail="Question already answered")
+    await analytics.record_answer_outcome(question_id, answer_id, is_correct)
+    return user_answer
+
+
+@router.post("/attempts/{attempt_id}/answers", response_model=UserAnswerResponse, dependencies=[attempts_limit, write_transaction])
+async def submit_answer(
+    attempt_id: int,
+    submission: UserAnswerSubmit,
+    current_user: User = Depends(get_current_user)
+):
+    attempt = await QuizAttempt.get_or_none(id=attempt_id, user=current_user)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Quiz attempt not found")
+    user_answer = await record_answer(attempt, current_user, submission.question_id, submission.answer_id)
+    return UserAnswerResponse.model_validate(user_answer)
+
+
+@router.post("/attempts/{attempt_id}/complete", response_model=QuizResultResponse, dependencies=[attempts_limit, write_transaction])
+async def complete_quiz_attempt(
+    attempt_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    attempt = await QuizAttempt.get_or_none(id=attempt_id, user=current_user)
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Quiz attempt not found")
+    
+    if attempt.completed_at:
+        raise HTTPException(status_code=400, detail="Quiz attempt already completed")
+    
+    result = await finalize_attempt(attempt, current_user)
+    if result is None:
+        raise HTTPException(status_code=400, detail="Quiz attempt already completed")
+    return result
+
+@router.get("/statistics/me", response_model=UserStatisticsResponse, dependencies=[statistics_limit])
+async def get_my_statistics(current_user: User = Depends(get_current_user), db=Depends(get_read_connection)):
+    stats = await UserStatistics.filter(user_id=current_user.id).using_db(db).first()
     if not stats:
-        stats = await UserStatistics.create(user=current_user)
+        # the replica may lag behind a quiz just completed: read (or create) on the primary
+        stats, _ = await UserStatistics.get_or_create(user=current_user)
     return UserStatisticsResponse.model_validate(stats)
 
-@router.get("/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(limit: int = 10):
-    stats = await UserStatistics.all().prefetch_related('user').order_by('-average_score').limit(limit)
+@router.get("/leaderboard", response_model=List[LeaderboardEntry], dependencies=[statistics_limit])
+async def get_leaderboard(limit: int = 10, db=Depends(get_read_connection)):
+    return await load_leaderboard(limit, db)
+
+
+async def load_leaderboard(limit: int, db=None) -> List[LeaderboardEntry]:
+    stats = await UserStatistics.all().using_db(db).prefetch_related('user').order_by('-average_score').limit(limit)
     return [
         LeaderboardEntry(
             username=stat.user.username,
@@ -194,78 +525,142 @@ async def get_leaderboard(limit: int = 10):
     ]
 
 
-@router.get("/statistics/me/by-category", response_model=List[CategoryStatistics])
-async def get_statistics_by_category(current_user: User = Depends(get_current_user)):
-    """Get statistics grouped by category for current user."""
-    # Get all completed attempts for the user
-    attempts = await QuizAttempt.filter(
-        user=current_user,
-        completed_at__isnull=False
-    ).prefetch_related('category')
-    
-    # Get all results for these attempts
+def _ranked_entry(rank: int, row) -> RankedLeaderboardEntry:
+    return RankedLeaderboardEntry(
+        rank=rank, username=row.user.username, total_quizzes=row.quizzes, average_score=row.average_score
+    )
+
+
+@router.get("/leaderboards/{window}", response_model=LeaderboardResponse, dependencies=[statistics_limit])
+async def get_windowed_leaderboard(
+    window: Literal["all", "month", "week"],
+    category_id: Optional[int] = None,
+    period: Optional[str] = Query(None, description="e.g. 2024-05 or 2024-W19; defaults to the current one"),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
+):
+    """Top users by average score for a category (or all categories) in a calendar window."""
+    if category_id is not None and not await Category.filter(id=category_id).using_db(db).exists():
+        raise HTTPException(status_code=404, detail="Category not found")
+    period = period or leaderboards.period_for(window, datetime.now(timezone.utc))
+    key = (category_id or leaderboards.ALL_CATEGORIES, window, period)
+    mine = await leaderboards.rank_of(key, current_user.id, db)
+    return LeaderboardResponse(
+        category_id=category_id,
+        window=window,
+        period=period,
+        entries=[_ranked_entry(rank, row) for rank, row in await leaderboards.top(key, limit, db)],
+        me=_ranked_entry(*mine) if mine else None,
+    )
+
+
+@router.get("/statistics/distribution", response_model=ScoreDistributionResponse, dependencies=[statistics_limit])
+async def get_score_distribution(
+    category_id: Optional[int] = None,
+    score: Optional[float] = Query(None, ge=0, le=100, description="also return the percentile of this score"),
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
+):
+    """Histogram of all quiz scores in a category (or all categories), from fixed bins."""
+    counts = await distribution.load_counts(category_id, db)
+    pct, error = distribution.percentile(counts, score) if score is not None else (None, None)
+    return ScoreDistributionResponse(
+        category_id=category_id,
+        total=sum(counts),
+        bins=[
+            ScoreBin(low=i * distribution.BIN_WIDTH, high=(i + 1) * distribution.BIN_WIDTH, count=count)
+            for i, count in enumerate(counts)
+        ],
+        score=score,
+        percentile=pct,
+        percentile_error=error,
+    )
+
+
+@router.get("/statistics/me/by-category", response_model=List[CategoryStatistics], dependencies=[statistics_limit])
+async def get_statistics_by_category(current_user: User = Depends(get_current_user), db=Depends(get_read_connection)):
+    """Get statistics grouped by category for current user.
+
+    Live results are added to the rollups of results that were archived (see archive.py).
+    """
+    # Get all results with their attempts and categories
     results = await QuizResult.filter(
-        user=current_user
-    ).prefetch_related('attempt__category')
+        user_id=current_user.id
+    ).using_db(db).prefetch_related('attempt__category')
+    rollups = await CategoryStatisticsRollup.filter(
+        user_id=current_user.id
+    ).using_db(db).prefetch_related('category')
     
     # Group by category
     category_stats = {}
-    
+
+    def stats_for(category):
+        if category.id not in category_stats:
+            category_stats[category.id] = {
+                'category_id': category.id,
+                'category_name': category.name,
+                'total_quizzes': 0,
+                'total_questions_answered': 0,
+                'correct_answers': 0,
+                'score_sum': 0.0,
+                'best_score': None,
+                'worst_score': None,
+                'total_time_spent': 0
+            }
+        return category_stats[category.id]
+
+    def add_scores(stats, score_sum, best, worst):
+        stats['score_sum'] += score_sum
+        stats['best_score'] = best if stats['best_score'] is None else max(stats['best_score'], best)
+        stats['worst_score'] = worst if stats['worst_score'] is None else min(stats['worst_score'], worst)
+
+    for rollup in rollups:
+        stats = stats_for(rollup.category)
+        stats['total_quizzes'] += rollup.total_quizzes
+        stats['total_questions_answered'] += rollup.total_questions_answered
+        stats['correct_answers'] += rollup.correct_answers
+        stats['total_time_spent'] += rollup.total_time_spent
+        add_scores(stats, rollup.score_sum, rollup.best_score, rollup.worst_score)
+
     for result in results:
-        await result.fetch_related('attempt__category')
         category = result.attempt.category
         
         if category:
-            cat_id = category.id
-            cat_name = category.name
-            
-            if cat_id not in category_stats:
-                category_stats[cat_id] = {
-                    'category_id': cat_id,
-                    'category_name': cat_name,
-                    'total_quizzes': 0,
-                    'total_questions_answered': 0,
-                    'correct_answers': 0,
-                    'scores': [],
-                    'total_time_spent': 0
-                }
-            
-            stats = category_stats[cat_id]
+            stats = stats_for(category)
             stats['total_quizzes'] += 1
             stats['total_questions_answered'] += result.total_questions
             stats['correct_answers'] += result.correct_answers
-            stats['scores'].append(result.score)
+            add_scores(stats, result.score, result.score, result.score)
             # Get time_spent from attempt
-            await result.fetch_related('attempt')
             stats['total_time_spent'] += (result.attempt.time_spent or 0)
     
     # Build response
     response = []
     for cat_id, stats in category_stats.items():
-        scores = stats['scores']
-        avg_score = sum(scores) / len(scores) if scores else 0.0
-        best_score = max(scores) if scores else 0.0
-        worst_score = min(scores) if scores else 0.0
+        quizzes = stats['total_quizzes']
+        avg_score = stats['score_sum'] / quizzes if quizzes else 0.0
         
         response.append(CategoryStatistics(
             category_id=stats['category_id'],
             category_name=stats['category_name'],
-            total_quizzes=stats['total_quizzes'],
+            total_quizzes=quizzes,
             total_questions_answered=stats['total_questions_answered'],
             correct_answers=stats['correct_answers'],
             average_score=avg_score,
-            best_score=best_score,
-            worst_score=worst_score,
+            best_score=stats['best_score'] or 0.0,
+            worst_score=stats['worst_score'] or 0.0,
             total_time_spent=stats['total_time_spent']
         ))
     
     return response
 
 
-@router.get("/statistics/me/by-date", response_model=DatePeriodStatistics)
+@router.get("/statistics/me/by-date", response_model=DatePeriodStatistics, dependencies=[statistics_limit])
 async def get_statistics_by_date(
     period: str = Query(..., description="Period: week, month, or year"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_read_connection)
 ):
     """Get statistics grouped by date period for current user."""
     now = datetime.now(timezone.utc)
@@ -282,9 +677,9 @@ async def get_statistics_by_date(
     
     # Get results in the period
     results = await QuizResult.filter(
-        user=current_user,
+        user_id=current_user.id,
         completed_at__gte=start_date
-    ).prefetch_related('attempt')
+    ).using_db(db).prefetch_related('attempt')
     
     # Calculate statistics
     total_quizzes = len(results)
@@ -293,7 +688,6 @@ async def get_statistics_by_date(
     # Get time_spent from attempt
     total_time_spent = 0
     for r in results:
-        await r.fetch_related('attempt')
         total_time_spent += (r.attempt.time_spent or 0)
     scores = [r.score for r in results]
     average_score = sum(scores) / len(scores) if scores else 0.0
@@ -301,7 +695,6 @@ async def get_statistics_by_date(
     # Group by day
     quizzes_by_day = {}
     for result in results:
-        await result.fetch_related('attempt')
         date_key = result.completed_at.date().isoformat()
         quizzes_by_day[date_key] = quizzes_by_day.get(date_key, 0) + 1
     
@@ -316,7 +709,7 @@ async def get_statistics_by_date(
     )
 
 
-@router.get("/attempts/{attempt_id}/details", response_model=AttemptDetailsResponse)
+@router.get("/attempts/{attempt_id}/details", response_model=AttemptDetailsResponse, dependencies=[attempts_limit])
 async def get_attempt_details(
     attempt_id: int,
     current_user: User = Depends(get_current_user)
@@ -328,70 +721,88 @@ async def get_attempt_details(
     
     await attempt.fetch_related('category')
     
-    # Get result for this attempt
+    # Get result for this attempt, from the archive if it was moved there
     result = await QuizResult.get_or_none(attempt=attempt, user=current_user)
+    archived = False
+    if not result:
+        result = await ArchivedQuizResult.get_or_none(attempt_id=attempt.id, user_id=current_user.id)
+        archived = result is not None
     if not result:
         raise HTTPException(status_code=404, detail="Quiz result not found")
     
     # Get selected question IDs
-    selected_ids = []
-    if attempt.selected_question_ids:
-        try:
-            selected_ids = [int(x) for x in attempt.selected_question_ids.split(",") if x]
-        except Exception:
-            pass
+    selected_ids = parse_selected_ids(attempt)
     
-    if not selected_ids:
+    if selected_ids is None:
         # Fallback: get all questions from category
         if attempt.category:
-            questions = await Question.filter(category_id=attempt.category.id)
+            selected_ids = await Question.filter(category_id=attempt.category.id).values_list('id', flat=True)
         else:
-            questions = await Question.all()
-        selected_ids = [q.id for q in questions]
+            selected_ids = await Question.all().values_list('id', flat=True)
     
-    # Get question details
+    # Question texts, answer texts and the answer key: from the attempt's snapshot
+    # when there is one, otherwise from the live tables in one query
+    questions = {}
+    snapshot = deck.unpack(attempt.deck)
+    if snapshot is not None:
+        key = deck.answer_key(snapshot)
+        for q in snapshot["questions"]:
+            questions[q["id"]] = (q["text"], {a["id"]: a["text"] for a in q["answers"]}, key.get(q["id"], set()))
+    else:
+        keys = await answer_keys(selected_ids)
+        for qid, text in await Question.filter(id__in=selected_ids).values_list('id', 'text'):
+            questions[qid] = (text, dict(keys[qid].texts), keys[qid].ids)
+
+    user_answers_by_question = {}
+    if archived:
+        answers_query = ArchivedUserAnswer.filter(attempt_id=attempt.id)
+    else:
+        answers_query = UserAnswer.filter(Q(attempt_id=attempt.id) | Q(attempt_id__isnull=True))
+    user_answers = await answers_query.filter(
+        user_id=current_user.id,
+        question_id__in=selected_ids,
+    ).order_by('id')
+    for ua in user_answers:
+        user_answers_by_question.setdefault(ua.question_id, []).append(ua)
+    if snapshot is None:
+        # the answer key only has the correct answers' texts; add the texts of the chosen ones
+        chosen_ids = {ua.answer_id for ua in user_answers if ua.answer_id is not None}
+        for answer_id, qid, text in await Answer.filter(id__in=chosen_ids).values_list('id', 'question_id', 'text'):
+            if qid in questions:
+                questions[qid][1][answer_id] = text
+
     question_details = []
     for qid in selected_ids:
-        question = await Question.get_or_none(id=qid)
-        if not question:
+        if qid not in questions:
             continue
-        
-        # Get user's answer for this question
-        user_answers = await UserAnswer.filter(
-            user=current_user,
-            question_id=qid
-        ).prefetch_related('answer')
-        
-        # Get correct answers
-        correct_answers = await Answer.filter(
-            question_id=qid,
-            is_correct=True
-        )
+        question_text, answer_texts, correct_ids = questions[qid]
         
         # Determine if user answered correctly
         is_correct = False
-        user_answer_id = None
-        user_answer_text = None
-        
-        for ua in user_answers:
-            user_answer_id = ua.answer_id
-            user_answer_text = ua.answer.text if ua.answer else None
-            if ua.answer and ua.answer.is_correct:
+        chosen = None
+        for ua in user_answers_by_question.get(qid, []):
+            chosen = ua
+            if ua.answer_id in correct_ids and not ua.is_late:
                 is_correct = True
                 break
         
-        correct_answer_ids = [a.id for a in correct_answers]
-        correct_answer_texts = [a.text for a in correct_answers]
+        time_spent = None
+        if chosen and chosen.served_after_ms is not None and chosen.answered_after_ms is not None:
+            time_spent = round((chosen.answered_after_ms - chosen.served_after_ms) / 1000)
+        correct_answer_ids = sorted(correct_ids)
         
         question_details.append(QuestionResultDetail(
-            question_id=question.id,
-            question_text=question.text,
-            user_answer_id=user_answer_id,
-            user_answer_text=user_answer_text,
+            question_id=qid,
+            question_text=question_text,
+            user_answer_id=chosen.answer_id if chosen else None,
+            user_answer_text=answer_texts.get(chosen.answer_id) if chosen else None,
             correct_answer_ids=correct_answer_ids,
-            correct_answer_texts=correct_answer_texts,
+            correct_answer_texts=[answer_texts[i] for i in correct_answer_ids if i in answer_texts],
             is_correct=is_correct,
-            time_spent=None  # Could be calculated if we track per-question time
+            time_spent=time_spent,
+            served_after_ms=chosen.served_after_ms if chosen else None,
+            answered_after_ms=chosen.answered_after_ms if chosen else None,
+            is_late=chosen.is_late if chosen else False,
         ))
     
     return AttemptDetailsResponse(
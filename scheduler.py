@@ -0,0 +1,137 @@
+"""Background finalization of attempts whose ``total_time_limit`` has passed.
+
+A single timer heap of ``(deadline, attempt_id)`` drives one background task,
+instead of one task per attempt. The heap is loaded from open attempts at
+startup and fed by ``start_quiz_attempt``. Attempts completed in the meantime
+are simply skipped when their deadline comes up.
+
+Each attempt is finalized in its own transaction, like ``/complete``. An attempt
+whose finalization fails is rolled back, so it stays open. It goes back on the
+heap with an exponential backoff, and the rest of its batch still goes ahead.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+
+from config import EXPIRY_BATCH_SIZE
+from db import PRIMARY
+from models import QuizAttempt
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF_SECONDS = 1.0
+MAX_RETRY_BACKOFF_SECONDS = 300.0
+
+
+def _deadline(started_at: datetime, total_time_limit: int) -> float:
+    return started_at.replace(tzinfo=timezone.utc).timestamp() + total_time_limit
+
+
+class ExpiryScheduler:
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._heap: List[Tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures: Dict[int, int] = {}  # attempt id -> consecutive failed finalizations
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await self.load()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._failures.clear()
+
+    async def load(self):
+        """Rebuild the heap from every open attempt that has a total time limit."""
+        rows = await QuizAttempt.filter(
+            completed_at__isnull=True, total_time_limit__isnull=False
+        ).values_list("id", "started_at", "total_time_limit")
+        self._heap = [(_deadline(started_at, limit), attempt_id) for attempt_id, started_at, limit in rows]
+        heapq.heapify(self._heap)
+        self._notify()
+
+    def schedule(self, attempt_id: int, started_at: datetime, total_time_limit: int):
+        deadline = _deadline(started_at, total_time_limit)
+        heapq.heappush(self._heap, (deadline, attempt_id))
+        if self._heap[0][1] == attempt_id:
+            self._notify()
+
+    def _retry(self, attempt_id: int):
+        failures = self._failures[attempt_id] = self._failures.get(attempt_id, 0) + 1
+        backoff = min(RETRY_BACKOFF_SECONDS * 2 ** (failures - 1), MAX_RETRY_BACKOFF_SECONDS)
+        heapq.heappush(self._heap, (time.time() + backoff, attempt_id))
+        if self._heap[0][1] == attempt_id:
+            self._notify()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.time())
+            if timeout != 0.0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            due = self._pop_due(time.time())
+            if due:
+                try:
+                    await self.expire(due)
+                except Exception:
+                    logger.exception("Failed to finalize expired attempts %s", due)
+                    for attempt_id in due:
+                        self._retry(attempt_id)
+
+    async def expire(self, attempt_ids: List[int]) -> int:
+        """Finalize the still-open attempts among ``attempt_ids``. Returns how many were finalized."""
+        from quiz_results import finalize_attempt
+
+        attempts = await QuizAttempt.filter(
+            id__in=attempt_ids, completed_at__isnull=True
+        ).prefetch_related("user")
+        finalized = 0
+        for attempt in attempts:
+            try:
+                async with in_transaction(PRIMARY):
+                    result = await finalize_attempt(attempt, attempt.user)
+            except Exception:
+                logger.exception("Failed to finalize expired attempt %s", attempt.id)
+                self._retry(attempt.id)
+                continue
+            self._failures.pop(attempt.id, None)
+            if result is not None:
+                finalized += 1
+        return finalized
+
+
+expiry_scheduler = ExpiryScheduler(batch_size=EXPIRY_BATCH_SIZE)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -72,9 +72,10 @@ class AnswerUpdate(BaseModel):
 class QuizAttemptCreate(BaseModel):
     category_id: Optional[int] = None
     total_time_limit: Optional[int] = None
-    difficulty: Optional[str] = None
+    difficulty: Optional[str] = None  # starting difficulty in adaptive mode
     num_questions: Optional[int] = None
     randomize: Optional[bool] = False
+    mode: Literal["fixed", "adaptive"] = "fixed"
 
 class QuizAttemptResponse(BaseModel):
     id: int
@@ -87,6 +88,69 @@ class QuizAttemptResponse(BaseModel):
     num_questions: Optional[int] = None
     randomize: bool = False
     selected_count: Optional[int] = None
+    mode: str = "fixed"
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AttemptSummary(BaseModel):
+    id: int
+    category_id: Optional[int] = None
+    category_name: Optional[str] = None
+    mode: str
+    started_at: datetime
+    completed_at: Optional[datetime] = None
+    num_questions: Optional[int] = None
+    time_spent: Optional[int] = None
+    # from the attempt's result; None while the attempt is open
+    total_questions: Optional[int] = None
+    correct_answers: Optional[int] = None
+    score: Optional[float] = None
+    timed_out: Optional[bool] = None
+
+
+class AttemptHistoryPage(BaseModel):
+    items: List[AttemptSummary] = Field(default_factory=list)
+    next_cursor: Optional[int] = None  # pass as ``cursor`` to get the next (older) page
+
+
+class AnswerOption(BaseModel):
+    """An answer as shown to a quiz taker, without ``is_correct``."""
+    id: int
+    text: str
+
+
+class QuizQuestion(BaseModel):
+    """A question as shown to a quiz taker."""
+    id: int
+    text: str
+    difficulty: Optional[str] = None
+    time_limit_seconds: Optional[int] = None
+    answers: List[AnswerOption] = Field(default_factory=list)
+
+
+class AttemptDeckResponse(BaseModel):
+    attempt_id: int
+    questions: List[QuizQuestion] = Field(default_factory=list)
+
+
+class NextQuestionResponse(BaseModel):
+    done: bool = False
+    index: int  # number of questions served so far, including this one
+    difficulty: Optional[str] = None
+    question: Optional[QuizQuestion] = None
+
+class UserAnswerSubmit(BaseModel):
+    question_id: int
+    answer_id: int
+
+
+class UserAnswerResponse(BaseModel):
+    id: int
+    question_id: int
+    answer_id: int
+    served_after_ms: Optional[int] = None
+    answered_after_ms: Optional[int] = None
+    is_late: bool = False
     model_config = ConfigDict(from_attributes=True)
 
 class QuizResultResponse(BaseModel):
@@ -97,6 +161,7 @@ class QuizResultResponse(BaseModel):
     time_spent: Optional[int] = None
     timed_out: bool = False
     completed_at: datetime
+    percentile: Optional[float] = None  # share of earlier takers of the category who scored lower, in %
     model_config = ConfigDict(from_attributes=True)
 
 class UserStatisticsResponse(BaseModel):
@@ -116,6 +181,21 @@ class LeaderboardEntry(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class RankedLeaderboardEntry(BaseModel):
+    rank: int  # 1-based; users with the same average score share a rank
+    username: str
+    total_quizzes: int
+    average_score: float
+
+
+class LeaderboardResponse(BaseModel):
+    category_id: Optional[int] = None  # None: all categories
+    window: str
+    period: str
+    entries: List[RankedLeaderboardEntry] = Field(default_factory=list)
+    me: Optional[RankedLeaderboardEntry] = None  # the caller's own rank, if they are on the board
+
+
 class CategoryStatistics(BaseModel):
     category_id: int
     category_name: str
@@ -149,6 +229,9 @@ class QuestionResultDetail(BaseModel):
     correct_answer_texts: List[str] = Field(default_factory=list)
     is_correct: bool
     time_spent: Optional[int] = None
+    served_after_ms: Optional[int] = None
+    answered_after_ms: Optional[int] = None
+    is_late: bool = False
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -164,3 +247,151 @@ class AttemptDetailsResponse(BaseModel):
     timed_out: bool
     question_details: List[QuestionResultDetail] = Field(default_factory=list)
     model_config = ConfigDict(from_attributes=True)
+
+
+class AnswerAnalytics(BaseModel):
+    answer_id: int
+    text: str
+    is_correct: bool
+    times_chosen: int = 0
+    share: Optional[float] = None  # fraction of all answers to the question
+
+
+class QuestionAnalytics(BaseModel):
+    question_id: int
+    difficulty: Optional[str] = None  # label set by the author
+    calibrated_difficulty: Optional[str] = None  # derived from the observed correct rate
+    total_answers: int = 0
+    correct_answers: int = 0
+    correct_rate: Optional[float] = None
+    answers: List[AnswerAnalytics] = Field(default_factory=list)
+
+
+class QuestionPurgeRequest(BaseModel):
+    """Questions to delete: explicit ids, or every question matching the filter."""
+    ids: Optional[List[int]] = None
+    category_id: Optional[int] = None
+    difficulty: Optional[str] = None
+
+
+class CategoryPurgeRequest(BaseModel):
+    ids: List[int]
+
+
+class PurgeJobResponse(BaseModel):
+    id: int
+    kind: str  # questions | categories
+    status: str  # pending | running | done | failed | interrupted
+    total: int
+    processed: int
+    affected_rows: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class QuestionBulkUpdate(QuestionUpdate):
+    id: int
+
+
+class AnswerBulkUpdate(AnswerUpdate):
+    id: int
+
+
+class DuplicateMatch(BaseModel):
+    question_id: Optional[int] = None  # an existing question
+    import_index: Optional[int] = None  # or an earlier item of the same import
+    text: str
+    similarity: float  # estimated Jaccard similarity of the normalized texts, 1.0 for identical ones
+
+
+class QuestionCreateResponse(QuestionResponse):
+    near_duplicates: List[DuplicateMatch] = Field(default_factory=list)
+
+
+class QuestionImportItem(BaseModel):
+    index: int  # position in the request
+    id: Optional[int] = None  # the created question
+    status: Literal["created", "duplicate", "invalid", "skipped"]
+    detail: Optional[str] = None
+    near_duplicates: List[DuplicateMatch] = Field(default_factory=list)
+
+
+class QuestionImportResponse(BaseModel):
+    applied: bool  # False if any item was rejected; then nothing was written
+    items: List[QuestionImportItem] = Field(default_factory=list)
+
+
+class DuplicateClusterMember(BaseModel):
+    id: int
+    text: str
+    category_id: Optional[int] = None
+    similarity: float  # to the first (oldest) question of the cluster
+
+
+class DuplicateCluster(BaseModel):
+    questions: List[DuplicateClusterMember] = Field(default_factory=list)
+
+
+class DuplicateReport(BaseModel):
+    threshold: float
+    clusters: List[DuplicateCluster] = Field(default_factory=list)
+
+
+class BulkItemStatus(BaseModel):
+    id: int
+    status: Literal["updated", "not_found", "invalid", "skipped"]
+    detail: Optional[str] = None
+
+
+class BulkUpdateResponse(BaseModel):
+    applied: bool  # False if any item was rejected; then nothing was written
+    items: List[BulkItemStatus] = Field(default_factory=list)
+
+
+class ScoreBin(BaseModel):
+    low: float
+    high: float
+    count: int
+
+
+class ScoreDistributionResponse(BaseModel):
+    category_id: Optional[int] = None  # None: all categories
+    total: int
+    bins: List[ScoreBin] = Field(default_factory=list)
+    score: Optional[float] = None
+    percentile: Optional[float] = None  # for ``score``, in %
+    percentile_error: Optional[float] = None  # the percentile is exact to within this many points
+
+
+class QueryStatsEntry(BaseModel):
+    fingerprint: str
+    sql: str  # template: literals replaced by ?, value lists folded
+    calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    rows: int
+    slow_calls: int  # calls at or over SLOW_QUERY_MS
+    routes: Dict[str, int] = Field(default_factory=dict)  # top issuing routes -> calls
+
+
+class QueryStatsResponse(BaseModel):
+    worker_since: datetime  # statistics are per worker, collected since this time
+    slow_query_ms: float
+    statements: List[QueryStatsEntry] = Field(default_factory=list)
+
+
+class LoopStall(BaseModel):
+    started_at: datetime
+    duration_ms: Optional[float] = None  # None while the loop is still blocked
+    stack: List[str] = Field(default_factory=list)  # the blocking code, outermost frame first
+
+
+class EventLoopStatsResponse(BaseModel):
+    lag_ms: float  # most recent sample
+    max_lag_ms: float  # since the worker started
+    block_threshold_ms: float
+    stalls_total: int
+    recent_stalls: List[LoopStall] = Field(default_factory=list)  # newest first
@@ -0,0 +1,129 @@
+"""Full-text question search backed by an SQLite FTS5 index.
+
+The ``question_fts`` virtual table holds one row per question (rowid = question id)
+with the question text and the concatenated texts of its answers. Question and
+answer CRUD in ``quiz.py`` keeps it in sync; for existing data run::
+
+    python search.py rebuild
+"""
+import re
+from typing import List, Optional
+
+from tortoise import connections
+
+FTS_TABLE = "question_fts"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _connection():
+    return connections.get("default")
+
+
+def fts_enabled() -> bool:
+    return _connection().capabilities.dialect == "sqlite"
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """Turn free user input into a safe FTS5 query: every word is quoted and prefix-matched."""
+    tokens = _TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+async def ensure_index() -> None:
+    """Create the FTS table if needed and populate it when it was just created."""
+    if not fts_enabled():
+        return
+    conn = _connection()
+    _, rows = await conn.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [FTS_TABLE]
+    )
+    if rows:
+        return
+    await conn.execute_script(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(question_text, answer_text, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    await rebuild_index()
+
+
+async def rebuild_index() -> int:
+    """Re-index every question. Returns the number of indexed questions."""
+    if not fts_enabled():
+        return 0
+    conn = _connection()
+    await conn.execute_query(f"DELETE FROM {FTS_TABLE}")
+    await conn.execute_query(
+        f"INSERT INTO {FTS_TABLE} (rowid, question_text, answer_text) "
+        "SELECT q.id, q.text, COALESCE((SELECT group_concat(a.text, ' ') FROM answer a "
+        "WHERE a.question_id = q.id), '') FROM question q"
+    )
+    _, rows = await conn.execute_query(f"SELECT count(*) AS n FROM {FTS_TABLE}")
+    return rows[0]["n"]
+
+
+async def index_question(question_id: int) -> None:
+    """(Re)index a single question from its current text and answers."""
+    if not fts_enabled():
+        return
+    conn = _connection()
+    await conn.execute_query(f"DELETE FROM {FTS_TABLE} WHERE rowid = ?", [question_id])
+    await conn.execute_query(
+        f"INSERT INTO {FTS_TABLE} (rowid, question_text, answer_text) "
+        "SELECT q.id, q.text, COALESCE((SELECT group_concat(a.text, ' ') FROM answer a "
+        "WHERE a.question_id = q.id), '') FROM question q WHERE q.id = ?",
+        [question_id],
+    )
+
+
+async def remove_question(question_id: int) -> None:
+    if not fts_enabled():
+        return
+    await _connection().execute_query(f"DELETE FROM {FTS_TABLE} WHERE rowid = ?", [question_id])
+
+
+async def search_question_ids(
+    q: str,
+    category_id: Optional[int] = None,
+    difficulty: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+) -> List[int]:
+    """Return matching question ids, best match first (BM25, question text weighted over answers)."""
+    match = build_match_query(q)
+    if match is None or not fts_enabled():
+        return []
+    sql = (
+        f"SELECT f.rowid AS id FROM {FTS_TABLE} f JOIN question q ON q.id = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH ?"
+    )
+    values: list = [match]
+    if category_id is not None:
+        sql += " AND q.category_id = ?"
+        values.append(category_id)
+    if difficulty is not None:
+        sql += " AND q.difficulty = ?"
+        values.append(difficulty)
+    sql += f" ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), f.rowid LIMIT ? OFFSET ?"
+    values.extend([limit, skip])
+    _, rows = await _connection().execute_query(sql, values)
+    return [row["id"] for row in rows]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "rebuild":
+            await ensure_index()
+            print(f"Indexed {await rebuild_index()} questions")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,139 @@
+"""Startup phases, warm-up and readiness.
+
+With ``FAST_STARTUP`` enabled, schema generation is skipped and startup only
+checks that the stored ``SchemaVersion`` matches ``SCHEMA_VERSION``. Without it,
+the version is only recorded for a freshly created database: ``generate_schemas``
+creates missing tables but never alters existing ones, so an older database must
+be migrated first and then marked with ``python startup.py mark-migrated``. Every
+startup step runs as a timed phase. The steps the app cannot serve without
+(schema check, search and duplicate indexes, question pools, expiry scheduler)
+run in the lifespan. Warm-up then runs in the background: it preloads the
+category cache and reads the top of the leaderboard so that SQLite's page cache
+is hot.
+``GET /health/live`` answers as soon as the worker accepts connections, and
+``GET /health/ready`` returns 503 until warm-up has finished.
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from tortoise import connections
+
+from event_loop import loop_lag_monitor
+from config import WARMUP_LEADERBOARD_SIZE
+from db import read_connection_name
+from models import SchemaVersion
+from quiz import load_categories
+from quiz_results import load_leaderboard
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever models.py changes the tables, so fast-starting workers refuse an old schema
+SCHEMA_VERSION = 11
+
+router = APIRouter()
+
+
+class StartupState:
+    def __init__(self):
+        self.ready = False
+        self.phases: Dict[str, float] = {}  # phase name -> milliseconds
+
+    def reset(self):
+        self.ready = False
+        self.phases = {}
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 3)
+            logger.info("startup phase %s took %.1f ms", name, self.phases[name])
+
+
+startup_state = StartupState()
+
+
+def _migration_error(found: int) -> RuntimeError:
+    return RuntimeError(
+        f"Database schema version is {found}, expected {SCHEMA_VERSION}; migrate the existing tables, "
+        "then run `python startup.py mark-migrated` (generate_schemas does not alter existing tables)"
+    )
+
+
+async def record_schema_version():
+    """Store SCHEMA_VERSION after the tables of a new database were generated.
+
+    Fails if the database already records another version: its tables predate the models.
+    """
+    row, created = await SchemaVersion.get_or_create(id=1, defaults={"version": SCHEMA_VERSION})
+    if not created and row.version != SCHEMA_VERSION:
+        raise _migration_error(row.version)
+
+
+async def check_schema_version():
+    """Fail fast if the existing tables were generated for another schema version."""
+    row = await SchemaVersion.get_or_none(id=1)
+    if row is None:
+        raise RuntimeError(
+            f"Database schema version is None, expected {SCHEMA_VERSION}; "
+            "start once without FAST_STARTUP to generate the schema"
+        )
+    if row.version != SCHEMA_VERSION:
+        raise _migration_error(row.version)
+
+
+async def mark_migrated():
+    """Record SCHEMA_VERSION once the tables were migrated to the current models."""
+    await SchemaVersion.update_or_create(id=1, defaults={"version": SCHEMA_VERSION})
+
+
+async def warm_up():
+    """Preload hot read paths, then report ready. Runs in the background after startup."""
+    try:
+        async with startup_state.phase("warm_categories"):
+            await load_categories()
+        async with startup_state.phase("warm_leaderboard"):
+            await load_leaderboard(WARMUP_LEADERBOARD_SIZE, connections.get(read_connection_name()))
+    except Exception:
+        # a cold cache is not fatal; serve anyway
+        logger.exception("warm-up failed")
+    startup_state.ready = True
+
+
+@router.get("/live")
+async def liveness():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness():
+    body = {
+        "ready": startup_state.ready,
+        "phases_ms": startup_state.phases,
+        "loop_lag_ms": round(loop_lag_monitor.lag * 1000, 3),
+    }
+    return JSONResponse(body, status_code=200 if startup_state.ready else 503)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from tortoise import Tortoise, run_async
+
+    from config import DATABASE_URL
+
+    async def _main(command: str):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["models"]})
+        if command == "mark-migrated":
+            await mark_migrated()
+            print(f"Recorded schema version {SCHEMA_VERSION}")
+        else:
+            raise SystemExit(f"Unknown command: {command}")
+
+    run_async(_main(sys.argv[1] if len(sys.argv) > 1 else "mark-migrated"))
@@ -18,6 +18,12 @@ def _tmp_db_path():
 @pytest.fixture(scope="session")
 def app(_tmp_db_path):
     os.environ["DATABASE_URL"] = f"sqlite://{_tmp_db_path}"
+    # Read-only endpoints use a second connection to the same file as a stand-in replica
+    os.environ["DATABASE_READ_URL"] = f"sqlite://{_tmp_db_path}"
+    # Token buckets are exercised explicitly in test_admission.py
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    # Fail any test whose request holds the event loop too long (see BlockingBudgetMiddleware)
+    os.environ.setdefault("LOOP_BLOCK_BUDGET_MS", "150")
     # Ensure project root is on sys.path for module resolution
     project_root = pathlib.Path(__file__).resolve().parents[1]
     if str(project_root) not in sys.path:
@@ -0,0 +1,68 @@
+from test_quiz import auth_token
+
+
+def test_token_bucket_refills(app):
+    from admission import TokenBucket
+
+    bucket = TokenBucket(2, 10, now=0.0)
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) == 0
+    assert bucket.take(0.0) > 0
+    # one token is refilled every 5 seconds
+    assert bucket.take(5.0) == 0
+
+
+def test_rate_limit_per_user_and_group(client, monkeypatch):
+    import admission
+
+    monkeypatch.setattr(admission.limiter, "enabled", True)
+    monkeypatch.setitem(admission.limiter.limits, "statistics", (2, 60))
+    admission.limiter.reset()
+
+    h1 = {"Authorization": f"Bearer {auth_token(client)}"}
+    h2 = {"Authorization": f"Bearer {auth_token(client, 'limited2', 'limited2@example.com')}"}
+
+    assert client.get("/quiz/statistics/me", headers=h1).status_code == 200
+    assert client.get("/quiz/leaderboard", headers=h1).status_code == 200
+    r = client.get("/quiz/statistics/me", headers=h1)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+
+    # other users and other route groups keep their own buckets
+    assert client.get("/quiz/statistics/me", headers=h2).status_code == 200
+    assert client.get("/quiz/categories/", headers=h1).status_code == 200
+    admission.limiter.reset()
+
+
+def test_load_shedding_on_loop_lag(client, monkeypatch):
+    import admission
+
+    monkeypatch.setattr(admission.load_shedder, "max_lag_ms", 100)
+    monkeypatch.setattr(admission.loop_lag_monitor, "lag", 5.0)
+    r = client.get("/quiz/leaderboard")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(admission.load_shedder.retry_after)
+
+    monkeypatch.setattr(admission.loop_lag_monitor, "lag", 0.0)
+    assert client.get("/quiz/leaderboard").status_code == 200
+
+
+def test_shed_request_touches_no_table(client, monkeypatch):
+    import admission
+    from querylog import query_stats
+
+    headers = {"Authorization": f"Bearer {auth_token(client)}", "Idempotency-Key": "shed-1"}
+    statements = []
+    monkeypatch.setattr(query_stats, "record", lambda sql, duration_ms, rows, scope: statements.append((sql, scope)))
+    monkeypatch.setattr(admission.load_shedder, "overloaded", lambda: True)
+    assert client.post("/quiz/attempts/", json={}, headers=headers).status_code == 503
+    # statements with a scope were issued by a request; background tasks have none
+    assert [sql for sql, scope in statements if scope is not None] == []
+
+
+def test_load_shedding_on_in_flight(client, monkeypatch):
+    import admission
+
+    monkeypatch.setattr(admission.load_shedder, "max_in_flight", 1)
+    monkeypatch.setattr(admission.load_shedder, "in_flight", 1)
+    assert client.get("/quiz/leaderboard").status_code == 503
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+from test_attempts import _create_question
+from test_quiz import auth_token
+
+
+def test_archived_attempts_keep_statistics_and_details_exact(client):
+    from archive import archive_old_rows
+    from models import ArchivedQuizResult, ArchivedUserAnswer, QuizResult, UserAnswer
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'archive1', 'archive1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Archive"}, headers=headers).json()
+    questions = [_create_question(client, headers, f"Archive {i}", category["id"]) for i in range(2)]
+
+    attempt_ids = []
+    for picks in ((1, 1), (1, 2)):  # first attempt all right, second half right
+        attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+        for (question_id, right, wrong), pick in zip(questions, picks):
+            client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                        json={"question_id": question_id, "answer_id": right if pick == 1 else wrong},
+                        headers=headers)
+        client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+        attempt_ids.append(attempt["id"])
+
+    by_category = client.get("/quiz/statistics/me/by-category", headers=headers).json()
+    details = client.get(f"/quiz/attempts/{attempt_ids[0]}/details", headers=headers).json()
+    assert by_category[0]["total_quizzes"] == 2
+
+    # age the first attempt past the cutoff and archive it
+    old = datetime.now(timezone.utc) - timedelta(days=800)
+    async def age():
+        await QuizResult.filter(attempt_id=attempt_ids[0]).update(completed_at=old)
+    client.portal.call(age)
+    assert client.portal.call(archive_old_rows) == 1
+    assert client.portal.call(archive_old_rows) == 0
+
+    assert client.portal.call(QuizResult.filter(attempt_id=attempt_ids[0]).count) == 0
+    assert client.portal.call(UserAnswer.filter(attempt_id=attempt_ids[0]).count) == 0
+    assert client.portal.call(ArchivedQuizResult.filter(attempt_id=attempt_ids[0]).count) == 1
+    assert client.portal.call(ArchivedUserAnswer.filter(attempt_id=attempt_ids[0]).count) == 2
+
+    assert client.get("/quiz/statistics/me/by-category", headers=headers).json() == by_category
+    assert client.get(f"/quiz/attempts/{attempt_ids[0]}/details", headers=headers).json() == details
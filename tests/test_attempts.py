@@ -0,0 +1,517 @@
+import asyncio
+import time
+
+import pytest
+
+from test_quiz import auth_token
+
+
+def _create_question(client, headers, text, category_id, time_limit_seconds=None):
+    r = client.post(
+        "/quiz/questions/",
+        json={
+            "text": text,
+            "category_id": category_id,
+            "time_limit_seconds": time_limit_seconds,
+            "answers": [{"text": "right", "is_correct": True}, {"text": "wrong", "is_correct": False}],
+        },
+        headers=headers,
+    )
+    question = r.json()
+    right = next(a["id"] for a in question["answers"] if a["is_correct"])
+    wrong = next(a["id"] for a in question["answers"] if not a["is_correct"])
+    return question["id"], right, wrong
+
+
+def test_submit_answers_with_timing_and_late_flag(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'timing1', 'timing1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Timing"}, headers=headers).json()
+    q1, q1_right, _ = _create_question(client, headers, "Timed 1", category["id"], time_limit_seconds=30)
+    q2, q2_right, _ = _create_question(client, headers, "Timed 2", category["id"], time_limit_seconds=1)
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    r = client.post(f"/quiz/attempts/{attempt['id']}/answers", json={"question_id": q1, "answer_id": q1_right}, headers=headers)
+    assert r.status_code == 200, r.text
+    first = r.json()
+    assert first["served_after_ms"] == 0
+    assert first["answered_after_ms"] >= 0
+    assert first["is_late"] is False
+
+    r = client.post(f"/quiz/attempts/{attempt['id']}/answers", json={"question_id": q1, "answer_id": q1_right}, headers=headers)
+    assert r.status_code == 400
+
+    # the second question is served when the first answer was accepted; answering it after 1s is late
+    time.sleep(1.2)
+    r = client.post(f"/quiz/attempts/{attempt['id']}/answers", json={"question_id": q2, "answer_id": q2_right}, headers=headers)
+    second = r.json()
+    assert second["served_after_ms"] == first["answered_after_ms"]
+    assert second["is_late"] is True
+
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["total_questions"] == 2
+    assert result["correct_answers"] == 1
+
+    details = client.get(f"/quiz/attempts/{attempt['id']}/details", headers=headers).json()
+    by_id = {d["question_id"]: d for d in details["question_details"]}
+    assert by_id[q1]["is_correct"] is True
+    assert by_id[q1]["is_late"] is False
+    assert by_id[q2]["is_correct"] is False
+    assert by_id[q2]["is_late"] is True
+    assert by_id[q2]["time_spent"] >= 1
+    assert by_id[q2]["served_after_ms"] == first["answered_after_ms"]
+
+
+def test_submit_answer_validation(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'timing2', 'timing2@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Validation"}, headers=headers).json()
+    other = client.post("/quiz/categories/", json={"name": "Validation other"}, headers=headers).json()
+    qid, right, _ = _create_question(client, headers, "In attempt", category["id"])
+    other_qid, other_right, _ = _create_question(client, headers, "Not in attempt", other["id"])
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+    url = f"/quiz/attempts/{attempt['id']}/answers"
+
+    assert client.post(url, json={"question_id": other_qid, "answer_id": other_right}, headers=headers).status_code == 400
+    assert client.post(url, json={"question_id": qid, "answer_id": other_right}, headers=headers).status_code == 404
+    assert client.post(url, json={"question_id": 99999, "answer_id": right}, headers=headers).status_code == 404
+
+    client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert client.post(url, json={"question_id": qid, "answer_id": right}, headers=headers).status_code == 400
+
+
+def test_concurrent_answers_to_one_question_store_one(client, monkeypatch):
+    from models import UserAnswer
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'timing3', 'timing3@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Answer race"}, headers=headers).json()
+    qid, right, wrong = _create_question(client, headers, "Raced", category["id"])
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+    url = f"/quiz/attempts/{attempt['id']}/answers"
+
+    async def never_answered(**filters):
+        return False
+
+    # both submits pass the "already answered" check, as two racing requests would
+    monkeypatch.setattr(UserAnswer, "exists", never_answered)
+    assert client.post(url, json={"question_id": qid, "answer_id": right}, headers=headers).status_code == 200
+    r = client.post(url, json={"question_id": qid, "answer_id": wrong}, headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Question already answered"
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["correct_answers"] == 1
+
+
+def test_question_analytics_counters(client, monkeypatch):
+    import analytics
+
+    monkeypatch.setattr(analytics, "DIFFICULTY_MIN_SAMPLES", 3)
+    headers = {"Authorization": f"Bearer {auth_token(client, 'stats1', 'stats1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Analytics"}, headers=headers).json()
+    qid, right, wrong = _create_question(client, headers, "Analytics question", category["id"])
+
+    for i, answer_id in enumerate([right, wrong, wrong]):
+        user_headers = {"Authorization": f"Bearer {auth_token(client, f'taker{i}', f'taker{i}@example.com')}"}
+        attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=user_headers).json()
+        r = client.post(
+            f"/quiz/attempts/{attempt['id']}/answers",
+            json={"question_id": qid, "answer_id": answer_id},
+            headers=user_headers,
+        )
+        assert r.status_code == 200
+
+    r = client.get(f"/quiz/questions/{qid}/analytics", headers=headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total_answers"] == 3
+    assert data["correct_answers"] == 1
+    assert abs(data["correct_rate"] - 1 / 3) < 1e-9
+    assert data["calibrated_difficulty"] == "hard"
+    chosen = {a["answer_id"]: a["times_chosen"] for a in data["answers"]}
+    assert chosen == {right: 1, wrong: 2}
+
+    r = client.get(f"/quiz/questions/analytics?category_id={category['id']}", headers=headers)
+    assert [a["question_id"] for a in r.json()] == [qid]
+
+    # rebuilding from the answer history yields the same counters
+    client.portal.call(analytics.rebuild_analytics)
+    assert client.get(f"/quiz/questions/{qid}/analytics", headers=headers).json() == data
+
+    # changing the answer key recounts the correct answers
+    client.put(f"/quiz/answers/{wrong}", json={"is_correct": True}, headers=headers)
+    flipped = client.get(f"/quiz/questions/{qid}/analytics", headers=headers).json()
+    assert (flipped["correct_answers"], flipped["calibrated_difficulty"]) == (3, "easy")
+    client.patch(
+        "/quiz/answers/bulk",
+        json=[{"id": right, "is_correct": False}, {"id": wrong, "is_correct": False}],
+        headers=headers,
+    )
+    flipped = client.get(f"/quiz/questions/{qid}/analytics", headers=headers).json()
+    assert (flipped["correct_answers"], flipped["calibrated_difficulty"]) == (0, "hard")
+
+    assert client.get("/quiz/questions/99999/analytics", headers=headers).status_code == 404
+
+
+def test_adaptive_attempt_steps_difficulty(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'adaptive1', 'adaptive1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Adaptive"}, headers=headers).json()
+    keys = {}
+    for difficulty in ("easy", "medium", "hard"):
+        for i in range(2):
+            r = client.post(
+                "/quiz/questions/",
+                json={
+                    "text": f"Adaptive {difficulty} {i}",
+                    "category_id": category["id"],
+                    "difficulty": difficulty,
+                    "answers": [{"text": "right", "is_correct": True}, {"text": "wrong", "is_correct": False}],
+                },
+                headers=headers,
+            )
+            question = r.json()
+            keys[question["id"]] = {a["text"]: a["id"] for a in question["answers"]}
+
+    attempt = client.post(
+        "/quiz/attempts/",
+        json={"category_id": category["id"], "mode": "adaptive", "num_questions": 4},
+        headers=headers,
+    ).json()
+    assert attempt["mode"] == "adaptive"
+    assert attempt["selected_count"] == 0
+    next_url = f"/quiz/attempts/{attempt['id']}/next"
+
+    def serve_and_answer(expected_difficulty, choice):
+        r = client.post(next_url, headers=headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        assert body["difficulty"] == expected_difficulty
+        question = body["question"]
+        assert question["id"] in keys
+        assert all("is_correct" not in a for a in question["answers"])
+        # asking again before answering serves the same question
+        assert client.post(next_url, headers=headers).json()["question"]["id"] == question["id"]
+        client.post(
+            f"/quiz/attempts/{attempt['id']}/answers",
+            json={"question_id": question["id"], "answer_id": keys[question["id"]][choice]},
+            headers=headers,
+        )
+        return question["id"]
+
+    served = [
+        serve_and_answer("medium", "right"),  # 1/1 correct -> harder
+        serve_and_answer("hard", "wrong"),    # 1/2 -> stay
+        serve_and_answer("hard", "wrong"),    # 1/3 -> easier
+        serve_and_answer("medium", "right"),
+    ]
+    assert len(set(served)) == 4
+    assert client.post(next_url, headers=headers).json()["done"] is True
+
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["total_questions"] == 4
+    assert result["correct_answers"] == 2
+
+
+def test_question_pools_track_crud(client):
+    from pools import question_pools
+
+    headers = {"Authorization": f"Bearer {auth_token(client)}"}
+    category = client.post("/quiz/categories/", json={"name": "Pools"}, headers=headers).json()
+    qid = client.post(
+        "/quiz/questions/",
+        json={"text": "Pooled", "category_id": category["id"], "difficulty": "easy"},
+        headers=headers,
+    ).json()["id"]
+    assert question_pools.pick(category["id"], "easy", set()) == qid
+
+    client.put(f"/quiz/questions/{qid}", json={"difficulty": "hard"}, headers=headers)
+    assert question_pools.pick(category["id"], "easy", set()) is None
+    assert question_pools.pick(category["id"], "hard", set()) == qid
+    assert question_pools.pick(category["id"], "hard", {qid}) is None
+
+    async def reload_during_crud():
+        reload = asyncio.ensure_future(question_pools.load())
+        await asyncio.sleep(0)  # the reload is reading the questions table now
+        # the current pools keep serving, and CRUD applied meanwhile survives the swap
+        serving = question_pools.pick(category["id"], "hard", set())
+        question_pools.update(qid, category["id"], "medium")
+        await reload
+        return serving, question_pools.pick(category["id"], "medium", set())
+
+    assert client.portal.call(reload_during_crud) == (qid, qid)
+    assert question_pools.pick(category["id"], "hard", set()) is None
+
+    client.delete(f"/quiz/questions/{qid}", headers=headers)
+    assert question_pools.pick(category["id"], "medium", set()) is None
+
+
+def test_attempt_deck_snapshot_is_immutable(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'deck1', 'deck1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Deck"}, headers=headers).json()
+    q1, q1_right, q1_wrong = _create_question(client, headers, "Deck question 1", category["id"], time_limit_seconds=20)
+    q2, _, _ = _create_question(client, headers, "Deck question 2", category["id"])
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    r = client.get(f"/quiz/attempts/{attempt['id']}/deck", headers=headers)
+    assert r.status_code == 200
+    deck = r.json()
+    assert deck["attempt_id"] == attempt["id"]
+    assert [q["id"] for q in deck["questions"]] == [q1, q2]
+    assert deck["questions"][0]["text"] == "Deck question 1"
+    assert deck["questions"][0]["time_limit_seconds"] == 20
+    assert all("is_correct" not in a for q in deck["questions"] for a in q["answers"])
+
+    # editing the question and flipping the key mid-attempt changes neither the deck nor grading
+    client.put(f"/quiz/questions/{q1}", json={"text": "Edited"}, headers=headers)
+    client.put(f"/quiz/answers/{q1_right}", json={"is_correct": False}, headers=headers)
+    client.put(f"/quiz/answers/{q1_wrong}", json={"is_correct": True}, headers=headers)
+    assert client.get(f"/quiz/attempts/{attempt['id']}/deck", headers=headers).json() == deck
+
+    client.post(f"/quiz/attempts/{attempt['id']}/answers", json={"question_id": q1, "answer_id": q1_right}, headers=headers)
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["correct_answers"] == 1
+
+    details = client.get(f"/quiz/attempts/{attempt['id']}/details", headers=headers).json()
+    first = details["question_details"][0]
+    assert first["question_text"] == "Deck question 1"
+    assert first["correct_answer_ids"] == [q1_right]
+    assert first["is_correct"] is True
+
+
+def test_attempt_without_questions_has_no_deck(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'deck2', 'deck2@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Empty deck"}, headers=headers).json()
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+    assert client.get(f"/quiz/attempts/{attempt['id']}/deck", headers=headers).status_code == 404
+
+
+def test_read_endpoints_use_replica_connection(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'replica1', 'replica1@example.com')}"}
+    attempt = client.post("/quiz/attempts/", json={}, headers=headers)
+    assert "X-DB-Connection" not in attempt.headers
+    client.post(f"/quiz/attempts/{attempt.json()['id']}/complete", headers=headers)
+
+    for url in (
+        "/quiz/leaderboard",
+        "/quiz/statistics/me",
+        "/quiz/statistics/me/by-category",
+        "/quiz/statistics/me/by-date?period=week",
+        "/quiz/questions/",
+        "/quiz/questions/analytics",
+    ):
+        r = client.get(url, headers=headers)
+        assert r.status_code == 200, url
+        assert r.headers["X-DB-Connection"] == "replica", url
+
+    # writes made on the primary are visible through the replica connection
+    stats = client.get("/quiz/statistics/me", headers=headers).json()
+    assert stats["total_quizzes"] == 1
+    assert any(e["username"] == "replica1" for e in client.get("/quiz/leaderboard?limit=100").json())
+
+
+def test_statistics_read_your_writes_under_replica_lag(client):
+    from tortoise import connections
+
+    from models import UserStatistics
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'replica2', 'replica2@example.com')}"}
+    attempt = client.post("/quiz/attempts/", json={}, headers=headers).json()
+    replica = connections.get("replica")
+
+    async def pin_snapshot():
+        # an open read transaction keeps the replica connection on the current snapshot
+        await replica.execute_query("BEGIN")
+        await replica.execute_query("SELECT count(*) FROM userstatistics")
+
+    async def end_snapshot():
+        await replica.execute_query("COMMIT")
+        return await UserStatistics.filter(user__username="replica2").count()
+
+    client.portal.call(pin_snapshot)
+    try:
+        client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+        stats = client.get("/quiz/statistics/me", headers=headers).json()
+    finally:
+        rows = client.portal.call(end_snapshot)
+    assert stats["total_quizzes"] == 1
+    assert rows == 1
+
+
+def test_attempt_history_is_keyset_paginated(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'history1', 'history1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Attempt history"}, headers=headers).json()
+    question_id, right, _ = _create_question(client, headers, "History question", category["id"])
+    attempt_ids = []
+    for _ in range(5):
+        attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+        attempt_ids.append(attempt["id"])
+    for attempt_id in attempt_ids[:3]:
+        client.post(f"/quiz/attempts/{attempt_id}/answers", json={"question_id": question_id, "answer_id": right},
+                    headers=headers)
+        client.post(f"/quiz/attempts/{attempt_id}/complete", headers=headers)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/quiz/attempts/", params=params, headers=headers).json()
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [item["id"] for item in seen] == attempt_ids[::-1]
+    done = {item["id"]: item for item in seen if item["completed_at"]}
+    assert set(done) == set(attempt_ids[:3])
+    assert all(item["score"] == 100.0 and item["correct_answers"] == 1 for item in done.values())
+    assert all(item["score"] is None for item in seen if item["id"] not in done)
+
+    page = client.get("/quiz/attempts/", params={"completed": False, "category_id": category["id"]},
+                      headers=headers).json()
+    assert [item["id"] for item in page["items"]] == attempt_ids[:2:-1]
+
+
+def test_category_and_window_leaderboards(client):
+    from leaderboards import rebuild_leaderboards
+
+    category = None
+    scores = {}
+    for name, picks in (("board1", (1, 1)), ("board2", (1, 0)), ("board3", (0, 0))):
+        headers = {"Authorization": f"Bearer {auth_token(client, name, f'{name}@example.com')}"}
+        if category is None:
+            category = client.post("/quiz/categories/", json={"name": "Boards"}, headers=headers).json()
+            questions = [_create_question(client, headers, f"Board {i}", category["id"]) for i in range(2)]
+        attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+        for (question_id, right, wrong), pick in zip(questions, picks):
+            client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                        json={"question_id": question_id, "answer_id": right if pick else wrong}, headers=headers)
+        scores[name] = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()["score"]
+    assert scores == {"board1": 100.0, "board2": 50.0, "board3": 0.0}
+
+    def board(window, **params):
+        r = client.get(f"/quiz/leaderboards/{window}", params={"category_id": category["id"], **params},
+                       headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    for window in ("all", "month", "week"):
+        body = board(window, limit=2)
+        assert [(e["rank"], e["username"]) for e in body["entries"]] == [(1, "board1"), (2, "board2")]
+        # headers belong to board3, who is not in the top 2
+        assert body["me"] == {"rank": 3, "username": "board3", "total_quizzes": 1, "average_score": 0.0}
+
+    assert board("week", period="2000-W01")["entries"] == []
+    before = board("month")
+    client.portal.call(rebuild_leaderboards)
+    assert board("month") == before
+    r = client.get("/quiz/leaderboards/week", params={"category_id": 999999}, headers=headers)
+    assert r.status_code == 404
+
+
+def test_score_distribution_and_percentile(client):
+    from distribution import percentile
+
+    # 10 results in the 50-55 bin: 53 sits 60% into it, beating an estimated 6 of them
+    counts = [0] * 20
+    counts[10] = 10
+    counts[0] = 10
+    assert percentile(counts, 53) == (80.0, 50.0)
+    assert percentile([0] * 20, 53) == (None, None)
+
+    category = None
+    results = []
+    for name, pick in (("dist1", 0), ("dist2", 1), ("dist3", 1)):
+        headers = {"Authorization": f"Bearer {auth_token(client, name, f'{name}@example.com')}"}
+        if category is None:
+            category = client.post("/quiz/categories/", json={"name": "Distribution"}, headers=headers).json()
+            question_id, right, wrong = _create_question(client, headers, "Distribution question", category["id"])
+        attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+        client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                    json={"question_id": question_id, "answer_id": right if pick else wrong}, headers=headers)
+        results.append(client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json())
+
+    assert results[0]["percentile"] is None  # first taker
+    assert results[1]["percentile"] == 100.0  # 100 beats the one 0
+    assert results[2]["percentile"] == 100.0  # ties in the top bin count as beaten (within the error bound)
+
+    r = client.get("/quiz/statistics/distribution", params={"category_id": category["id"], "score": 50},
+                   headers=headers)
+    body = r.json()
+    assert body["total"] == 3
+    assert [b["count"] for b in body["bins"]][0] == 1 and body["bins"][-1]["count"] == 2
+    assert body["percentile"] == 100 / 3 and body["percentile_error"] == 0.0
+
+
+def test_completion_commits_or_rolls_back_as_one_unit(client, monkeypatch):
+    import distribution
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'unit1', 'unit1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Unit of work"}, headers=headers).json()
+    question_id, right, _ = _create_question(client, headers, "Unit of work question", category["id"])
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+    client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                json={"question_id": question_id, "answer_id": right}, headers=headers)
+
+    async def failing_record_score(category_id, score):
+        raise RuntimeError("histogram unavailable")
+
+    # the last side effect fails after the attempt, result, statistics and leaderboards were written
+    monkeypatch.setattr(distribution, "record_score", failing_record_score)
+    with pytest.raises(RuntimeError):
+        client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert client.get("/quiz/statistics/me", headers=headers).json()["total_quizzes"] == 0
+    assert client.get("/quiz/attempts/", headers=headers).json()["items"][0]["completed_at"] is None
+    board = client.get("/quiz/leaderboards/all", params={"category_id": category["id"]}, headers=headers).json()
+    assert board["entries"] == []
+
+    monkeypatch.undo()
+    r = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["score"] == 100.0
+    board = client.get("/quiz/leaderboards/all", params={"category_id": category["id"]}, headers=headers).json()
+    assert board["me"]["total_quizzes"] == 1
+
+
+def test_answer_key_index_grades_attempts_without_a_deck(client, monkeypatch):
+    import answer_keys
+    from models import QuizAttempt
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'keys1', 'keys1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Answer keys"}, headers=headers).json()
+    q1, q1_right, q1_wrong = _create_question(client, headers, "Key question 1", category["id"])
+    q2, q2_right, q2_wrong = _create_question(client, headers, "Key question 2", category["id"])
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    async def drop_deck():
+        # attempts started before decks were snapshotted are graded against the live key
+        await QuizAttempt.filter(id=attempt["id"]).update(deck=None)
+
+    client.portal.call(drop_deck)
+    for question_id, answer_id in ((q1, q1_right), (q2, q2_wrong)):
+        client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                    json={"question_id": question_id, "answer_id": answer_id}, headers=headers)
+
+    loads = []
+    real_load = answer_keys._load
+
+    async def counting_load(question_ids):
+        loads.append(sorted(question_ids))
+        return await real_load(question_ids)
+
+    monkeypatch.setattr(answer_keys, "_load", counting_load)
+
+    async def keys_for_both():
+        return await answer_keys.answer_keys([q1, q2])
+
+    keys = client.portal.call(keys_for_both)
+    assert keys[q1].ids == {q1_right} and keys[q2].texts == {q2_right: "right"}
+    assert loads == [[q1, q2]]  # one bulk load
+
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["correct_answers"] == 1
+    details = client.get(f"/quiz/attempts/{attempt['id']}/details", headers=headers).json()
+    assert loads == [[q1, q2]]  # grading and details were served from the index
+    second = details["question_details"][1]
+    assert second["correct_answer_ids"] == [q2_right] and second["correct_answer_texts"] == ["right"]
+    assert second["user_answer_text"] == "wrong" and second["is_correct"] is False
+
+    # editing an answer invalidates the index
+    client.put(f"/quiz/answers/{q2_wrong}", json={"is_correct": True}, headers=headers)
+    assert client.portal.call(keys_for_both)[q2].ids == {q2_right, q2_wrong}
+    assert len(loads) == 2
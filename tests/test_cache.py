@@ -0,0 +1,85 @@
+import os
+import pathlib
+import subprocess
+import sys
+import textwrap
+
+from test_quiz import auth_token
+
+# A second "worker": its own process and its own app instance on the same database
+_WORKER = textwrap.dedent("""
+    import os, sys
+    from fastapi.testclient import TestClient
+    from main import app
+
+    headers = {"Authorization": f"Bearer {os.environ['TOKEN']}"}
+    category_id = int(os.environ["CATEGORY_ID"])
+    with TestClient(app) as client:
+        r = client.put(f"/quiz/categories/{category_id}", json={"name": "Renamed elsewhere"}, headers=headers)
+        assert r.status_code == 200, r.text
+        r = client.post(
+            "/quiz/questions/",
+            json={"text": "Added elsewhere", "category_id": category_id, "difficulty": "hard",
+                  "answers": [{"text": "a", "is_correct": True}]},
+            headers=headers,
+        )
+        assert r.status_code == 200, r.text
+        print(r.json()["id"])
+""")
+
+
+def _run_worker(token, category_id):
+    project_root = pathlib.Path(__file__).resolve().parents[1]
+    env = dict(
+        os.environ,
+        TOKEN=token,
+        CATEGORY_ID=str(category_id),
+        PYTHONPATH=str(project_root),
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", _WORKER], env=env, cwd=project_root,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert out.returncode == 0, out.stderr
+    return int(out.stdout.strip().splitlines()[-1])
+
+
+def test_writes_in_another_worker_invalidate_local_caches(client, monkeypatch):
+    from cache import category_cache, question_cache
+
+    token = auth_token(client, 'cache1', 'cache1@example.com')
+    headers = {"Authorization": f"Bearer {token}"}
+    category = client.post("/quiz/categories/", json={"name": "Cached"}, headers=headers).json()
+    question = client.post(
+        "/quiz/questions/",
+        json={"text": "Cached question", "category_id": category["id"], "difficulty": "medium",
+              "answers": [{"text": "a", "is_correct": True}]},
+        headers=headers,
+    ).json()
+    assert client.get(f"/quiz/categories/{category['id']}", headers=headers).json()["name"] == "Cached"
+    assert client.get(f"/quiz/questions/{question['id']}", headers=headers).json()["category"] == "Cached"
+
+    # within the check interval the local copies are served as they are
+    monkeypatch.setattr(category_cache, "check_interval", 3600)
+    monkeypatch.setattr(question_cache, "check_interval", 3600)
+    category_cache._checked_at = question_cache._checked_at = float("inf")
+    remote_question_id = _run_worker(token, category["id"])
+    assert client.get(f"/quiz/categories/{category['id']}", headers=headers).json()["name"] == "Cached"
+
+    # once the interval has passed the generation check drops them
+    category_cache._checked_at = question_cache._checked_at = float("-inf")
+    assert client.get(f"/quiz/categories/{category['id']}", headers=headers).json()["name"] == "Renamed elsewhere"
+    assert client.get(f"/quiz/questions/{question['id']}", headers=headers).json()["category"] == "Renamed elsewhere"
+
+    # the adaptive pools were reloaded too, in the background, so the remote question can be served
+    from pools import question_pools
+
+    client.portal.call(question_pools.reloaded)
+    attempt = client.post(
+        "/quiz/attempts/",
+        json={"category_id": category["id"], "mode": "adaptive", "difficulty": "hard", "num_questions": 1},
+        headers=headers,
+    ).json()
+    r = client.post(f"/quiz/attempts/{attempt['id']}/next", headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["question"]["id"] == remote_question_id
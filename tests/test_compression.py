@@ -0,0 +1,74 @@
+import gzip
+import zlib
+
+from test_quiz import auth_token
+
+
+def test_large_responses_are_gzipped_and_small_ones_are_not(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'gzip1', 'gzip1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Compression"}, headers=headers).json()
+    for i in range(20):
+        client.post(
+            "/quiz/questions/",
+            json={"text": f"Compressible question {i} " + "lorem ipsum " * 10, "category_id": category["id"],
+                  "answers": [{"text": "answer text " * 5, "is_correct": True}]},
+            headers=headers,
+        )
+
+    r = client.get(
+        f"/quiz/questions/?limit=20&category_id={category['id']}",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert len(r.json()) == 20  # httpx decodes the body transparently
+
+    r = client.get(f"/quiz/categories/{category['id']}", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+    r = client.get(
+        f"/quiz/questions/?limit=20&category_id={category['id']}",
+        headers={**headers, "Accept-Encoding": "identity"},
+    )
+    assert "content-encoding" not in r.headers
+
+
+def test_streaming_responses_are_compressed_chunk_by_chunk(app):
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    from compression import CompressionMiddleware, choose_encoding
+
+    assert choose_encoding("gzip;q=0.5, br;q=0", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("*", ["br", "gzip"]) == "br"
+    assert choose_encoding("gzip;q=0", ["gzip"]) is None
+
+    chunks = [b"x" * 100, b"y" * 100, b"z" * 100]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    sent = []
+    stream_app = CompressionMiddleware(
+        Starlette(routes=[Route("/", lambda request: StreamingResponse(stream()))]), minimum_size=10
+    )
+
+    async def recording_app(scope, receive, send):
+        async def record(message):
+            sent.append(message)
+            await send(message)
+        await stream_app(scope, receive, record)
+
+    with TestClient(recording_app) as c:
+        r = c.get("/", headers={"Accept-Encoding": "gzip"})
+    assert r.content == b"".join(chunks)
+    bodies = [m["body"] for m in sent if m["type"] == "http.response.body"]
+    # one compressed message per chunk, each decodable on arrival
+    assert len(bodies) == len(chunks) + 1
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(bodies[0]) == chunks[0]
+    assert gzip.decompress(b"".join(bodies)) == b"".join(chunks)
@@ -0,0 +1,65 @@
+from test_quiz import auth_token
+
+
+def test_near_duplicates_are_reported_on_create_import_and_in_the_report(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'dedupe', 'dedupe@example.com')}"}
+    category_id = client.post("/quiz/categories/", json={"name": "Dedupe"}, headers=headers).json()["id"]
+
+    def create(text, **params):
+        return client.post(
+            "/quiz/questions/", params=params, json={"text": text, "category_id": category_id}, headers=headers
+        )
+
+    original = create("Which chemical element has the symbol Fe on the periodic table?").json()
+    assert original["near_duplicates"] == []
+    rejected = create("which chemical element has the symbol FE on the 'periodic-table'", on_duplicate="reject")
+    assert rejected.status_code == 409
+    assert rejected.json()["detail"]["near_duplicates"][0]["question_id"] == original["id"]
+    assert rejected.json()["detail"]["near_duplicates"][0]["similarity"] == 1.0
+    typo = create("Which chemical elements has the symbol Fe on the periodic table?").json()
+    assert [m["question_id"] for m in typo["near_duplicates"]] == [original["id"]]
+    assert 0.8 <= typo["near_duplicates"][0]["similarity"] < 1.0
+    spider = create("How many legs does a spider have?").json()
+    assert spider["near_duplicates"] == []
+
+    items = [
+        {"text": "Who painted the Mona Lisa?", "category_id": category_id},
+        {"text": "Which chemical element has symbol Fe on the periodic table?", "category_id": category_id},
+    ]
+    body = client.post("/quiz/questions/import", params={"on_duplicate": "reject"}, json=items, headers=headers).json()
+    assert body["applied"] is False
+    assert [item["status"] for item in body["items"]] == ["skipped", "duplicate"]
+    assert body["items"][1]["near_duplicates"][0]["question_id"] == original["id"]
+
+    items[1] = {"text": "Who painted the 'Mona Lisa'", "category_id": category_id,
+                "answers": [{"text": "Leonardo da Vinci", "is_correct": True}]}
+    body = client.post("/quiz/questions/import", json=items, headers=headers).json()
+    assert body["applied"] is True
+    assert [item["status"] for item in body["items"]] == ["created", "created"]
+    assert body["items"][1]["near_duplicates"] == [
+        {"question_id": None, "import_index": 0, "text": "Who painted the Mona Lisa?", "similarity": 1.0}
+    ]
+    painting_ids = [item["id"] for item in body["items"]]
+    assert client.get(f"/quiz/questions/{painting_ids[1]}", headers=headers).json()["answers"][0]["is_correct"]
+
+    client.put(f"/quiz/questions/{spider['id']}", json={"text": "Who painted the Mona Lisa??"}, headers=headers)
+    report = client.get("/quiz/questions/duplicates", params={"category_id": category_id}, headers=headers).json()
+    assert report["threshold"] == 0.8
+    clusters = [[q["id"] for q in cluster["questions"]] for cluster in report["clusters"]]
+    assert clusters == [sorted(painting_ids + [spider["id"]]), [original["id"], typo["id"]]]
+
+    client.delete(f"/quiz/questions/{typo['id']}", headers=headers)
+    report = client.get("/quiz/questions/duplicates", params={"category_id": category_id}, headers=headers).json()
+    assert len(report["clusters"]) == 1
+
+
+def test_unknown_duplicate_policy_fails_at_import():
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DUPLICATE_POLICY="Reject")
+    result = subprocess.run([sys.executable, "-c", "import config"], cwd=root, env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "DUPLICATE_POLICY must be one of warn, reject, allow; got 'Reject'" in result.stderr
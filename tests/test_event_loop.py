@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from test_quiz import auth_token
+
+
+def test_stalls_are_recorded_with_the_blocking_stack(client, monkeypatch):
+    import auth
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'looper', 'looper@example.com')}"}
+    monkeypatch.setattr(auth, "ADMIN_USERNAMES", {"looper"})
+    before = client.get("/admin/event-loop", headers=headers).json()["stalls_total"]
+
+    async def hog_the_loop():
+        await asyncio.sleep(0.15)  # let the monitor tick first
+        time.sleep(0.4)
+        await asyncio.sleep(0.15)  # and notice the lag afterwards
+
+    client.portal.call(hog_the_loop)
+    body = client.get("/admin/event-loop", headers=headers).json()
+    assert body["stalls_total"] == before + 1
+    stall = body["recent_stalls"][0]
+    assert stall["duration_ms"] >= 250
+    assert any("hog_the_loop" in frame for frame in stall["stack"])
+    assert body["max_lag_ms"] >= 250
+    assert "loop_lag_ms" in client.get("/health/ready").json()
+
+    monkeypatch.setattr(auth, "ADMIN_USERNAMES", set())
+    assert client.get("/admin/event-loop", headers=headers).status_code == 403
+
+
+def test_budget_fails_requests_that_block(client):
+    from event_loop import BlockingBudgetMiddleware, BlockingCallError, LoopLagMonitor
+
+    async def blocking_handler(scope, receive, send):
+        await asyncio.sleep(0)
+        time.sleep(0.2)
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def polite_handler(scope, receive, send):
+        for _ in range(4):
+            time.sleep(0.02)
+            await asyncio.sleep(0)
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def call(handler):
+        monitor = LoopLagMonitor(interval=0.01, block_threshold_ms=50)
+        monitor.start()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        try:
+            await BlockingBudgetMiddleware(handler, budget_ms=100, monitor=monitor)(
+                {"type": "http", "method": "GET", "path": "/slow"}, None, send
+            )
+        finally:
+            await monitor.stop()
+        return sent
+
+    async def call_blocking():
+        return await call(blocking_handler)
+
+    async def call_polite():
+        return await call(polite_handler)
+
+    with pytest.raises(BlockingCallError, match=r"GET /slow held the event loop for \d+ ms(.|\n)*blocking_handler"):
+        client.portal.call(call_blocking)
+    assert client.portal.call(call_polite)[0]["status"] == 204
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from test_attempts import _create_question
+from test_quiz import auth_token
+
+
+def test_retried_writes_replay_the_original_response(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'idem1', 'idem1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Idempotency"}, headers=headers).json()
+    question_id, right, _ = _create_question(client, headers, "Idempotent question", category["id"])
+
+    create = {"category_id": category["id"]}
+    first = client.post("/quiz/attempts/", json=create, headers={**headers, "Idempotency-Key": "start-1"})
+    again = client.post("/quiz/attempts/", json=create, headers={**headers, "Idempotency-Key": "start-1"})
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    attempt_id = first.json()["id"]
+
+    r = client.post("/quiz/attempts/", json={"category_id": None}, headers={**headers, "Idempotency-Key": "start-1"})
+    assert r.status_code == 422
+
+    answer = {"question_id": question_id, "answer_id": right}
+    for _ in range(2):
+        r = client.post(f"/quiz/attempts/{attempt_id}/answers", json=answer,
+                        headers={**headers, "Idempotency-Key": "answer-1"})
+        assert r.status_code == 200, r.text
+
+    results = [
+        client.post(f"/quiz/attempts/{attempt_id}/complete", headers={**headers, "Idempotency-Key": "complete-1"})
+        for _ in range(2)
+    ]
+    assert [r.status_code for r in results] == [200, 200]
+    assert results[0].json() == results[1].json()
+    # without a key the handler runs again and refuses
+    assert client.post(f"/quiz/attempts/{attempt_id}/complete", headers=headers).status_code == 400
+    stats = client.get("/quiz/statistics/me", headers=headers).json()
+    assert stats["total_quizzes"] == 1
+
+
+def test_concurrent_duplicates_run_once(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'idem2', 'idem2@example.com')}",
+               "Idempotency-Key": "start-concurrent"}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(lambda _: client.post("/quiz/attempts/", json={}, headers=headers), range(4)))
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.json()["id"] for r in responses}) == 1
+    page = client.get("/quiz/attempts/", headers=headers).json()
+    assert len(page["items"]) == 1
+
+
+def test_pending_key_of_a_dead_worker_is_taken_over_after_its_lease(client):
+    from datetime import datetime, timedelta, timezone
+
+    from idempotency import IdempotencyStore
+    from models import IdempotencyRecord
+
+    store = IdempotencyStore(ttl=3600, wait=0)
+
+    async def claim_twice():
+        first = await store.claim("lease-test", "fp")
+        busy = await store.claim("lease-test", "fp")
+        # the claiming worker died: nothing completes or releases the record
+        await IdempotencyRecord.filter(key="lease-test").update(
+            expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+        taken_over = await store.claim("lease-test", "fp")
+        await store.complete("lease-test", (200, [], b"{}"))
+        record = await IdempotencyRecord.get(key="lease-test")
+        return first, busy, taken_over, record.expires_at - datetime.now(timezone.utc)
+
+    first, busy, taken_over, remaining = client.portal.call(claim_twice)
+    assert (first, busy, taken_over) == (("run", None), ("busy", None), ("run", None))
+    assert remaining > timedelta(seconds=3000)  # completed records are kept for the TTL
+
+
+def test_rate_limited_request_is_not_replayed(client, monkeypatch):
+    import admission
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'idem3', 'idem3@example.com')}",
+               "Idempotency-Key": "start-limited"}
+    monkeypatch.setattr(admission.limiter, "enabled", True)
+    monkeypatch.setitem(admission.limiter.limits, "attempts", (1, 3600))
+    admission.limiter.reset()
+    assert client.get("/quiz/attempts/", headers=headers).status_code == 200  # uses up the only token
+    assert client.post("/quiz/attempts/", json={}, headers=headers).status_code == 429
+    monkeypatch.setattr(admission.limiter, "enabled", False)
+    r = client.post("/quiz/attempts/", json={}, headers=headers)
+    assert r.status_code == 200
+    assert "idempotent-replayed" not in r.headers
@@ -0,0 +1,134 @@
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from test_quiz import auth_token
+
+
+def _setup_quiz(client, headers, name, time_limit_seconds=None):
+    category = client.post("/quiz/categories/", json={"name": name}, headers=headers).json()
+    question_ids = []
+    for i in range(2):
+        r = client.post(
+            "/quiz/questions/",
+            json={
+                "text": f"{name} question {i}",
+                "category_id": category["id"],
+                "time_limit_seconds": time_limit_seconds,
+                "answers": [{"text": "right", "is_correct": True}, {"text": "wrong", "is_correct": False}],
+            },
+            headers=headers,
+        )
+        question_ids.append(r.json()["id"])
+    return category, question_ids
+
+
+def test_live_session_answers_and_completes(client):
+    token = auth_token(client, "live1", "live1@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    category, question_ids = _setup_quiz(client, headers, "Live")
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    with client.websocket_connect(f"/quiz/attempts/{attempt['id']}/live?token={token}") as ws:
+        for expected_index, qid in enumerate(question_ids):
+            msg = ws.receive_json()
+            assert msg["type"] == "question"
+            assert msg["index"] == expected_index
+            assert msg["question"]["id"] == qid
+            assert all("is_correct" not in a for a in msg["question"]["answers"])
+            right = next(a["id"] for a in msg["question"]["answers"] if a["text"] == "right")
+            wrong = next(a["id"] for a in msg["question"]["answers"] if a["text"] == "wrong")
+
+            ws.send_text("not json")
+            assert ws.receive_json() == {"type": "error", "detail": "Message is not valid JSON"}
+            # answers for other questions are rejected without advancing
+            ws.send_json({"type": "answer", "question_id": -1, "answer_id": right})
+            assert ws.receive_json()["type"] == "error"
+
+            ws.send_json({"type": "answer", "question_id": qid, "answer_id": right if expected_index == 0 else wrong})
+            assert ws.receive_json() == {"type": "ack", "question_id": qid}
+        result = ws.receive_json()
+        assert result["type"] == "result"
+        assert result["result"]["total_questions"] == 2
+        assert result["result"]["correct_answers"] == 1
+        assert result["result"]["timed_out"] is False
+
+    r = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert r.status_code == 400
+
+
+def test_live_session_serves_the_deck_snapshot(client):
+    token = auth_token(client, "live5", "live5@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    category, question_ids = _setup_quiz(client, headers, "Live snapshot")
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    # edits made after the questions were selected are not seen by the attempt
+    first = client.get(f"/quiz/questions/{question_ids[0]}", headers=headers).json()
+    right = next(a["id"] for a in first["answers"] if a["is_correct"])
+    client.put(f"/quiz/questions/{question_ids[0]}", json={"text": "Edited mid-attempt"}, headers=headers)
+    client.delete(f"/quiz/answers/{right}", headers=headers)
+
+    with client.websocket_connect(f"/quiz/attempts/{attempt['id']}/live?token={token}") as ws:
+        msg = ws.receive_json()
+        assert msg["question"]["text"] == "Live snapshot question 0"
+        assert right in {a["id"] for a in msg["question"]["answers"]}
+        ws.send_json({"type": "answer", "question_id": question_ids[0], "answer_id": right})
+        assert ws.receive_json() == {"type": "ack", "question_id": question_ids[0]}
+        ws.receive_json()
+        ws.close()
+    result = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers).json()
+    assert result["correct_answers"] == 1
+
+
+def test_live_session_stops_when_the_attempt_is_completed_elsewhere(client):
+    token = auth_token(client, "live6", "live6@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    category, question_ids = _setup_quiz(client, headers, "Live closed")
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+
+    with client.websocket_connect(f"/quiz/attempts/{attempt['id']}/live?token={token}") as ws:
+        msg = ws.receive_json()
+        completed = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+        assert completed.status_code == 200
+        right = next(a["id"] for a in msg["question"]["answers"] if a["text"] == "right")
+        ws.send_json({"type": "answer", "question_id": question_ids[0], "answer_id": right})
+        result = ws.receive_json()
+        assert result["type"] == "result"
+        assert result["result"]["id"] == completed.json()["id"]
+        assert result["result"]["correct_answers"] == 0
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
+
+    details = client.get(f"/quiz/attempts/{attempt['id']}/details", headers=headers).json()
+    assert all(q["user_answer_id"] is None for q in details["question_details"])
+    analytics = client.get(f"/quiz/questions/{question_ids[0]}/analytics", headers=headers).json()
+    assert analytics["total_answers"] == 0
+
+
+def test_live_session_total_time_limit_auto_completes(client):
+    token = auth_token(client, "live2", "live2@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    category, question_ids = _setup_quiz(client, headers, "LiveTimed", time_limit_seconds=30)
+    attempt = client.post(
+        "/quiz/attempts/", json={"category_id": category["id"], "total_time_limit": 1}, headers=headers
+    ).json()
+
+    started = time.monotonic()
+    with client.websocket_connect(f"/quiz/attempts/{attempt['id']}/live", headers=headers) as ws:
+        msg = ws.receive_json()
+        assert msg["type"] == "question"
+        assert msg["time_limit"] <= 1
+        assert ws.receive_json() == {"type": "question_timeout", "question_id": question_ids[0]}
+        result = ws.receive_json()
+        assert result["type"] == "result"
+        assert result["result"]["timed_out"] is True
+        assert result["result"]["time_spent"] == 1
+    assert time.monotonic() - started < 5
+
+
+def test_live_session_requires_auth(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/quiz/attempts/1/live?token=bogus") as ws:
+            ws.receive_json()
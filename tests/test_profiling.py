@@ -0,0 +1,36 @@
+from test_quiz import auth_token
+
+
+def _configure_profiler(client, **kwargs):
+    import profiling
+
+    for middleware in client.app.user_middleware:
+        if middleware.cls is profiling.ProfilingMiddleware:
+            middleware.kwargs.update(kwargs)
+    client.app.middleware_stack = None  # rebuilt on the next request
+
+
+def test_profile_flag_requires_admin_and_returns_collapsed_stacks(client, monkeypatch, tmp_path):
+    import auth
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'profiler', 'profiler@example.com')}"}
+    r = client.get("/quiz/statistics/me", headers={**headers, "X-Profile": "1"})
+    assert r.status_code == 403
+    assert client.get("/quiz/statistics/me", headers=headers).status_code == 200
+
+    monkeypatch.setattr(auth, "ADMIN_USERNAMES", {"profiler"})
+    _configure_profiler(client, interval_ms=0.1)
+    r = client.get("/quiz/leaderboard?profile=inline", headers=headers)
+    assert r.status_code == 200
+    assert r.headers["x-profile-response-status"] == "200"
+    assert int(r.headers["x-profile-samples"]) > 0
+    for line in r.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack
+    assert "get_leaderboard" in r.text
+
+    _configure_profiler(client, directory=str(tmp_path))
+    r = client.get("/quiz/leaderboard", headers={**headers, "X-Profile": "1"})
+    assert r.status_code == 200
+    assert isinstance(r.json(), list)
+    assert (tmp_path / r.headers["x-profile-file"]).exists()
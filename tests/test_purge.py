@@ -0,0 +1,67 @@
+import time
+
+from test_attempts import _create_question
+from test_quiz import auth_token
+
+
+def _wait_for_job(client, headers, job_id):
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/quiz/purge-jobs/{job_id}", headers=headers).json()
+        if job["status"] not in ("pending", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_purge_questions_and_categories_in_chunks(client, monkeypatch):
+    from purge import purge_runner
+
+    monkeypatch.setattr(purge_runner, "chunk_size", 2)  # several statements per table
+    headers = {"Authorization": f"Bearer {auth_token(client, 'purge1', 'purge1@example.com')}"}
+    category = client.post("/quiz/categories/", json={"name": "Purge"}, headers=headers).json()
+    questions = [_create_question(client, headers, f"Purge me {i}", category["id"]) for i in range(5)]
+    keep = _create_question(client, headers, "Keep me", category["id"])
+    client.put(f"/quiz/questions/{keep[0]}", json={"difficulty": "easy"}, headers=headers)
+
+    attempt = client.post("/quiz/attempts/", json={"category_id": category["id"]}, headers=headers).json()
+    for question_id, right, _ in questions[:3]:
+        r = client.post(f"/quiz/attempts/{attempt['id']}/answers",
+                        json={"question_id": question_id, "answer_id": right}, headers=headers)
+        assert r.status_code == 200, r.text
+
+    assert client.post("/quiz/questions/purge", json={}, headers=headers).status_code == 400
+    r = client.post("/quiz/questions/purge", json={"category_id": category["id"], "difficulty": "medium"},
+                    headers=headers)
+    # filters narrow the target set; nothing in the category has difficulty "medium"
+    assert r.status_code == 202
+    assert r.json()["total"] == 0
+
+    r = client.post("/quiz/questions/purge", json={"ids": [q[0] for q in questions]}, headers=headers)
+    job = _wait_for_job(client, headers, r.json()["id"])
+    assert job["status"] == "done", job
+    assert job["processed"] == 5
+    # 5 questions + 10 answers + 3 user answers + 3 answer and 3 question statistics rows
+    assert job["affected_rows"] == 24
+    for question_id, _, _ in questions:
+        assert client.get(f"/quiz/questions/{question_id}", headers=headers).status_code == 404
+    # fills the category's leaderboards and score histogram
+    client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert client.get("/quiz/statistics/distribution", params={"category_id": category["id"]},
+                      headers=headers).json()["total"] == 1
+
+    r = client.post("/quiz/categories/purge", json={"ids": [category["id"], 999999]}, headers=headers)
+    assert r.json()["total"] == 1
+    job = _wait_for_job(client, headers, r.json()["id"])
+    assert job["status"] == "done", job
+    assert client.get(f"/quiz/categories/{category['id']}", headers=headers).status_code == 404
+    kept = client.get(f"/quiz/questions/{keep[0]}", headers=headers).json()
+    assert kept["category_id"] is None
+    from models import LeaderboardScore
+
+    async def board_rows():
+        return await LeaderboardScore.filter(category_id=category["id"]).count()
+
+    assert client.portal.call(board_rows) == 0
+    histogram = client.get("/quiz/statistics/distribution", params={"category_id": category["id"]},
+                           headers=headers).json()
+    assert histogram["total"] == 0
@@ -0,0 +1,55 @@
+from test_quiz import auth_token
+
+
+def test_statements_are_fingerprinted_and_attributed_to_routes(client, monkeypatch, caplog):
+    import auth
+    from querylog import normalize, query_stats
+
+    assert normalize("SELECT * FROM t WHERE id IN (?,?, ?) AND name='x'  LIMIT 10") == \
+        "SELECT * FROM t WHERE id IN (?, ...) AND name=? LIMIT ?"
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'dba', 'dba@example.com')}"}
+    assert client.get("/admin/queries", headers=headers).status_code == 403
+    monkeypatch.setattr(auth, "ADMIN_USERNAMES", {"dba"})
+    assert client.delete("/admin/queries", headers=headers).status_code == 204
+
+    monkeypatch.setattr(query_stats, "slow_ms", 0)  # log every statement
+    with caplog.at_level("WARNING", logger="querylog"):
+        for _ in range(3):
+            assert client.get("/quiz/leaderboard", headers=headers).status_code == 200
+    assert any("route=GET /quiz/leaderboard (quiz_results.get_leaderboard)" in r.getMessage() for r in caplog.records)
+    monkeypatch.setattr(query_stats, "slow_ms", -1)
+
+    body = client.get("/admin/queries", params={"order_by": "calls", "limit": 50}, headers=headers).json()
+    leaderboard = [s for s in body["statements"] if '"userstatistics"' in s["sql"] and "ORDER BY" in s["sql"]]
+    assert len(leaderboard) == 1
+    entry = leaderboard[0]
+    assert entry["calls"] == 3 and entry["slow_calls"] == 3
+    assert entry["max_ms"] >= entry["mean_ms"] > 0
+    assert entry["routes"] == {"GET /quiz/leaderboard (quiz_results.get_leaderboard)": 3}
+    calls = [s["calls"] for s in body["statements"]]
+    assert calls == sorted(calls, reverse=True)
+    submit = client.post("/quiz/attempts/", json={}, headers=headers).json()
+    client.post(f"/quiz/attempts/{submit['id']}/complete", headers=headers)
+    body = client.get("/admin/queries", params={"limit": 500}, headers=headers).json()
+    routes = {route for s in body["statements"] for route in s["routes"]}
+    assert "POST /quiz/attempts/{attempt_id}/complete (quiz_results.complete_quiz_attempt)" in routes
+
+
+def test_route_label_falls_back_to_the_route_path(app):
+    from starlette.routing import NoMatchFound
+
+    from querylog import route_label
+
+    class Route:
+        path = "/attempts/{attempt_id}"
+        name = "get_attempt"
+
+        def url_path_for(self, name, **params):
+            raise NoMatchFound(name, params)
+
+    def get_attempt():
+        pass
+
+    scope = {"method": "GET", "path": "/quiz/attempts/1", "path_params": {}, "route": Route(), "endpoint": get_attempt}
+    assert route_label(scope).startswith("GET /attempts/{attempt_id} (")
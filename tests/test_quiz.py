@@ -449,3 +449,93 @@ def test_create_answer_for_nonexistent_question(client):
     assert r.status_code == 404
 
 
+
+
+def test_search_questions(client):
+    token = auth_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r = client.post("/quiz/categories/", json={"name": "Astronomy"}, headers=headers)
+    category = r.json()
+    r = client.post(
+        "/quiz/questions/",
+        json={
+            "text": "Which planet is known as the red planet?",
+            "category_id": category["id"],
+            "difficulty": "easy",
+            "answers": [{"text": "Mars", "is_correct": True}, {"text": "Venus", "is_correct": False}],
+        },
+        headers=headers,
+    )
+    planet_id = r.json()["id"]
+    r = client.post(
+        "/quiz/questions/",
+        json={"text": "How many moons does Mars have?", "category_id": category["id"], "difficulty": "hard"},
+        headers=headers,
+    )
+    moons_id = r.json()["id"]
+
+    # matches in question text rank above matches in answer text
+    r = client.get("/quiz/questions/search?q=mars", headers=headers)
+    assert r.status_code == 200
+    assert [q["id"] for q in r.json()][:2] == [moons_id, planet_id]
+
+    r = client.get(f"/quiz/questions/search?q=mars&difficulty=easy&category_id={category['id']}", headers=headers)
+    assert [q["id"] for q in r.json()] == [planet_id]
+
+    # prefix matching, and the index follows answer edits and deletes
+    answer_id = client.get(f"/quiz/questions/{planet_id}/answers/", headers=headers).json()[1]["id"]
+    client.put(f"/quiz/answers/{answer_id}", json={"text": "Jupiterian"}, headers=headers)
+    r = client.get("/quiz/questions/search?q=jupiter", headers=headers)
+    assert [q["id"] for q in r.json()] == [planet_id]
+
+    client.delete(f"/quiz/questions/{moons_id}", headers=headers)
+    r = client.get("/quiz/questions/search?q=moons", headers=headers)
+    assert r.json() == []
+
+    # punctuation is not FTS syntax
+    r = client.get('/quiz/questions/search?q="red" (planet:', headers=headers)
+    assert r.status_code == 200
+    assert [q["id"] for q in r.json()] == [planet_id]
+
+
+def test_bulk_update_questions_and_answers(client):
+    token = auth_token(client, "bulkuser", "bulkuser@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    source = client.post("/quiz/categories/", json={"name": "Bulk source"}, headers=headers).json()
+    target = client.post("/quiz/categories/", json={"name": "Bulk target"}, headers=headers).json()
+    questions = [
+        client.post("/quiz/questions/", json={
+            "text": f"Bulk question {i}", "category_id": source["id"], "difficulty": "easy",
+            "answers": [{"text": f"bulk answer {i}", "is_correct": False}],
+        }, headers=headers).json()
+        for i in range(3)
+    ]
+
+    # one bad category rejects the whole batch
+    r = client.patch("/quiz/questions/bulk", json=[
+        {"id": questions[0]["id"], "difficulty": "hard"},
+        {"id": questions[1]["id"], "category_id": 999999},
+        {"id": 999999, "difficulty": "hard"},
+    ], headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["applied"] is False
+    assert [item["status"] for item in body["items"]] == ["skipped", "invalid", "not_found"]
+    assert client.get(f"/quiz/questions/{questions[0]['id']}", headers=headers).json()["difficulty"] == "easy"
+
+    r = client.patch("/quiz/questions/bulk", json=[
+        {"id": q["id"], "difficulty": "hard", "category_id": target["id"]} for q in questions
+    ], headers=headers)
+    assert r.json()["applied"] is True
+    assert all(item["status"] == "updated" for item in r.json()["items"])
+    for q in questions:
+        updated = client.get(f"/quiz/questions/{q['id']}", headers=headers).json()
+        assert (updated["difficulty"], updated["category"]) == ("hard", "Bulk target")
+
+    r = client.patch("/quiz/answers/bulk", json=[
+        {"id": q["answers"][0]["id"], "is_correct": True} for q in questions
+    ], headers=headers)
+    assert r.json()["applied"] is True
+    answers = client.get(f"/quiz/questions/{questions[2]['id']}/answers/", headers=headers).json()
+    assert answers[0]["is_correct"] is True
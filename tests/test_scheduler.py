@@ -0,0 +1,86 @@
+import time
+
+from test_quiz import auth_token
+
+
+def _wait_for_completion(client, attempt_id, headers, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        r = client.get(f"/quiz/attempts/{attempt_id}/details", headers=headers)
+        if r.status_code == 200:
+            return r.json()
+        time.sleep(0.1)
+    raise AssertionError("attempt was not finalized in time")
+
+
+def test_overdue_attempt_is_finalized_in_background(client):
+    headers = {"Authorization": f"Bearer {auth_token(client, 'expiry1', 'expiry1@example.com')}"}
+    attempt = client.post("/quiz/attempts/", json={"total_time_limit": 1}, headers=headers).json()
+    untimed = client.post("/quiz/attempts/", json={}, headers=headers).json()
+
+    details = _wait_for_completion(client, attempt["id"], headers)
+    assert details["timed_out"] is True
+    assert details["time_spent"] == 1
+
+    r = client.post(f"/quiz/attempts/{attempt['id']}/complete", headers=headers)
+    assert r.status_code == 400
+    # attempts without a total limit are left alone
+    assert client.post(f"/quiz/attempts/{untimed['id']}/complete", headers=headers).status_code == 200
+
+
+def test_open_attempts_are_loaded_at_startup(client):
+    from scheduler import expiry_scheduler
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'expiry2', 'expiry2@example.com')}"}
+    attempt = client.post("/quiz/attempts/", json={"total_time_limit": 1}, headers=headers).json()
+
+    # simulate a worker restart: the in-memory heap is lost and rebuilt from the database
+    client.portal.call(expiry_scheduler.stop)
+    assert expiry_scheduler.pending() == 0
+    client.portal.call(expiry_scheduler.start)
+    assert expiry_scheduler.pending() >= 1
+
+    assert _wait_for_completion(client, attempt["id"], headers)["timed_out"] is True
+
+
+def test_expire_batch_skips_completed_attempts(client):
+    from scheduler import expiry_scheduler
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'expiry3', 'expiry3@example.com')}"}
+    first = client.post("/quiz/attempts/", json={"total_time_limit": 600}, headers=headers).json()
+    second = client.post("/quiz/attempts/", json={"total_time_limit": 600}, headers=headers).json()
+    client.post(f"/quiz/attempts/{first['id']}/complete", headers=headers)
+
+    assert client.portal.call(expiry_scheduler.expire, [first["id"], second["id"]]) == 1
+
+
+def test_failed_finalization_is_rolled_back_and_retried(client, monkeypatch):
+    import quiz_results
+    from models import QuizAttempt
+    from scheduler import expiry_scheduler
+
+    headers = {"Authorization": f"Bearer {auth_token(client, 'expiry4', 'expiry4@example.com')}"}
+    broken = client.post("/quiz/attempts/", json={"total_time_limit": 600}, headers=headers).json()
+    healthy = client.post("/quiz/attempts/", json={"total_time_limit": 600}, headers=headers).json()
+    finalize_attempt = quiz_results.finalize_attempt
+
+    async def fail_after_claiming(attempt, user):
+        result = await finalize_attempt(attempt, user)
+        if attempt.id == broken["id"]:
+            raise RuntimeError("statistics update failed")
+        return result
+
+    async def completed_at():
+        return (await QuizAttempt.get(id=broken["id"])).completed_at
+
+    monkeypatch.setattr(quiz_results, "finalize_attempt", fail_after_claiming)
+    monkeypatch.setattr("scheduler.RETRY_BACKOFF_SECONDS", 0.5)
+    assert client.portal.call(expiry_scheduler.expire, [broken["id"], healthy["id"]]) == 1
+    # the failed attempt kept neither its completion mark nor a result, and is due again
+    assert client.portal.call(completed_at) is None
+    assert client.get(f"/quiz/attempts/{broken['id']}/details", headers=headers).status_code == 404
+    assert client.get(f"/quiz/attempts/{healthy['id']}/details", headers=headers).status_code == 200
+    assert broken["id"] in [attempt_id for _, attempt_id in expiry_scheduler._heap]
+
+    monkeypatch.setattr(quiz_results, "finalize_attempt", finalize_attempt)
+    assert _wait_for_completion(client, broken["id"], headers)["score"] == 0
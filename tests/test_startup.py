@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+
+def test_readiness_reports_phases_after_warm_up(client):
+    assert client.get("/health/live").json() == {"status": "ok"}
+    deadline = time.monotonic() + 5
+    while True:
+        r = client.get("/health/ready")
+        if r.status_code == 200 or time.monotonic() > deadline:
+            break
+        assert r.status_code == 503
+        time.sleep(0.01)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ready"] is True
+    for phase in ("schema", "search_index", "duplicate_index", "question_pools", "expiry_scheduler", "warm_categories", "warm_leaderboard"):
+        assert phase in body["phases_ms"]
+
+
+def test_fast_startup_checks_schema_version(client, monkeypatch):
+    import startup
+    from models import SchemaVersion
+
+    # the normal startup recorded the current version
+    client.portal.call(startup.check_schema_version)
+
+    monkeypatch.setattr(startup, "SCHEMA_VERSION", startup.SCHEMA_VERSION + 1)
+    with pytest.raises(RuntimeError, match="schema version"):
+        client.portal.call(startup.check_schema_version)
+    assert client.portal.call(SchemaVersion.filter(id=1).count) == 1
+
+
+def test_outdated_schema_is_not_marked_current(client):
+    import startup
+    from models import SchemaVersion
+
+    async def stored_version():
+        return (await SchemaVersion.get(id=1)).version
+
+    async def store_older_version():
+        await SchemaVersion.filter(id=1).update(version=startup.SCHEMA_VERSION - 1)
+
+    # an older database: generate_schemas left its existing tables as they were
+    client.portal.call(store_older_version)
+    with pytest.raises(RuntimeError, match="migrate the existing tables"):
+        client.portal.call(startup.record_schema_version)
+    with pytest.raises(RuntimeError, match="migrate the existing tables"):
+        client.portal.call(startup.check_schema_version)
+    assert client.portal.call(stored_version) == startup.SCHEMA_VERSION - 1
+
+    # once migrated, the operator marks it current
+    client.portal.call(startup.mark_migrated)
+    client.portal.call(startup.check_schema_version)
+
+    # a new database has no row yet and gets the current version
+    client.portal.call(SchemaVersion.filter(id=1).delete)
+    client.portal.call(startup.record_schema_version)
+    assert client.portal.call(stored_version) == startup.SCHEMA_VERSION
+    client.portal.call(startup.record_schema_version)